@@ -1,25 +1,48 @@
 # api/aqi.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from api.utils.fetch_aqi import fetch_aqi_for
+from api.utils.aqi_record import public
+from api.utils.bulk import bulk_aqi, cities_from_request, ndjson_lines
 
 bp = Blueprint("aqi", __name__, url_prefix="/api")
 
 @bp.route("/aqi", methods=["GET"])
 def get_aqi():
     """
-    Returns normalized AQI summary for a city.
-    Uses fetch_aqi_for => will return demo fallback if OpenAQ fails.
-    Query params: city (required)
+    Returns normalized AQI summary for a city: measurements plus the US-EPA
+    AQI, category and dominant pollutant.
+    Uses fetch_aqi_for => falls back to OpenWeather if OpenAQ fails.
+    Query params: city (required), include=raw (also return the upstream JSON;
+    bypasses the cache)
     """
     city = request.args.get("city")
     if not city:
         return jsonify({"ok": False, "error": "city required"}), 400
+    include_raw = "raw" in _include(request)
 
     try:
-        res = fetch_aqi_for(city)
+        res = fetch_aqi_for(city, include_raw=include_raw)
     except Exception as e:
         return jsonify({"ok": False, "error": f"internal error: {e}"}), 500
 
-    # If fetch_aqi_for returns the wrapped summary, return it directly.
-    # It always returns {"aqi": {...}, "city": city, "ok": True} even for demo.
-    return jsonify(res), 200
+    return jsonify(public(res, include_raw=include_raw)), 200
+
+
+def _include(req):
+    """Names listed in ?include= (comma-separated or repeated)."""
+    return {v.strip() for value in req.args.getlist("include") for v in value.split(",") if v.strip()}
+
+
+@bp.route("/aqi/bulk", methods=["GET", "POST"])
+def get_aqi_bulk():
+    """
+    AQI for many cities in one request, streamed as NDJSON: one line per city
+    (same shape as /api/aqi) as each completes, then a {"done": true} line.
+    GET ?cities=a,b,c or POST a JSON list / {"cities": [...]}.
+    """
+    try:
+        cities = cities_from_request(request)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    results = ((c, public(out)) for c, out in bulk_aqi(cities))
+    return Response(stream_with_context(ndjson_lines(results)), mimetype="application/x-ndjson")
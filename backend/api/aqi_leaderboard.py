@@ -1,19 +1,95 @@
 # api/aqi_leaderboard.py
-from flask import Blueprint, jsonify
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import Blueprint, jsonify, request
 from api.utils.fetch_aqi import fetch_aqi_for
+from metrics import bind
 
 bp = Blueprint("aqi_leaderboard", __name__, url_prefix="/api")
 
 DEFAULT_CITIES = ["Delhi","Mumbai","Kolkata","Bengaluru","Pune"]
 
+# fan-out settings; cities are fetched concurrently and anything still
+# running when the deadline passes is reported as partial
+MAX_WORKERS = int(os.environ.get("AQI_LEADERBOARD_WORKERS", "16"))
+DEADLINE_SECONDS = float(os.environ.get("AQI_LEADERBOARD_DEADLINE", "10"))
+# cap on cities named by the caller (?cities=); the configured list is trusted
+MAX_CITIES = int(os.environ.get("AQI_LEADERBOARD_MAX_CITIES", "20"))
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Process-wide pool, recreated after a fork so workers don't share threads."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="aqi-leaderboard")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _parse_cities(value):
+    """Split a comma/newline separated list, dropping blanks and case-insensitive duplicates."""
+    seen, out = set(), []
+    for c in (value or "").replace("\n", ",").split(","):
+        c = c.strip()
+        if c and c.casefold() not in seen:
+            seen.add(c.casefold())
+            out.append(c)
+    return out
+
+
+def configured_cities():
+    """
+    Cities ranked when the request doesn't name any:
+    AQI_LEADERBOARD_CITIES (comma-separated), else AQI_LEADERBOARD_CITIES_FILE
+    (one city per line), else DEFAULT_CITIES.
+    """
+    cities = _parse_cities(os.environ.get("AQI_LEADERBOARD_CITIES"))
+    path = os.environ.get("AQI_LEADERBOARD_CITIES_FILE")
+    if not cities and path and os.path.exists(path):
+        with open(path, encoding="utf-8") as fh:
+            cities = _parse_cities(fh.read())
+    return cities or list(DEFAULT_CITIES)
+
+
 @bp.route("/aqi-leaderboard")
 def leaderboard():
+    """
+    Query params (optional): cities=Delhi,Mumbai,... (at most AQI_LEADERBOARD_MAX_CITIES)  deadline=<seconds, capped by config>
+    """
+    cities = _parse_cities(request.args.get("cities"))
+    if len(cities) > MAX_CITIES:
+        return jsonify({"ok": False, "error": f"at most {MAX_CITIES} cities per request (got {len(cities)})"}), 400
+    cities = cities or configured_cities()
+    try:
+        deadline = min(float(request.args.get("deadline", DEADLINE_SECONDS)), DEADLINE_SECONDS)
+    except ValueError:
+        deadline = DEADLINE_SECONDS
+
+    executor = _get_executor()
+    # bind(): upstream calls made on pool threads still count as stages of this request
+    futures = {executor.submit(bind(fetch_aqi_for, c)): c for c in cities}
+    done, _ = wait(futures, timeout=max(deadline, 0))
+
     out = []
-    for c in DEFAULT_CITIES:
+    missing = []
+    for fut, c in futures.items():
+        if fut not in done:
+            # not cancelled if already running: the result still lands in the cache
+            fut.cancel()
+            missing.append(c)
+            out.append({"city": c, "aqi": None, "category": "Pending", "partial": True})
+            continue
         try:
-            r = fetch_aqi_for(c)
-            out.append({"city": c, "aqi": r.get("aqi_proxy", 0), "category": r.get("category")})
+            r = fut.result()
+            out.append({"city": c, "aqi": r.get("aqi"), "category": r.get("category") or "Unknown",
+                        "dominant": r.get("dominant")})
         except Exception:
             out.append({"city": c, "aqi": None, "category": "Unknown"})
     out = sorted(out, key=lambda x: (x["aqi"] is None, -x["aqi"] if x["aqi"] else 0))
-    return jsonify({"ok": True, "leaderboard": out})
+    return jsonify({"ok": True, "leaderboard": out, "partial": bool(missing), "missing": missing})
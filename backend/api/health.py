@@ -1,4 +1,10 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, current_app, jsonify
+from api.utils.cache import upstream_cache
+from api.utils.http_client import upstream_stats
+from api.utils.ingest import ingest_scheduler
+from metrics import metrics
+from models.prediction_cache import get_prediction_cache
+from prediction_log import prediction_logger
 
 
 health_bp = Blueprint("health", __name__)
@@ -9,6 +15,50 @@ def health():
     return jsonify({"status": "ok"})
 
 
+@health_bp.route("/ready", methods=["GET"])
+def ready():
+    """Readiness for load balancers: 200 once this worker has warmed up, 503 (with reasons) until then."""
+    from readiness import readiness
+
+    ok, report = readiness(current_app)
+    return jsonify(report), (200 if ok else 503)
+
+
 @health_bp.route("/ping", methods=["GET"])
 def ping():
-    return jsonify({"ping": "pong"})
\ No newline at end of file
+    return jsonify({"ping": "pong"})
+
+
+@health_bp.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """Upstream and prediction cache counters (hits, misses, evictions, size) for monitoring."""
+    predictions = get_prediction_cache()
+    return jsonify({
+        "ok": True,
+        "upstream": upstream_cache.stats(),
+        "predictions": predictions.stats() if predictions is not None else None,
+    })
+
+
+@health_bp.route("/upstream/stats", methods=["GET"])
+def upstream_client_stats():
+    """Per-provider request/retry counters and circuit breaker state."""
+    return jsonify({"ok": True, "providers": upstream_stats()})
+
+
+@health_bp.route("/prediction-log/stats", methods=["GET"])
+def prediction_log_stats():
+    """Audit log queue depth and written/dropped counters."""
+    return jsonify({"ok": True, "prediction_log": prediction_logger.stats()})
+
+
+@health_bp.route("/ingest/stats", methods=["GET"])
+def ingest_stats():
+    """Background ingestion jobs: runs, failures, postponements and last error per city."""
+    return jsonify({"ok": True, "ingest": ingest_scheduler.stats()})
+
+
+@health_bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Per-route, per-stage, per-upstream and per-model latency histograms and error counts (Prometheus text)."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
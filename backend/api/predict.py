@@ -1,7 +1,11 @@
+import os
+import json
 from flask import Blueprint, request, jsonify
 # replace the bad import with:
 from flask import current_app
 
+from prediction_log import prediction_logger
+
 # then, whenever the endpoint needs the wrapper, use:
 wrapper = None
 # (this is identical to how your predict_auto uses current_app)
@@ -9,17 +13,44 @@ wrapper = None
 
 predict_bp = Blueprint("predict", __name__)
 
+# upper bound on rows accepted by /predict/batch in one request
+BATCH_MAX_ROWS = int(os.environ.get("PREDICT_BATCH_MAX_ROWS", "10000"))
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/ndjson", "application/jsonlines")
+
 
 def get_wrapper():
-    """Return the ModelWrapper attached to the Flask app, read lazily at request time."""
+    """Return the ModelWrapper attached to the Flask app, read lazily at request time.
+    `?model=<name>&version=<version>` selects another model from the app's registry.
+    """
     try:
         from flask import current_app
+        name = request.args.get("model")
+        version = request.args.get("version")
+        registry = getattr(current_app, "model_registry", None)
+        if registry is not None and (name or version):
+            return registry.wrapper(name, version)
         return getattr(current_app, "model_wrapper", None)
     except RuntimeError:
         # no app context available
         return None
 
 
+def no_model_response():
+    """404 when ?model=/&version= names a model that isn't loaded, else 500 no_model_loaded."""
+    name = request.args.get("model")
+    version = request.args.get("version")
+    if name or version:
+        return jsonify({'ok': False, 'error': 'model_not_found', 'model': name, 'version': version}), 404
+    return jsonify({'ok': False, 'error': 'no_model_loaded', 'note': 'prediction requires a loaded ModelWrapper on app'}), 500
+
+
+@predict_bp.route("/models", methods=["GET"])
+def list_models():
+    """Models loaded in this process (name, version, load time, default)."""
+    registry = getattr(current_app, "model_registry", None)
+    return jsonify({"ok": True, "models": registry.list() if registry is not None else []})
+
+
 @predict_bp.route("/predict", methods=["POST"])
 def predict():
     try:
@@ -30,7 +61,7 @@ def predict():
 
         wrapper = get_wrapper()
         if not wrapper:
-            return jsonify({'ok': False, 'error': 'no_model_loaded', 'note': 'prediction requires a loaded ModelWrapper on app'}) , 500
+            return no_model_response()
         # wrapper should expose a predict / predict_from_dict / predict_from_df API
         # try common names in order
         try:
@@ -59,7 +90,136 @@ def predict():
         except Exception as e:
             return jsonify({'ok': False, 'error': 'model_predict_failed', 'detail': str(e)}), 500
 
+        if isinstance(result, dict):
+            prediction_logger.log(payload, result)
+            if result.get("ok") is False:
+                return jsonify(result), 400 if result.get("error_type") == "invalid_input" else 500
         return jsonify(result)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+def _parse_batch_body():
+    """Parse a JSON array (or {"rows": [...]}) or an NDJSON body into rows.
+
+    Returns (rows, errors) where errors maps row index -> parse error; rows
+    that failed to parse are kept as None placeholders so indexes line up
+    with the request body.
+    """
+    body = request.get_data(as_text=True) or ""
+    if request.mimetype not in NDJSON_MIMETYPES:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and isinstance(data.get("rows"), list):
+            data = data["rows"]
+        if isinstance(data, list):
+            return data, {}
+
+    rows, errors = [], {}
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            rows.append(json.loads(line))
+        except ValueError as e:
+            errors[len(rows)] = f"invalid JSON: {e}"
+            rows.append(None)
+    return rows, errors
+
+
+@predict_bp.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """
+    Score many rows in one model call.
+    Body: JSON array of feature dicts, {"rows": [...]}, or NDJSON (one dict per line).
+    Every row is scored and reported in `results`; the status says whether
+    all of them succeeded: 200, else 500 if any row failed in the model, else
+    400 (some rows were invalid input). Rows that did score are in `results`
+    either way.
+    """
+    rows, errors = _parse_batch_body()
+    if not rows:
+        return jsonify({"ok": False, "error": "no rows received"}), 400
+    if len(rows) > BATCH_MAX_ROWS:
+        return jsonify({"ok": False, "error": f"too many rows (max {BATCH_MAX_ROWS})"}), 413
+
+    wrapper = get_wrapper()
+    if not wrapper or not hasattr(wrapper, "predict_batch"):
+        return no_model_response()
+
+    meta = wrapper.metadata() if hasattr(wrapper, "metadata") else {}
+    try:
+        results = wrapper.predict_batch(rows)
+    except Exception as e:
+        return jsonify({'ok': False, 'error': 'model_predict_failed', 'detail': str(e)}), 500
+
+    for i, msg in errors.items():
+        results[i] = {"index": i, "ok": False, "error": msg, "error_type": "invalid_input"}
+
+    for row, r in zip(rows, results):
+        if r.get("ok"):
+            prediction_logger.log(row, r)
+
+    invalid = sum(1 for r in results if not r.get("ok") and r.get("error_type") == "invalid_input")
+    failed = sum(1 for r in results if not r.get("ok"))
+    body = {"ok": not failed, "count": len(results), "failed": failed, "invalid": invalid, **meta, "results": results}
+    if failed > invalid:
+        return jsonify(dict(body, error="model_predict_failed")), 500
+    if invalid:
+        return jsonify(dict(body, error="invalid_rows")), 400
+    return jsonify(body)
+
+
+@predict_bp.route("/predictions/history", methods=["GET"])
+def prediction_history():
+    """
+    Logged predictions, newest first.
+    Query: ?city=Sydney&from=YYYY-MM-DD&to=YYYY-MM-DD&model_version=...&limit=500
+    """
+    import datetime
+    from db import prediction_history as query_history
+
+    try:
+        start = request.args.get("from")
+        end = request.args.get("to")
+        start = datetime.date.fromisoformat(start) if start else None
+        end = datetime.date.fromisoformat(end) if end else None
+        limit = min(int(request.args.get("limit", 500)), 5000)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": f"invalid query: {e}"}), 400
+
+    rows = query_history(city=request.args.get("city"), start=start, end=end,
+                         model_version=request.args.get("model_version"), limit=limit)
+    return jsonify({"ok": True, "count": len(rows), "predictions": [{
+        "id": r.id,
+        "city": r.city,
+        "date": r.date.isoformat() if r.date else None,
+        "timestamp": r.timestamp.isoformat() if r.timestamp else None,
+        "model_version": r.model_version,
+        "predicted_value": r.predicted_value,
+        "probability": r.probability,
+    } for r in rows]})
+
+
+@predict_bp.route("/admin/reload-model", methods=["POST"])
+def reload_model():
+    """
+    Hot-reload the served model without a restart (local callers only).
+    Body (optional): {"path": "...", "version": "...", "wait": false}
+    The new model is loaded, warmed and validated before it is swapped in;
+    in-flight requests finish on the old one. Only this worker process reloads;
+    set MODEL_WATCH=1 to have every worker follow the model file instead.
+    """
+    if request.remote_addr not in ("127.0.0.1", "::1", "localhost"):
+        return jsonify({"error": "not allowed"}), 403
+    wrapper = getattr(current_app, "model_wrapper", None)
+    if not wrapper or not hasattr(wrapper, "reload"):
+        return jsonify({'ok': False, 'error': 'no_model_loaded'}), 500
+
+    body = request.get_json(silent=True) or {}
+    status = wrapper.reload(path=body.get("path"), version=body.get("version"), wait=bool(body.get("wait", False)))
+    code = 202 if status.get("status") == "started" else (200 if status.get("ok") else 409)
+    return jsonify(dict(status, last_reload=wrapper.last_reload, **wrapper.metadata())), code
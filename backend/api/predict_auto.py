@@ -1,29 +1,46 @@
 # api/predict_auto.py
+import os
+import asyncio
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 from flask import Blueprint, request, jsonify, current_app
 import pandas as pd
-import traceback
+
+from forecast import lookup as forecast_lookup
+from metrics import bind, stage
+from prediction_log import prediction_logger
 
 bp = Blueprint("predict_auto", __name__, url_prefix="/api")
 
 # try to import optional fetch helpers (these exist in your repo in api/utils/)
 try:
-    from .utils.fetch_weather import fetch_weather_for  # optional
+    from .utils.fetch_weather import fetch_weather_for, geocode_city  # optional
 except Exception:
     fetch_weather_for = None
+    geocode_city = None
 
 try:
     from .utils.fetch_aqi import fetch_aqi_for  # optional (compat shim present)
 except Exception:
     fetch_aqi_for = None
 
+# per-request budget (seconds) for assembling external features; any branch
+# still running when it expires falls back to demo values for its fields
+FEATURE_DEADLINE_SECONDS = float(os.environ.get("PREDICT_AUTO_DEADLINE", "5"))
 
-def build_features_from_external(city: str, date: str, time: str) -> dict:
-    """
-    Try to build the 23-model features using helper functions if available.
-    If helpers missing or fail, returns a reasonable demo feature dict.
-    """
-    # demo default features (safe fallbacks)
-    demo = {
+# dedicated pool for blocking fetchers: asyncio.run() waits for its default
+# executor on shutdown, which would turn the deadline back into a full wait
+_fetch_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("PREDICT_AUTO_WORKERS", "16")),
+    thread_name_prefix="predict-auto",
+)
+
+AQI_KEY_MAP = {"pm25": "PM2.5", "pm10": "PM10", "no2": "NO2", "so2": "SO2", "o3": "O3", "co": "CO"}
+
+
+def _demo_features(city: str, date: str) -> dict:
+    """Demo default features (safe fallbacks)."""
+    return {
         "Location": city,
         "MinTemp": 18.0,
         "MaxTemp": 30.0,
@@ -44,43 +61,84 @@ def build_features_from_external(city: str, date: str, time: str) -> dict:
         "WindSpeed3pm": 12.0,
         "Cloud9am": 2.0,
         "Cloud3pm": 1.0,
-        "Temp9am": 20.0,
-        "Temp3pm": 28.0,
         "RainToday": "No",
         "Date_month": int(date.split("-")[1]) if date and "-" in date else 1,
         "Date_day": int(date.split("-")[2]) if date and "-" in date else 1,
     }
 
-    # try to fetch weather
+
+async def _run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # bind(): upstream calls on the pool thread still count as stages of this request
+    return await loop.run_in_executor(_fetch_executor, bind(fn, *args, **kwargs))
+
+
+async def _fetch_external(city: str, date: str, time: str, deadline: float):
+    """
+    Geocode once, then run the weather and AQI branches concurrently with the
+    shared coordinates. Returns (weather, aqi); a branch that fails or misses
+    the deadline comes back as None.
+    """
+    loop = asyncio.get_running_loop()
+    expires = loop.time() + deadline
+
+    coords = None
+    if geocode_city:
+        try:
+            coords = await asyncio.wait_for(_run_blocking(geocode_city, city), timeout=deadline)
+        except Exception:
+            coords = None
+
+    tasks = {}
+    # without coordinates the weather branch can only fail, so skip it
+    if fetch_weather_for and coords:
+        tasks["weather"] = asyncio.ensure_future(_run_blocking(fetch_weather_for, city, date=date, time=time, coords=coords))
+    if fetch_aqi_for:
+        tasks["aqi"] = asyncio.ensure_future(_run_blocking(fetch_aqi_for, city=city, coords=coords))
+    if not tasks:
+        return None, None
+
+    await asyncio.wait(tasks.values(), timeout=max(0.0, expires - loop.time()))
+
+    results = {}
+    for name, task in tasks.items():
+        if task.done() and not task.cancelled() and task.exception() is None:
+            results[name] = task.result()
+        else:
+            # the worker thread keeps running; its result still warms the cache
+            task.cancel()
+    return results.get("weather"), results.get("aqi")
+
+
+def build_features_from_external(city: str, date: str, time: str, deadline: float = None) -> dict:
+    """
+    Try to build the 23-model features using helper functions if available.
+    Weather and AQI are fetched concurrently under a per-request deadline;
+    any field that could not be fetched keeps its demo value.
+    """
+    demo = _demo_features(city, date)
+
     try:
-        if fetch_weather_for:
-            w = fetch_weather_for(city=city, date=date, time=time)
-            if w and isinstance(w, dict) and w.get("ok"):
-                # assume helper returns features under 'features' key
-                f = w.get("features") or w
-                # merge into demo (f overrides demo)
-                demo.update({k: f[k] for k in f if k is not None})
+        w, a = asyncio.run(_fetch_external(city, date, time, deadline or FEATURE_DEADLINE_SECONDS))
     except Exception:
-        # log but continue with demo
-        pass
+        w, a = None, None
+
+    if w and isinstance(w, dict) and w.get("ok", True):
+        # helper returns features directly (or under a 'features' key)
+        f = w.get("features") or w
+        # merge into demo per field (fetched values override demo, None keeps demo)
+        demo.update({k: v for k, v in f.items() if k != "ok" and v is not None})
 
     # optionally incorporate AQI info if available
-    try:
-        if fetch_aqi_for:
-            a = fetch_aqi_for(city=city)
-            if a and isinstance(a, dict):
-                # try to set PM2.5 etc into features if present
-                measurements = a.get("measurements", [])
-                for m in measurements:
-                    p = m.get("parameter")
-                    v = m.get("value")
-                    if not p or v is None:
-                        continue
-                    key_map = {"pm25": "PM2.5", "pm10": "PM10", "no2": "NO2", "so2": "SO2", "o3": "O3", "co": "CO"}
-                    if p.lower() in key_map:
-                        demo[key_map[p.lower()]] = v
-    except Exception:
-        pass
+    if a and isinstance(a, dict):
+        # try to set PM2.5 etc into features if present
+        for m in a.get("measurements", []):
+            p = m.get("parameter")
+            v = m.get("value")
+            if not p or v is None:
+                continue
+            if p.lower() in AQI_KEY_MAP:
+                demo[AQI_KEY_MAP[p.lower()]] = v
 
     return demo
 
@@ -127,16 +185,28 @@ def predict_auto():
     if not city or not date or not time:
         return jsonify({"ok": False, "error": "missing required fields: city, date, time"}), 400
 
+    # get wrapper from app (set in app.py if available)
+    wrapper = getattr(current_app, "model_wrapper", None)
+
+    # tracked cities: answer from the precomputed forecast table when it holds a
+    # fresh row made by the model currently served (?live=1 forces inference)
+    if wrapper is not None and hasattr(wrapper, "metadata") and not request.args.get("live"):
+        meta = wrapper.metadata()
+        with stage("forecast_lookup"):
+            stored = forecast_lookup(city, date, model_name=meta.get("model_name") or "default",
+                                     model_version=meta.get("model_version"))
+        if stored is not None:
+            prediction_logger.log(stored["features_used"] or {"Location": city}, stored, date=date)
+            return jsonify({"ok": True, "source": "forecast", **meta, **stored})
+
     # build features (try external fetchers, else demo)
     try:
-        features = build_features_from_external(city=city, date=date, time=time)
+        with stage("features"):
+            features = build_features_from_external(city=city, date=date, time=time)
     except Exception as e:
         features = {"Location": city, "Date_month": 1, "Date_day": 1}
         # continue, we'll return error if prediction fails
 
-    # get wrapper from app (set in app.py if available)
-    wrapper = getattr(current_app, "model_wrapper", None)
-
     # if no wrapper, return demo prediction
     if not wrapper:
         # simple demo probability heuristic
@@ -150,12 +220,27 @@ def predict_auto():
             "note": "demo_prediction_no_model"
         })
 
+    # preferred path: the wrapper encodes features through the model's compiled
+    # feature schema (validated, coerced and defaulted in one pass, no DataFrame)
+    if hasattr(wrapper, "predict_from_dict"):
+        out = wrapper.predict_from_dict(features)
+        if out.get("prediction") is None:
+            return jsonify({"ok": False, "error": f"model predict failed: {out.get('error')}"}), 500
+        prediction_logger.log(features, out, date=date)
+        meta = {k: v for k, v in out.items() if k.startswith("model_") or k == "cache"}
+        return jsonify({"ok": True, "source": "live", "prediction": out["prediction"],
+                        "probabilities": out["probabilities"], "features_used": features, **meta})
+
     # Build DataFrame and call the wrapper safely
     try:
-        X = _make_dataframe_from_features(features, wrapper)
+        with stage("dataframe"):
+            X = _make_dataframe_from_features(features, wrapper)
     except Exception as e:
         return jsonify({"ok": False, "error": f"failed to build features DataFrame: {e}"}), 500
 
+    # model identity / last hot-swap latency, reported with the prediction
+    meta = wrapper.metadata() if hasattr(wrapper, "metadata") else {}
+
     # call prediction method(s)
     try:
         # prefer wrapper.predict_from_df
@@ -186,7 +271,7 @@ def predict_auto():
         # - pred_out is list/ndarray of labels
         # - pred_out is dict already containing prediction/probabilities
         if isinstance(pred_out, dict):
-            return jsonify({"ok": True, **pred_out})
+            return jsonify({"ok": True, **meta, **pred_out})
         else:
             # try to interpret as numpy array
             try:
@@ -195,15 +280,15 @@ def predict_auto():
                 if arr.ndim == 2 and arr.shape[1] >= 2:
                     probs = arr.tolist()
                     preds = [int(np.argmax(r)) for r in probs]
-                    return jsonify({"ok": True, "prediction": preds, "probabilities": probs, "features_used": features})
+                    return jsonify({"ok": True, "prediction": preds, "probabilities": probs, "features_used": features, **meta})
                 elif arr.ndim == 1:
                     preds = arr.tolist()
-                    return jsonify({"ok": True, "prediction": preds, "features_used": features})
+                    return jsonify({"ok": True, "prediction": preds, "features_used": features, **meta})
             except Exception:
                 pass
 
             # fallback generic
-            return jsonify({"ok": True, "prediction_raw": str(pred_out), "features_used": features})
+            return jsonify({"ok": True, "prediction_raw": str(pred_out), "features_used": features, **meta})
 
     except Exception as e:
         tb = traceback.format_exc()
@@ -0,0 +1,158 @@
+# api/utils/aqi_record.py
+"""
+Compact AQI readings and the US-EPA AQI.
+
+Upstream payloads are reduced to `Measurement` records (parameter, value,
+unit, timestamp, location, source) as soon as they are parsed; only these
+records are cached and serialized. Records answer `.get()` with the JSON key
+names (`lastUpdated`, `sourceName`, ...), so code that reads measurement dicts
+keeps working.
+
+`us_aqi()` converts each pollutant to the EPA reporting unit (µg/m³ for
+particles, ppm for O3/CO, ppb for NO2/SO2, at 25 °C) and applies the EPA
+breakpoint tables; the result is the highest sub-index. Readings are
+instantaneous, not the regulatory 8/24-hour averages, so this is a
+current-conditions estimate.
+"""
+
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# OpenAQ and OpenWeather spell some pollutants differently
+PARAMETER_ALIASES = {"pm2_5": "pm25", "pm2.5": "pm25"}
+
+# (concentration low, concentration high, AQI low, AQI high), EPA reporting units
+BREAKPOINTS = {
+    "pm25": [(0.0, 9.0, 0, 50), (9.1, 35.4, 51, 100), (35.5, 55.4, 101, 150),
+             (55.5, 125.4, 151, 200), (125.5, 225.4, 201, 300), (225.5, 325.4, 301, 500)],
+    "pm10": [(0, 54, 0, 50), (55, 154, 51, 100), (155, 254, 101, 150),
+             (255, 354, 151, 200), (355, 424, 201, 300), (425, 604, 301, 500)],
+    # EPA 8-hour table; it ends at 0.200 ppm (see O3_1H_BREAKPOINTS above that)
+    "o3": [(0.000, 0.054, 0, 50), (0.055, 0.070, 51, 100), (0.071, 0.085, 101, 150),
+           (0.086, 0.105, 151, 200), (0.106, 0.200, 201, 300)],
+    "no2": [(0, 53, 0, 50), (54, 100, 51, 100), (101, 360, 101, 150),
+            (361, 649, 151, 200), (650, 1249, 201, 300), (1250, 2049, 301, 500)],
+    "so2": [(0, 35, 0, 50), (36, 75, 51, 100), (76, 185, 101, 150),
+            (186, 304, 151, 200), (305, 604, 201, 300), (605, 1004, 301, 500)],
+    "co": [(0.0, 4.4, 0, 50), (4.5, 9.4, 51, 100), (9.5, 12.4, 101, 150),
+           (12.5, 15.4, 151, 200), (15.5, 30.4, 201, 300), (30.5, 50.4, 301, 500)],
+}
+
+# EPA 1-hour O3 table, used for concentrations the 8-hour table doesn't cover (> 0.200 ppm)
+O3_1H_BREAKPOINTS = [(0.125, 0.164, 101, 150), (0.165, 0.204, 151, 200),
+                     (0.205, 0.404, 201, 300), (0.405, 0.604, 301, 500)]
+
+# EPA reporting unit and truncation (decimal places) per pollutant
+REPORTING = {"pm25": ("µg/m³", 1), "pm10": ("µg/m³", 0), "o3": ("ppm", 3),
+             "no2": ("ppb", 0), "so2": ("ppb", 0), "co": ("ppm", 1)}
+
+# molecular weights for µg/m³ -> ppb at 25 °C and 1 atm (ppb = µg/m³ * 24.45 / MW)
+MOLECULAR_WEIGHT = {"o3": 48.00, "no2": 46.01, "so2": 64.07, "co": 28.01}
+
+CATEGORIES = [(50, "Good"), (100, "Moderate"), (150, "Unhealthy for Sensitive Groups"),
+              (200, "Unhealthy"), (300, "Very Unhealthy"), (500, "Hazardous")]
+
+
+class Measurement:
+    """One normalized pollutant reading."""
+    __slots__ = ("parameter", "value", "unit", "last_updated", "location", "source")
+
+    # JSON key -> attribute
+    FIELDS = {"location": "location", "parameter": "parameter", "value": "value", "unit": "unit",
+              "lastUpdated": "last_updated", "sourceName": "source"}
+
+    def __init__(self, parameter, value, unit, last_updated=None, location=None, source=None):
+        self.parameter = parameter
+        self.value = value
+        self.unit = unit
+        self.last_updated = last_updated
+        self.location = location
+        self.source = source
+
+    @classmethod
+    def from_dict(cls, m: Dict[str, Any]) -> "Measurement":
+        return cls(m.get("parameter"), m.get("value"), m.get("unit"),
+                   m.get("lastUpdated"), m.get("location"), m.get("sourceName"))
+
+    def get(self, key, default=None):
+        attr = self.FIELDS.get(key)
+        return default if attr is None else getattr(self, attr)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, attr) for key, attr in self.FIELDS.items()}
+
+    def __repr__(self):
+        return f"Measurement({self.parameter}={self.value} {self.unit})"
+
+
+def _normalize_unit(unit) -> str:
+    unit = (unit or "").strip().lower().replace("³", "3")
+    return {"µg/m3": "ug/m3", "μg/m3": "ug/m3"}.get(unit, unit)
+
+
+def to_reporting_unit(parameter: str, value: float, unit) -> Optional[float]:
+    """`value` converted to the EPA reporting unit for `parameter`, or None if the unit is unknown."""
+    target = _normalize_unit(REPORTING[parameter][0])
+    unit = _normalize_unit(unit) or "ug/m3"
+    if unit == target:
+        return value
+    if parameter not in MOLECULAR_WEIGHT:
+        return None
+    if unit == "ug/m3":
+        ppb = value * 24.45 / MOLECULAR_WEIGHT[parameter]
+    elif unit == "ppm":
+        ppb = value * 1000.0
+    elif unit == "ppb":
+        ppb = value
+    else:
+        return None
+    return ppb / 1000.0 if target == "ppm" else ppb
+
+
+def sub_index(parameter: str, value: float, unit) -> Optional[int]:
+    """EPA AQI for one pollutant reading (None for pollutants without an EPA scale)."""
+    parameter = PARAMETER_ALIASES.get(parameter, parameter)
+    if parameter not in BREAKPOINTS or value is None:
+        return None
+    try:
+        c = to_reporting_unit(parameter, float(value), unit)
+    except (TypeError, ValueError):
+        return None
+    if c is None or c < 0:
+        return None
+    scale = 10 ** REPORTING[parameter][1]
+    c = int(c * scale) / scale
+    table = BREAKPOINTS[parameter]
+    if parameter == "o3" and c > table[-1][1]:
+        table = O3_1H_BREAKPOINTS
+    for c_lo, c_hi, i_lo, i_hi in table:
+        if c <= c_hi:
+            return round((i_hi - i_lo) / (c_hi - c_lo) * (max(c, c_lo) - c_lo) + i_lo)
+    return 500
+
+
+def category(aqi: Optional[int]) -> Optional[str]:
+    if aqi is None:
+        return None
+    for upper, name in CATEGORIES:
+        if aqi <= upper:
+            return name
+    return CATEGORIES[-1][1]
+
+
+def us_aqi(measurements: Iterable[Measurement]) -> Tuple[Optional[int], Optional[str], Optional[str]]:
+    """(aqi, category, dominant pollutant) over the measurements; (None, None, None) if none qualify."""
+    best, dominant = None, None
+    for m in measurements:
+        idx = sub_index((m.get("parameter") or "").lower(), m.get("value"), m.get("unit"))
+        if idx is not None and (best is None or idx > best):
+            best, dominant = idx, PARAMETER_ALIASES.get(m.get("parameter").lower(), m.get("parameter").lower())
+    return best, category(best), dominant
+
+
+def public(result: Dict[str, Any], include_raw: bool = False) -> Dict[str, Any]:
+    """JSON-ready copy of a fetch_aqi_for-shaped result; `raw` only when asked for and present."""
+    out = {k: v for k, v in result.items() if k != "raw"}
+    out["measurements"] = [m.to_dict() if isinstance(m, Measurement) else m for m in result.get("measurements") or ()]
+    if include_raw:
+        out["raw"] = result.get("raw")
+    return out
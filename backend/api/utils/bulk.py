@@ -0,0 +1,266 @@
+# api/utils/bulk.py
+"""
+Multi-city AQI and weather lookups for /api/aqi/bulk and /api/weather/bulk.
+
+Both generators yield (city, result) pairs as each city completes:
+
+- cities are deduplicated case/whitespace-insensitively (first spelling kept)
+- cached values (the same keys the single-city fetchers use) are yielded
+  first, without any upstream call
+- coordinates come from the local geocode index; only unknown cities are
+  geocoded remotely
+- AQI: the remaining cities go to OpenAQ in batches of BULK_OPENAQ_BATCH
+  cities per v2/latest query; cities OpenAQ has no data for fall back to the
+  OpenWeather air-pollution API, one call per distinct coordinate
+- weather: one OneCall request per distinct coordinate, shared by every city
+  that resolves to it, built and cached exactly as /api/weather does (the
+  per-coordinate "onecall" entry), so each line matches that endpoint
+- fresh results are written to the upstream cache (and the observation
+  store), so later single-city requests are hits
+- a request runs at most BULK_REQUEST_CONCURRENCY tasks at a time on the
+  shared BULK_WORKERS pool, so one large request can't starve the others
+- cities still running (or still queued) after BULK_DEADLINE seconds are
+  yielded as {"ok": False, "error": "timeout"}
+"""
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, Iterator, List, Tuple
+
+from api.utils.aqi_record import Measurement
+from api.utils.cache import upstream_cache
+from api.utils.geocode_index import geocode_index, normalize_city
+from api.utils.observation_store import observation_store
+from metrics import bind
+
+MAX_CITIES = int(os.environ.get("BULK_MAX_CITIES", "100"))
+OPENAQ_BATCH = int(os.environ.get("BULK_OPENAQ_BATCH", "25"))
+WORKERS = int(os.environ.get("BULK_WORKERS", "16"))
+# tasks one request may have in flight on the shared pool
+REQUEST_CONCURRENCY = int(os.environ.get("BULK_REQUEST_CONCURRENCY", "4"))
+DEADLINE_SECONDS = float(os.environ.get("BULK_DEADLINE", "20"))
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Process-wide pool, recreated after a fork so workers don't share threads."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="bulk")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def dedupe_cities(cities) -> List[str]:
+    seen, out = set(), []
+    for c in cities:
+        c = str(c or "").strip()
+        key = normalize_city(c)
+        if c and key not in seen:
+            seen.add(key)
+            out.append(c)
+    return out
+
+
+def cities_from_request(req) -> List[str]:
+    """
+    Cities from `?cities=a,b,c` (or repeated `?city=`), or a POST body that is
+    a JSON list or {"cities": [...]}. Raises ValueError on a bad or oversized list.
+    """
+    if req.method == "POST":
+        payload = req.get_json(silent=True)
+        if isinstance(payload, dict):
+            payload = payload.get("cities")
+        if not isinstance(payload, list):
+            raise ValueError("body must be a JSON list of cities or {\"cities\": [...]}")
+        cities = payload
+    else:
+        cities = [c for v in req.args.getlist("cities") for c in v.split(",")]
+        cities += req.args.getlist("city")
+    cities = dedupe_cities(cities)
+    if not cities:
+        raise ValueError("cities required")
+    if len(cities) > MAX_CITIES:
+        raise ValueError(f"at most {MAX_CITIES} cities per request (got {len(cities)})")
+    return cities
+
+
+def ndjson_lines(results: Iterator[Tuple[str, Dict[str, Any]]]) -> Iterator[str]:
+    """One JSON line per city as it completes, then a {"done": true} summary line."""
+    started = time.perf_counter()
+    counts = {"succeeded": 0, "failed": 0, "timed_out": 0}
+    for _, out in results:
+        if out.get("ok"):
+            counts["succeeded"] += 1
+        elif out.get("error") == "timeout":
+            counts["timed_out"] += 1
+        else:
+            counts["failed"] += 1
+        yield json.dumps(out, default=str) + "\n"
+    yield json.dumps(dict(counts, done=True, seconds=round(time.perf_counter() - started, 3))) + "\n"
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), max(size, 1)):
+        yield items[i:i + size]
+
+
+def _group_by_coords(cities) -> Tuple[List[List[str]], List[str]]:
+    """(groups of cities sharing indexed coordinates, cities not in the index)."""
+    groups, unknown = {}, []
+    for c in cities:
+        coords = geocode_index.get(c)
+        if coords is None:
+            unknown.append(c)
+        else:
+            groups.setdefault((round(coords[0], 4), round(coords[1], 4)), []).append(c)
+    return list(groups.values()), unknown
+
+
+def _drain(pool, initial, deadline) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Run tasks until all finish or `deadline` passes, at most
+    REQUEST_CONCURRENCY at a time. A task returns (results, follow_ups):
+    results are yielded, follow_ups (callables) are queued. Cities of
+    unfinished tasks are yielded as timeouts.
+    """
+    queued = list(initial)
+    running = {}
+    expires = time.monotonic() + deadline
+
+    def submit():
+        while queued and len(running) < max(REQUEST_CONCURRENCY, 1):
+            fn, cities = queued.pop(0)
+            running[pool.submit(bind(fn))] = cities
+
+    submit()
+    while running:
+        done, _ = wait(running, timeout=max(expires - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for fut in done:
+            cities = running.pop(fut)
+            try:
+                results, follow_ups = fut.result()
+            except Exception as e:
+                results, follow_ups = [(c, {"city": c, "ok": False, "error": str(e)}) for c in cities], []
+            yield from results
+            queued.extend(follow_ups)
+        submit()
+    for fut, cities in running.items():
+        # still running: the result lands in the cache for the next request
+        fut.cancel()
+        for c in cities:
+            yield c, {"city": c, "ok": False, "error": "timeout"}
+    for _, cities in queued:
+        for c in cities:
+            yield c, {"city": c, "ok": False, "error": "timeout"}
+
+
+# ----------------------------------------------------------------------
+# AQI
+# ----------------------------------------------------------------------
+def _publish_aqi(city, out):
+    if out.get("ok"):
+        upstream_cache.put("aqi", {"city": city, "limit": 1}, out)
+        observation_store.record_aqi(city, out)
+    return out
+
+
+def _openweather_group(cities, timeout):
+    """One air-pollution call for cities sharing coordinates (or a single un-indexed city)."""
+    from api.utils.fetch_aqi import fetch_openweather_aqi_by_city, summarize
+
+    def task():
+        leader = cities[0]
+        ow = fetch_openweather_aqi_by_city(leader, timeout=timeout, coords=geocode_index.get(leader))
+        results = []
+        for c in cities:
+            if ow.get("ok") and ow.get("measurements"):
+                measurements = [Measurement(m.parameter, m.value, m.unit, m.last_updated, f"{c} (openweather)", m.source)
+                                for m in ow["measurements"]]
+                out = _publish_aqi(c, summarize(c, measurements, ow["fetched_at"],
+                                                openweather_index=ow.get("openweather_index")))
+            else:
+                out = {"city": c, "aqi": None, "category": None, "measurements": [], "ok": False,
+                       "error": ow.get("error") or "no data", "fetched_at": ow.get("fetched_at"), "raw": None}
+            results.append((c, out))
+        return results, []
+    return task, cities
+
+
+def _openaq_batch(cities, timeout):
+    from api.utils.fetch_aqi import fetch_openaq_latest_many, summarize, _openaq_measurements
+
+    def task():
+        batch = fetch_openaq_latest_many(cities, timeout=timeout)
+        results, missing = [], []
+        for c in cities:
+            locs = batch["by_city"].get(normalize_city(c))
+            if locs:
+                # first location per city, like the single-city fetch with limit=1
+                results.append((c, _publish_aqi(c, summarize(c, _openaq_measurements(locs[0])))))
+            else:
+                missing.append(c)
+        groups, unknown = _group_by_coords(missing)
+        follow_ups = [_openweather_group(g, timeout) for g in groups]
+        follow_ups += [_openweather_group([c], timeout) for c in unknown]
+        return results, follow_ups
+    return task, cities
+
+
+def bulk_aqi(cities, timeout: int = 8, deadline: float = DEADLINE_SECONDS) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    pending = []
+    for c in dedupe_cities(cities):
+        hit = upstream_cache.get("aqi", {"city": c, "limit": 1})
+        if hit is not None:
+            yield c, hit
+        else:
+            pending.append(c)
+    if pending:
+        yield from _drain(_get_executor(), [_openaq_batch(chunk, timeout) for chunk in _chunks(pending, OPENAQ_BATCH)],
+                          deadline)
+
+
+# ----------------------------------------------------------------------
+# weather
+# ----------------------------------------------------------------------
+def localize(features, city, day=None):
+    """Copy of coordinate-level weather features for `city` (and `day`'s month/day, if given)."""
+    out = dict(features, Location=city)
+    if day is not None:
+        out.update(Date_month=day.month, Date_day=day.day)
+    return out
+
+
+def _weather_group(cities, api_key, day):
+    """One OneCall fetch shared by cities with the same coordinates (or one un-indexed city)."""
+    from api.weather import _geo_lookup, _onecall_features
+
+    def task():
+        lat, lon = _geo_lookup(cities[0], api_key)
+        features = _onecall_features(lat, lon, api_key)
+        return [(c, {"city": c, "ok": True, "features": localize(features, c, day)}) for c in cities], []
+    return task, cities
+
+
+def bulk_weather(cities, api_key, day=None, deadline: float = DEADLINE_SECONDS) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    pending = []
+    for c in dedupe_cities(cities):
+        coords = geocode_index.get(c)
+        hit = upstream_cache.get("onecall", {"lat": float(coords[0]), "lon": float(coords[1])}) if coords else None
+        if hit is not None:
+            yield c, {"city": c, "ok": True, "features": localize(hit, c, day)}
+        else:
+            pending.append(c)
+    if pending:
+        groups, unknown = _group_by_coords(pending)
+        tasks = [_weather_group(g, api_key, day) for g in groups] + [_weather_group([c], api_key, day) for c in unknown]
+        yield from _drain(_get_executor(), tasks, deadline)
@@ -0,0 +1,249 @@
+# api/utils/cache.py
+"""
+Shared in-process cache for upstream (OpenWeather / OpenAQ) responses.
+- keyed by source ("weather", "aqi", "onecall", ...) + normalized params
+- per-source TTL; after it expires the entry is served stale for a grace
+  window while a single background refresh runs, so a slow upstream never
+  blocks a hot city
+- LRU eviction bounded by entry count and (approximate) bytes
+- concurrent misses for the same key share one fetch (single-flight)
+- hit / miss / eviction counters via `stats()`
+"""
+
+import os
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from api.utils.singleflight import SingleFlight
+
+# seconds a value is served as fresh, per source (override with CACHE_TTL_<SOURCE>)
+DEFAULT_TTLS = {
+    "weather": 600,
+    "onecall": 600,
+    "aqi": 900,
+}
+DEFAULT_TTL = 300
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _normalize_value(v):
+    if isinstance(v, str):
+        return " ".join(v.split()).casefold()
+    if isinstance(v, float):
+        # ~11 m precision; keeps lat/lon keys stable across geocode jitter
+        return round(v, 4)
+    if v is None or isinstance(v, (int, bool)):
+        return v
+    return str(v)
+
+
+def normalize_params(params: Optional[Dict[str, Any]]) -> tuple:
+    """Stable, hashable form of a params dict (case/whitespace-insensitive strings)."""
+    return tuple(sorted((k, _normalize_value(v)) for k, v in (params or {}).items()))
+
+
+def _json_default(o):
+    # compact records (e.g. AQI measurements) size as their JSON form
+    return o.to_dict() if hasattr(o, "to_dict") else str(o)
+
+
+def _sizeof(value) -> int:
+    try:
+        return len(json.dumps(value, default=_json_default))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def _copy(value):
+    # callers get their own top-level container, so setting a key on a result
+    # (e.g. "Location") never mutates the shared entry
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+
+class _Entry:
+    __slots__ = ("value", "size", "fresh_until", "stale_until")
+
+    def __init__(self, value, size, fresh_until, stale_until):
+        self.value = value
+        self.size = size
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class UpstreamCache:
+    """TTL + LRU cache with stale-while-revalidate. Thread-safe."""
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 32 * 1024 * 1024,
+                 ttls: Optional[Dict[str, int]] = None, stale_seconds: int = 300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.stale_seconds = stale_seconds
+        self._data: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._refreshing = set()
+        self._flights = SingleFlight()
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "uncacheable": 0,
+        }
+
+    def ttl_for(self, source: str) -> int:
+        return _env_int(f"CACHE_TTL_{source.upper()}", self.ttls.get(source, DEFAULT_TTL))
+
+    @staticmethod
+    def make_key(source: str, params: Optional[Dict[str, Any]]) -> tuple:
+        return (source, normalize_params(params))
+
+    def get_or_fetch(self, source: str, params: Optional[Dict[str, Any]], fetch: Callable[[], Any],
+                     cacheable: Optional[Callable[[Any], bool]] = None):
+        """
+        Return (a shallow copy of) the cached value for (source, params), calling `fetch()` on a miss.
+        Stale entries are returned immediately and refreshed in the background.
+        Values for which `cacheable(value)` is falsy (e.g. error results) are
+        returned but not stored. Exceptions from `fetch` propagate on a miss.
+        Concurrent misses for the same key wait for a single `fetch()` and
+        share its result or exception.
+        """
+        key = self.make_key(source, params)
+        now = time.monotonic()
+        refresh = False
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and now < entry.fresh_until:
+                self._data.move_to_end(key)
+                self._counters["hits"] += 1
+                return _copy(entry.value)
+            if entry is not None and now < entry.stale_until:
+                self._data.move_to_end(key)
+                self._counters["stale_hits"] += 1
+                if key not in self._refreshing:
+                    self._refreshing.add(key)
+                    refresh = True
+            else:
+                entry = None
+                self._counters["misses"] += 1
+
+        if entry is not None:
+            if refresh:
+                threading.Thread(
+                    target=self._refresh, args=(key, source, fetch, cacheable),
+                    name=f"cache-refresh-{source}", daemon=True,
+                ).start()
+            return _copy(entry.value)
+
+        return _copy(self._flights.do(key, lambda: self._fetch_and_store(key, source, fetch, cacheable)))
+
+    def _fetch_and_store(self, key, source, fetch, cacheable):
+        # a previous flight may have stored the value between our miss and
+        # becoming leader; don't fetch it a second time
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and time.monotonic() < entry.fresh_until:
+                self._data.move_to_end(key)
+                return entry.value
+        value = fetch()
+        self._store(key, source, value, cacheable)
+        return value
+
+    def get(self, source: str, params: Optional[Dict[str, Any]]):
+        """Cached value (a shallow copy) for (source, params), fresh or stale, or None; never fetches."""
+        key = self.make_key(source, params)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or now >= entry.stale_until:
+                self._counters["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self._counters["hits" if now < entry.fresh_until else "stale_hits"] += 1
+            return _copy(entry.value)
+
+    def put(self, source: str, params: Optional[Dict[str, Any]], value) -> None:
+        self._store(self.make_key(source, params), source, value, None)
+
+    def _refresh(self, key, source, fetch, cacheable):
+        try:
+            value = fetch()
+            self._store(key, source, value, cacheable)
+            with self._lock:
+                self._counters["refreshes"] += 1
+        except Exception:
+            with self._lock:
+                self._counters["refresh_errors"] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, key, source, value, cacheable):
+        if cacheable is not None and not cacheable(value):
+            with self._lock:
+                self._counters["uncacheable"] += 1
+            return
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            with self._lock:
+                self._counters["uncacheable"] += 1
+            return
+        ttl = self.ttl_for(source)
+        now = time.monotonic()
+        entry = _Entry(value, size, now + ttl, now + ttl + self.stale_seconds)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._data[key] = entry
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= evicted.size
+                self._counters["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._counters)
+            out.update({
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "refreshing": len(self._refreshing),
+            })
+        out["singleflight"] = self._flights.stats()
+        lookups = out["hits"] + out["stale_hits"] + out["misses"]
+        out["hit_ratio"] = round((out["hits"] + out["stale_hits"]) / lookups, 4) if lookups else 0.0
+        return out
+
+
+# process-wide instance shared by all fetchers
+upstream_cache = UpstreamCache(
+    max_entries=_env_int("CACHE_MAX_ENTRIES", 2048),
+    max_bytes=_env_int("CACHE_MAX_BYTES", 32 * 1024 * 1024),
+    stale_seconds=_env_int("CACHE_STALE_SECONDS", 300),
+)
@@ -3,78 +3,142 @@
 Robust AQI fetcher for EnviroWatch.
 1) Try OpenAQ v2/latest
 2) If OpenAQ fails or empty -> fallback to OpenWeather Air Pollution API
+
+Results carry compact `Measurement` records plus the computed US-EPA AQI,
+category and dominant pollutant. The upstream JSON (`raw`) is kept only when
+a caller asks for it with include_raw=True; it is never cached.
 """
 
 import os
-import requests
 from datetime import datetime
 from typing import Dict, Any
+from api.utils.aqi_record import Measurement, us_aqi
+from api.utils.cache import upstream_cache
+from api.utils.http_client import upstream_get, OPENWEATHER_BASE_URL, OPENAQ_BASE_URL
+from api.utils.geocode_index import geocode_index
+from api.utils.observation_store import observation_store
+
+OPENAQ_BASE = f"{OPENAQ_BASE_URL}/v2/latest"
+OW_GEO = f"{OPENWEATHER_BASE_URL}/geo/1.0/direct"
+OW_AIR = f"{OPENWEATHER_BASE_URL}/data/2.5/air_pollution"
 
-OPENAQ_BASE = "https://api.openaq.org/v2/latest"
-OW_GEO = "http://api.openweathermap.org/geo/1.0/direct"
-OW_AIR = "http://api.openweathermap.org/data/2.5/air_pollution"
+# v2/latest pages fetched per multi-city query (each page holds OPENAQ_PAGE_LIMIT locations)
+OPENAQ_PAGE_LIMIT = int(os.environ.get("OPENAQ_PAGE_LIMIT", "100"))
+OPENAQ_MAX_PAGES = int(os.environ.get("OPENAQ_MAX_PAGES", "5"))
 
 
 def _now_iso():
     return datetime.utcnow().isoformat() + "Z"
 
 
+def summarize(city: str, measurements, fetched_at=None, raw=None, **extra) -> Dict[str, Any]:
+    """Successful fetch_aqi_for-shaped result for `measurements`, with the EPA AQI computed."""
+    aqi, category, dominant = us_aqi(measurements)
+    return dict(extra, city=city, aqi=aqi, category=category, dominant=dominant,
+                measurements=list(measurements), ok=True, fetched_at=fetched_at or _now_iso(), raw=raw)
+
+
 # ----------------------------------------------------
 #  OPENAQ FETCH
 # ----------------------------------------------------
-def fetch_openaq_latest(city: str, limit: int = 1, timeout: int = 8) -> Dict[str, Any]:
+def fetch_openaq_latest(city: str, limit: int = 1, timeout: int = 8, include_raw: bool = False) -> Dict[str, Any]:
     params = {"city": city, "limit": limit}
     try:
-        r = requests.get(OPENAQ_BASE, params=params, timeout=timeout)
+        r = upstream_get(OPENAQ_BASE, params=params, timeout=timeout)
         r.raise_for_status()
         data = r.json()
     except Exception as e:
         return {"city": city, "measurements": [], "ok": False, "error": str(e), "fetched_at": _now_iso(), "raw": None}
 
     results = data.get("results", [])
-    out = {"city": city, "measurements": [], "ok": bool(results), "fetched_at": _now_iso(), "raw": data}
+    out = {"city": city, "measurements": [], "ok": bool(results), "fetched_at": _now_iso(),
+           "raw": data if include_raw else None}
 
     if not results:
         return out
 
     for loc in results[:limit]:
-        loc_name = loc.get("location")
-        for m in loc.get("measurements", []):
-            out["measurements"].append({
-                "location": loc_name,
-                "parameter": m.get("parameter"),
-                "value": m.get("value"),
-                "unit": m.get("unit"),
-                "lastUpdated": m.get("lastUpdated"),
-                "sourceName": m.get("sourceName") or loc.get("sourceName")
-            })
+        out["measurements"].extend(_openaq_measurements(loc))
 
     return out
 
 
+def _openaq_measurements(loc: Dict[str, Any]) -> list:
+    """Normalized measurements of one OpenAQ `results` entry."""
+    loc_name = loc.get("location")
+    return [Measurement(m.get("parameter"), m.get("value"), m.get("unit"), m.get("lastUpdated"),
+                        loc_name, m.get("sourceName") or loc.get("sourceName"))
+            for m in loc.get("measurements", [])]
+
+
+def _found(meta):
+    # v2 reports `found` as an int, or as a string like ">1000" for large result sets
+    try:
+        return int(meta.get("found"))
+    except (TypeError, ValueError):
+        return None
+
+
+def fetch_openaq_latest_many(cities, timeout: int = 8) -> Dict[str, Any]:
+    """
+    OpenAQ v2/latest for several cities (`city` may be repeated), paging
+    through the results until every city has a location, the reported
+    `meta.found` is exhausted or OPENAQ_MAX_PAGES pages have been read.
+    Returns {"ok", "error", "by_city": {normalized city: [results entries]}};
+    cities OpenAQ has nothing for are simply absent from `by_city`.
+    """
+    from api.utils.geocode_index import normalize_city
+
+    wanted = {normalize_city(c) for c in cities}
+    by_city = {}
+    for page in range(1, max(OPENAQ_MAX_PAGES, 1) + 1):
+        params = {"city": list(cities), "limit": OPENAQ_PAGE_LIMIT, "page": page}
+        try:
+            r = upstream_get(OPENAQ_BASE, params=params, timeout=timeout)
+            r.raise_for_status()
+            data = r.json()
+        except Exception as e:
+            if page == 1:
+                return {"ok": False, "error": str(e), "by_city": {}}
+            break  # keep what the earlier pages returned
+        results = data.get("results", [])
+        for loc in results:
+            if loc.get("city") and loc.get("measurements"):
+                by_city.setdefault(normalize_city(loc["city"]), []).append(loc)
+        found = _found(data.get("meta") or {})
+        if len(results) < OPENAQ_PAGE_LIMIT or (found is not None and page * OPENAQ_PAGE_LIMIT >= found) \
+                or wanted <= by_city.keys():
+            break
+    return {"ok": True, "error": None, "by_city": by_city}
+
+
 # ----------------------------------------------------
 #  OPENWEATHER FALLBACK
 # ----------------------------------------------------
-def fetch_openweather_aqi_by_city(city: str, timeout: int = 8) -> Dict[str, Any]:
+def fetch_openweather_aqi_by_city(city: str, timeout: int = 8, coords=None, include_raw: bool = False) -> Dict[str, Any]:
     key = os.environ.get("OPENWEATHER_API_KEY")
     if not key:
         return {"city": city, "ok": False, "error": "Missing OPENWEATHER_API_KEY",
                 "measurements": [], "fetched_at": _now_iso(), "raw": None}
 
     try:
-        # Step 1: Geocode
-        geo = requests.get(OW_GEO, params={"q": city, "limit": 1, "appid": key}, timeout=timeout)
-        geo.raise_for_status()
-        g = geo.json()
-
-        if not g:
+        # Step 1: Geocode (persistent index first, network only on a miss)
+        def remote(q):
+            geo = upstream_get(OW_GEO, params={"q": q, "limit": 1, "appid": key}, timeout=timeout)
+            geo.raise_for_status()
+            g = geo.json()
+            if not g:
+                raise LookupError("geocode_empty")
+            return g[0]["lat"], g[0]["lon"]
+
+        try:
+            lat, lon = coords or geocode_index.resolve(city, remote)
+        except LookupError:
             return {"city": city, "ok": False, "error": "geocode_empty",
                     "measurements": [], "fetched_at": _now_iso(), "raw": None}
 
-        lat, lon = g[0]["lat"], g[0]["lon"]
-
         # Step 2: Air pollution
-        ap = requests.get(OW_AIR, params={"lat": lat, "lon": lon, "appid": key}, timeout=timeout)
+        ap = upstream_get(OW_AIR, params={"lat": lat, "lon": lon, "appid": key}, timeout=timeout)
         ap.raise_for_status()
         raw = ap.json()
 
@@ -83,22 +147,16 @@ def fetch_openweather_aqi_by_city(city: str, timeout: int = 8) -> Dict[str, Any]
                 "measurements": [], "fetched_at": _now_iso(), "raw": None}
 
     measurements = []
-    aqi_val = 0
+    ow_index = None
 
     try:
         rows = raw.get("list", [])
         if rows:
             comp = rows[0].get("components", {})
+            now = _now_iso()
             for k, v in comp.items():
-                measurements.append({
-                    "location": f"{city} (openweather)",
-                    "parameter": k,
-                    "value": v,
-                    "unit": "µg/m3",
-                    "lastUpdated": _now_iso(),
-                    "sourceName": "openweather"
-                })
-            aqi_val = rows[0].get("main", {}).get("aqi", 0)
+                measurements.append(Measurement(k, v, "µg/m3", now, f"{city} (openweather)", "openweather"))
+            ow_index = rows[0].get("main", {}).get("aqi")
     except:
         pass
 
@@ -106,49 +164,65 @@ def fetch_openweather_aqi_by_city(city: str, timeout: int = 8) -> Dict[str, Any]
         "city": city,
         "measurements": measurements,
         "ok": True,
-        "aqi": aqi_val,
+        "openweather_index": ow_index,   # OpenWeather's own 1-5 scale
         "fetched_at": _now_iso(),
-        "raw": raw
+        "raw": raw if include_raw else None
     }
 
 
 # ----------------------------------------------------
 #  MAIN WRAPPER
 # ----------------------------------------------------
-def fetch_aqi_for(city: str, limit: int = 1, timeout: int = 8) -> Dict[str, Any]:
+def fetch_aqi_for(city: str, limit: int = 1, timeout: int = 8, coords=None,
+                  include_raw: bool = False) -> Dict[str, Any]:
     """
     Try OpenAQ → if fails fallback to OpenWeather.
     Always return consistent shape.
+    Successful results are served from the shared upstream cache.
+    `coords=(lat, lon)` lets the OpenWeather fallback skip its geocode step.
+    `include_raw=True` skips the cache (which never holds upstream payloads)
+    and returns the provider's JSON under `raw`; the cache is still refreshed.
     """
+    if include_raw:
+        out = _fetch_aqi_for(city, limit=limit, timeout=timeout, coords=coords, include_raw=True)
+        if out.get("ok"):
+            upstream_cache.put("aqi", {"city": city, "limit": limit}, dict(out, raw=None))
+        return out
+    return upstream_cache.get_or_fetch(
+        "aqi", {"city": city, "limit": limit},
+        lambda: _fetch_aqi_for(city, limit=limit, timeout=timeout, coords=coords),
+        cacheable=lambda r: bool(r.get("ok")),
+    )
+
+
+def _fetch_aqi_for(city: str, limit: int = 1, timeout: int = 8, coords=None,
+                   include_raw: bool = False) -> Dict[str, Any]:
+    # every fresh upstream reading is kept in the local observation store
+    out = _fetch_aqi_upstream(city, limit=limit, timeout=timeout, coords=coords, include_raw=include_raw)
+    if out.get("ok"):
+        observation_store.record_aqi(city, out)
+    return out
+
+
+def _fetch_aqi_upstream(city: str, limit: int = 1, timeout: int = 8, coords=None,
+                        include_raw: bool = False) -> Dict[str, Any]:
 
     # 1) Try OpenAQ
-    oa = fetch_openaq_latest(city=city, limit=limit, timeout=timeout)
+    oa = fetch_openaq_latest(city=city, limit=limit, timeout=timeout, include_raw=include_raw)
     if oa.get("ok") and oa.get("measurements"):
-        return {
-            "city": city,
-            "aqi": 0,                 # OpenAQ doesn't return unified AQI
-            "measurements": oa["measurements"],
-            "ok": True,
-            "fetched_at": oa["fetched_at"],
-            "raw": oa["raw"]
-        }
+        return summarize(city, oa["measurements"], oa["fetched_at"], oa["raw"])
 
     # 2) Fallback → OpenWeather
-    ow = fetch_openweather_aqi_by_city(city=city, timeout=timeout)
+    ow = fetch_openweather_aqi_by_city(city=city, timeout=timeout, coords=coords, include_raw=include_raw)
     if ow.get("ok") and ow.get("measurements"):
-        return {
-            "city": city,
-            "aqi": ow.get("aqi", 0),
-            "measurements": ow["measurements"],
-            "ok": True,
-            "fetched_at": ow["fetched_at"],
-            "raw": ow["raw"]
-        }
+        return summarize(city, ow["measurements"], ow["fetched_at"], ow["raw"],
+                         openweather_index=ow.get("openweather_index"))
 
     # 3) Both failed
     return {
         "city": city,
-        "aqi": 0,
+        "aqi": None,
+        "category": None,
         "measurements": [],
         "ok": False,
         "error": oa.get("error") or ow.get("error") or "no data",
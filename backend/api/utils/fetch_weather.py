@@ -1,31 +1,66 @@
 # api/utils/fetch_weather.py
-import os, requests, datetime
+import os, datetime
+from api.utils.cache import upstream_cache
+from api.utils.http_client import upstream_get, OPENWEATHER_BASE_URL
+from api.utils.geocode_index import geocode_index
+from api.utils.observation_store import observation_store
 
 OPENWEATHER_KEY = os.environ.get("OPENWEATHER_API_KEY")
 
 def geocode_city(city):
+    """Return (lat, lon) for a city, from the persistent geocode index when known."""
+    return geocode_index.resolve(city, geocode_remote)
+
+def geocode_remote(city):
     if not OPENWEATHER_KEY:
         raise RuntimeError("OPENWEATHER_API_KEY not set")
-    url = "http://api.openweathermap.org/geo/1.0/direct"
+    url = f"{OPENWEATHER_BASE_URL}/geo/1.0/direct"
     params = {"q": city, "limit": 1, "appid": OPENWEATHER_KEY}
-    r = requests.get(url, params=params, timeout=10)
+    r = upstream_get(url, params=params, timeout=10)
     r.raise_for_status()
     data = r.json()
     if not data:
         raise ValueError(f"City not found: {city}")
     return data[0]["lat"], data[0]["lon"]
 
-def fetch_weather_for(city, date=None, time=None):
+def fetch_weather_for(city, date=None, time=None, coords=None):
     """
     Return a dict of approximate features needed by the model for the given city/date/time.
     If date/time is today, use current/hourly. For simplicity we pull current + hourly and map to 9am/3pm if requested.
+    Served from the shared upstream cache (keyed on city + date).
+    Pass `coords=(lat, lon)` to skip the geocode step when the caller already has it.
     """
-    lat, lon = geocode_city(city)
-    url = "https://api.openweathermap.org/data/2.5/onecall"
+    return upstream_cache.get_or_fetch(
+        "weather", {"city": city, "date": date},
+        lambda: _fetch_weather_for(city, date=date, time=time, coords=coords),
+    )
+
+def _parse_date(date):
+    # callers pass either a date/datetime or an ISO "YYYY-MM-DD" string
+    if isinstance(date, str):
+        try:
+            return datetime.date.fromisoformat(date.strip()[:10])
+        except ValueError:
+            return None
+    return date
+
+def _fetch_weather_for(city, date=None, time=None, coords=None):
+    lat, lon = coords or geocode_city(city)
+    return weather_features(city, fetch_onecall(city, lat, lon), date=date)
+
+def fetch_onecall(city, lat, lon):
+    """Raw One Call response for (lat, lon), uncached; its current reading is recorded for `city`."""
+    url = f"{OPENWEATHER_BASE_URL}/data/2.5/onecall"
     params = {"lat": lat, "lon": lon, "exclude": "minutely,alerts", "appid": OPENWEATHER_KEY, "units":"metric"}
-    r = requests.get(url, params=params, timeout=10)
+    r = upstream_get(url, params=params, timeout=10)
     r.raise_for_status()
     j = r.json()
+    observation_store.record_weather(city, j.get("current"))
+    return j
+
+def weather_features(city, j, date=None):
+    """Model features for `city` on `date` from a One Call response."""
+    date = _parse_date(date)
 
     # Build simple mapping for required features; we pick 'current' + nearest hourly for 9am/3pm
     now = datetime.datetime.utcnow()
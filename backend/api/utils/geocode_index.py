@@ -0,0 +1,174 @@
+# api/utils/geocode_index.py
+"""
+Persistent city -> (lat, lon) index shared by every geocoding code path.
+
+Backed by a small SQLite file next to envirowatch.db and mirrored in memory,
+so a known city never costs a network round trip. Keys are case- and
+whitespace-insensitive ("New  Delhi", "new delhi" and "NewDelhi" collide).
+On first use an empty index is seeded from data/geocode_seed.csv, which
+covers every `Location` in weatherAUS.csv plus the leaderboard cities.
+
+CLI:
+    python -m api.utils.geocode_index seed [--csv PATH]
+    python -m api.utils.geocode_index seed-locations data/weatherAUS.csv
+    python -m api.utils.geocode_index export [--csv PATH]
+"""
+
+import os
+import csv
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from api.utils.singleflight import SingleFlight
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+INDEX_PATH = os.environ.get("GEOCODE_INDEX_PATH") or os.path.join(BASE_DIR, "geocode_index.db")
+SEED_CSV = os.path.join(BASE_DIR, "data", "geocode_seed.csv")
+
+
+def normalize_city(city: str) -> str:
+    """Case-fold and drop all whitespace."""
+    return "".join(str(city).split()).casefold()
+
+
+class GeocodeIndex:
+    """SQLite-backed geocode index with an in-memory mirror. Thread-safe."""
+
+    def __init__(self, path: str = INDEX_PATH, seed_csv: Optional[str] = SEED_CSV):
+        self.path = path
+        self.seed_csv = seed_csv
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._mem = {}
+        self._flights = SingleFlight()
+
+    def _connection(self):
+        # sqlite connections must not cross a fork; reopen in each worker
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                " key TEXT PRIMARY KEY, name TEXT NOT NULL, lat REAL NOT NULL, lon REAL NOT NULL,"
+                " source TEXT, updated_at REAL)"
+            )
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+            self._mem = {k: (lat, lon) for k, lat, lon in conn.execute("SELECT key, lat, lon FROM geocode")}
+            if not self._mem and self.seed_csv and os.path.exists(self.seed_csv):
+                self._load_csv(self.seed_csv, source="seed")
+        return self._conn
+
+    def _load_csv(self, path: str, source: str) -> int:
+        rows = []
+        with open(path, newline="", encoding="utf-8") as fh:
+            for rec in csv.DictReader(fh):
+                name = (rec.get("city") or rec.get("Location") or "").strip()
+                if not name or not rec.get("lat") or not rec.get("lon"):
+                    continue
+                rows.append((normalize_city(name), name, float(rec["lat"]), float(rec["lon"]), source, time.time()))
+        self._conn.executemany("INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self._conn.commit()
+        for key, _, lat, lon, _, _ in rows:
+            self._mem[key] = (lat, lon)
+        return len(rows)
+
+    def get(self, city: str) -> Optional[Tuple[float, float]]:
+        if not city:
+            return None
+        with self._lock:
+            self._connection()
+            return self._mem.get(normalize_city(city))
+
+    def put(self, city: str, lat: float, lon: float, source: str = "openweather") -> None:
+        key = normalize_city(city)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?, ?)",
+                (key, city.strip(), float(lat), float(lon), source, time.time()),
+            )
+            conn.commit()
+            self._mem[key] = (float(lat), float(lon))
+
+    def resolve(self, city: str, lookup: Callable[[str], Tuple[float, float]]) -> Tuple[float, float]:
+        """Return coordinates for `city`, calling `lookup(city)` only on an index miss.
+        Concurrent misses for the same (normalized) city share one lookup."""
+        hit = self.get(city)
+        if hit is not None:
+            return hit
+        return self._flights.do(normalize_city(city), lambda: self._lookup_and_put(city, lookup))
+
+    def _lookup_and_put(self, city, lookup):
+        lat, lon = lookup(city)
+        self.put(city, lat, lon)
+        return lat, lon
+
+    def seed_from_csv(self, path: str, source: str = "seed") -> int:
+        """Load `city,lat,lon` rows (a `Location` column is accepted for `city`)."""
+        with self._lock:
+            self._connection()
+            return self._load_csv(path, source)
+
+    def export_csv(self, path: str) -> int:
+        with self._lock:
+            rows = list(self._connection().execute("SELECT name, lat, lon FROM geocode ORDER BY name"))
+        with open(path, "w", newline="", encoding="utf-8") as fh:
+            w = csv.writer(fh)
+            w.writerow(["city", "lat", "lon"])
+            w.writerows(rows)
+        return len(rows)
+
+    def __len__(self):
+        with self._lock:
+            self._connection()
+            return len(self._mem)
+
+
+# process-wide index shared by fetch_weather, fetch_aqi and api/weather
+geocode_index = GeocodeIndex()
+
+
+def seed_locations_from_weather_csv(weather_csv: str, lookup: Callable[[str], Tuple[float, float]]) -> dict:
+    """
+    Make sure every distinct `Location` in a weatherAUS.csv-shaped file is
+    indexed, geocoding only the names that are not already present.
+    """
+    import pandas as pd
+
+    names = pd.read_csv(weather_csv, usecols=["Location"])["Location"].dropna().unique()
+    added, failed = [], []
+    for name in names:
+        if geocode_index.get(name) is not None:
+            continue
+        try:
+            geocode_index.resolve(name, lookup)
+            added.append(name)
+        except Exception:
+            failed.append(name)
+    return {"locations": len(names), "added": added, "failed": failed}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the persistent geocode index.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_seed = sub.add_parser("seed", help="load city,lat,lon rows from a CSV")
+    p_seed.add_argument("--csv", default=SEED_CSV)
+    p_loc = sub.add_parser("seed-locations", help="geocode missing Location values of weatherAUS.csv")
+    p_loc.add_argument("weather_csv")
+    p_exp = sub.add_parser("export", help="write the index as a seed CSV")
+    p_exp.add_argument("--csv", default=SEED_CSV)
+    args = parser.parse_args()
+
+    if args.cmd == "seed":
+        print(f"seeded {geocode_index.seed_from_csv(args.csv)} cities into {geocode_index.path}")
+    elif args.cmd == "seed-locations":
+        from api.utils.fetch_weather import geocode_remote
+        print(seed_locations_from_weather_csv(args.weather_csv, geocode_remote))
+    else:
+        print(f"exported {geocode_index.export_csv(args.csv)} cities to {args.csv}")
@@ -0,0 +1,267 @@
+# api/utils/http_client.py
+"""
+Shared HTTP client for upstream providers (OpenWeather, OpenAQ).
+- one pooled, keep-alive requests.Session per provider (per process)
+- separate connect / read timeouts
+- retries with full-jitter exponential backoff, limited by a retry budget
+  so an outage can't multiply upstream load, and by a per-call deadline
+  (read timeouts aren't retried by default)
+- per-provider circuit breaker: after repeated failures the provider is
+  short-circuited for a cool-down instead of costing a full timeout per
+  request, then a single probe decides whether it closes again
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import record_upstream, upstream_endpoint
+
+# provider base URLs (overridable, e.g. to point at local stubs in bench.py)
+OPENWEATHER_BASE_URL = os.environ.get("OPENWEATHER_BASE_URL", "https://api.openweathermap.org").rstrip("/")
+OPENAQ_BASE_URL = os.environ.get("OPENAQ_BASE_URL", "https://api.openaq.org").rstrip("/")
+
+# host[:port] -> provider name; anything else uses "default"
+PROVIDER_HOSTS = {
+    urlsplit(OPENWEATHER_BASE_URL).netloc: "openweather",
+    urlsplit(OPENAQ_BASE_URL).netloc: "openaq",
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+CONNECT_TIMEOUT = _env_float("UPSTREAM_CONNECT_TIMEOUT", 3.0)
+READ_TIMEOUT = _env_float("UPSTREAM_READ_TIMEOUT", 8.0)
+MAX_RETRIES = int(_env_float("UPSTREAM_MAX_RETRIES", 2))
+BACKOFF_BASE = _env_float("UPSTREAM_BACKOFF_BASE", 0.2)
+BACKOFF_CAP = _env_float("UPSTREAM_BACKOFF_CAP", 2.0)
+RETRY_BUDGET_RATIO = _env_float("UPSTREAM_RETRY_BUDGET", 0.2)
+POOL_SIZE = int(_env_float("UPSTREAM_POOL_SIZE", 20))
+CIRCUIT_FAILURES = int(_env_float("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_SECONDS = _env_float("CIRCUIT_RESET_SECONDS", 30.0)
+# a read timeout means the provider is hung, not flaky: by default it isn't
+# retried, and no call (retries included) runs past its overall deadline,
+# read timeout + UPSTREAM_DEADLINE_SLACK seconds
+RETRY_READ_TIMEOUTS = os.environ.get("UPSTREAM_RETRY_READ_TIMEOUTS", "").lower() in ("1", "true", "yes")
+DEADLINE_SLACK = _env_float("UPSTREAM_DEADLINE_SLACK", 2.0)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling a provider whose circuit is open."""
+
+
+class RetryBudget:
+    """Each request earns `ratio` retry tokens (capped); each retry spends one."""
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, cap: float = 10.0):
+        self.ratio = ratio
+        self.cap = cap
+        self._tokens = cap
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.cap, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    @property
+    def tokens(self) -> float:
+        return round(self._tokens, 2)
+
+
+class CircuitBreaker:
+    """closed -> open after `threshold` consecutive failures; open -> half_open after `reset_seconds`."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold: int = CIRCUIT_FAILURES, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    return False
+                self._state = self.HALF_OPEN
+            # half-open: let exactly one probe through
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures}
+
+
+class UpstreamClient:
+    """Pooled session + retry budget + circuit breaker for one provider."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.breaker = CircuitBreaker()
+        self.budget = RetryBudget()
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "retries": 0, "failures": 0, "short_circuited": 0}
+
+    @property
+    def session(self) -> requests.Session:
+        # sessions (and their sockets) must not be shared across a fork
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=0)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                self._session = s
+                self._pid = os.getpid()
+            return self._session
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> requests.Response:
+        """
+        GET with retries. `timeout` is the read timeout (connect uses
+        UPSTREAM_CONNECT_TIMEOUT). Returns the final response, including
+        non-2xx ones, so callers keep using raise_for_status(). The call
+        (retries included) is timed as an upstream stage of the current request.
+        """
+        start = time.perf_counter()
+        failed = True
+        try:
+            resp = self._get(url, params, timeout)
+            failed = resp.status_code >= 400
+            return resp
+        finally:
+            record_upstream(self.name, upstream_endpoint(urlsplit(url).path), time.perf_counter() - start, failed)
+
+    def _get(self, url: str, params: Optional[Dict[str, Any]], timeout: Optional[float]) -> requests.Response:
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError(f"circuit open for {self.name}")
+
+        self._count("requests")
+        self.budget.deposit()
+        read_timeout = timeout or READ_TIMEOUT
+        deadline = time.monotonic() + read_timeout + DEADLINE_SLACK
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                resp = self.session.get(url, params=params,
+                                        timeout=(CONNECT_TIMEOUT, max(min(read_timeout, remaining), 0.1)))
+                retriable = resp.status_code in RETRY_STATUSES
+                error = None
+            except requests.exceptions.ReadTimeout as e:
+                resp, retriable, error = None, RETRY_READ_TIMEOUTS, e
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                resp, retriable, error = None, True, e
+            except Exception:
+                self._count("failures")
+                self.breaker.record_failure()
+                raise
+
+            if not retriable and error is None:
+                # 2xx-4xx (other than 429): the provider is up, even if the request was bad
+                self.breaker.record_success()
+                return resp
+
+            backoff = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** (attempt + 1))))
+            out_of_time = time.monotonic() + backoff + CONNECT_TIMEOUT >= deadline
+            if not retriable or attempt >= MAX_RETRIES or out_of_time or not self.budget.withdraw():
+                self._count("failures")
+                self.breaker.record_failure()
+                if error is not None:
+                    raise error
+                return resp
+
+            attempt += 1
+            self._count("retries")
+            time.sleep(backoff)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._counters)
+        out.update(self.breaker.snapshot())
+        out["retry_tokens"] = self.budget.tokens
+        return out
+
+
+_clients: Dict[str, UpstreamClient] = {}
+_clients_lock = threading.Lock()
+
+
+def provider_for(url: str) -> str:
+    return PROVIDER_HOSTS.get(urlsplit(url).netloc, "default")
+
+
+def get_client(provider: str) -> UpstreamClient:
+    with _clients_lock:
+        client = _clients.get(provider)
+        if client is None:
+            client = _clients[provider] = UpstreamClient(provider)
+        return client
+
+
+def upstream_get(url: str, params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> requests.Response:
+    """Drop-in for requests.get routed through the provider's pooled client."""
+    return get_client(provider_for(url)).get(url, params=params, timeout=timeout)
+
+
+def upstream_stats() -> Dict[str, Any]:
+    with _clients_lock:
+        clients = list(_clients.values())
+    return {c.name: c.stats() for c in clients}
@@ -0,0 +1,279 @@
+# api/utils/ingest.py
+"""
+Background ingestion for tracked cities.
+
+Every tracked city gets a weather job and an AQI job. Each job fetches from
+upstream ahead of its cache TTL (INGEST_REFRESH_FRACTION of it, jittered by
+INGEST_JITTER) and publishes the result to the shared upstream cache under
+the same keys the request path uses, so requests for tracked cities are
+answered from memory. The uncached fetchers also record every reading in
+the observation store.
+
+- tracked cities: INGEST_CITIES (comma-separated) or INGEST_CITIES_FILE,
+  else the AQI leaderboard cities (DEFAULT_CITIES)
+- per-provider token buckets: INGEST_RATE_OPENWEATHER / INGEST_RATE_OPENAQ
+  (requests per minute across the deployment). Buckets live in each process,
+  so the budget is split evenly over INGEST_PROCESSES schedulers (default:
+  GUNICORN_WORKERS, else 1); set it to 1 when a single process ingests
+- a job whose provider circuit is open is postponed until the breaker's
+  cool-down ends instead of adding load to a failing upstream
+
+Enable with INGEST_ENABLED=1; the app then starts one scheduler per worker
+process on its first request. `python -m api.utils.ingest` runs one pass
+over every job and exits (cron-friendly).
+"""
+
+import datetime
+import heapq
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from api.utils.cache import upstream_cache
+from api.utils.http_client import get_client
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+REFRESH_FRACTION = _env_float("INGEST_REFRESH_FRACTION", 0.8)
+JITTER = _env_float("INGEST_JITTER", 0.1)
+WORKERS = int(_env_float("INGEST_WORKERS", 4))
+WEATHER_DAYS = int(_env_float("INGEST_WEATHER_DAYS", 2))
+# every worker runs its own scheduler with its own buckets
+PROCESSES = max(int(_env_float("INGEST_PROCESSES", _env_float("GUNICORN_WORKERS", 1))), 1)
+RATES_PER_MINUTE = {
+    "openweather": _env_float("INGEST_RATE_OPENWEATHER", 50) / PROCESSES,
+    "openaq": _env_float("INGEST_RATE_OPENAQ", 30) / PROCESSES,
+}
+
+# job kind -> (cache source, providers it can use; the first one is rate limited)
+JOB_KINDS = {
+    "weather": ("weather", ("openweather",)),
+    "aqi": ("aqi", ("openaq", "openweather")),
+}
+
+
+def tracked_cities() -> List[str]:
+    from api.aqi_leaderboard import _parse_cities, configured_cities
+
+    cities = _parse_cities(os.environ.get("INGEST_CITIES"))
+    path = os.environ.get("INGEST_CITIES_FILE")
+    if not cities and path and os.path.exists(path):
+        with open(path, encoding="utf-8") as fh:
+            cities = _parse_cities(fh.read())
+    return cities or configured_cities()
+
+
+class TokenBucket:
+    """`rate` tokens per minute, bursting up to one minute's worth."""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = max(rate_per_minute, 1.0)
+        self.rate = rate_per_minute / 60.0
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """Spend a token; returns 0 on success, else the seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate if self.rate > 0 else 60.0
+
+
+def publish_weather(city: str, days: int = WEATHER_DAYS) -> Dict[str, Any]:
+    """
+    One upstream fetch, published for today (UTC) and the next `days - 1`
+    dates, and as the coordinate-keyed "onecall" entry /api/weather reads.
+    """
+    from api.utils.fetch_weather import fetch_onecall, geocode_city, weather_features
+    from api.weather import onecall_features
+
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    lat, lon = geocode_city(city)
+    data = fetch_onecall(city, lat, lon)
+    features = weather_features(city, data, date=today)
+    for i in range(max(days, 1)):
+        day = today + datetime.timedelta(days=i)
+        value = dict(features, Date_month=day.month, Date_day=day.day)
+        upstream_cache.put("weather", {"city": city, "date": day.isoformat()}, value)
+    upstream_cache.put("onecall", {"lat": float(lat), "lon": float(lon)}, onecall_features(data))
+    return features
+
+
+def publish_aqi(city: str) -> Dict[str, Any]:
+    from api.utils.fetch_aqi import _fetch_aqi_for
+
+    out = _fetch_aqi_for(city, limit=1)
+    if out.get("ok"):
+        upstream_cache.put("aqi", {"city": city, "limit": 1}, out)
+    return out
+
+
+PUBLISHERS = {"weather": publish_weather, "aqi": publish_aqi}
+
+
+class _Job:
+    __slots__ = ("kind", "city", "runs", "failures", "skipped", "last_run", "last_error", "running")
+
+    def __init__(self, kind, city):
+        self.kind = kind
+        self.city = city
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_run = None
+        self.last_error = None
+        self.running = False
+
+
+class IngestScheduler:
+    """Jittered periodic fetches for tracked cities with per-provider rate limits and circuit awareness."""
+
+    def __init__(self, cities: Optional[List[str]] = None, workers: int = WORKERS):
+        self.cities = cities
+        self.workers = workers
+        self.buckets = {p: TokenBucket(r) for p, r in RATES_PER_MINUTE.items()}
+        self._jobs: List[_Job] = []
+        self._heap = []
+        self._executor = None
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def interval(self, kind: str) -> float:
+        return upstream_cache.ttl_for(JOB_KINDS[kind][0]) * REFRESH_FRACTION
+
+    @staticmethod
+    def _jittered(seconds: float) -> float:
+        return max(seconds * (1 + random.uniform(-JITTER, JITTER)), 1.0)
+
+    def _schedule(self, delay: float, job: _Job) -> None:
+        with self._lock:
+            heapq.heappush(self._heap, (time.monotonic() + delay, id(job), job))
+
+    def start(self) -> None:
+        """Start (once per process) the scheduler thread."""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._heap = []
+            self._jobs = [_Job(kind, city) for city in (self.cities or tracked_cities()) for kind in JOB_KINDS]
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest")
+            self._thread = threading.Thread(target=self._loop, name="ingest-scheduler", daemon=True)
+        for job in self._jobs:
+            # spread the first pass over a few seconds instead of a thundering herd
+            self._schedule(random.uniform(0, min(10.0, self.interval(job.kind) / 4)), job)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def blocked_for(self, kind: str) -> float:
+        """
+        Seconds to postpone a `kind` job (0 = run now, and a token was spent):
+        open circuits, then the rate limit. Everything else fetching on the
+        scheduler's behalf (readiness.warm_caches) goes through this too.
+        """
+        providers = JOB_KINDS[kind][1]
+        breakers = [get_client(p).breaker for p in providers]
+        if all(b.state == b.OPEN for b in breakers):
+            return max(b.reset_seconds for b in breakers)
+        primary = next((p for p, b in zip(providers, breakers) if b.state != b.OPEN), providers[0])
+        return self.buckets[primary].take()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                due = self._heap[0][0] if self._heap else None
+            if due is None or due > time.monotonic():
+                self._stop.wait(min(max((due or time.monotonic() + 1) - time.monotonic(), 0.05), 1.0))
+                continue
+            with self._lock:
+                _, _, job = heapq.heappop(self._heap)
+            if job.running:
+                self._schedule(self._jittered(self.interval(job.kind)), job)
+                continue
+            wait_for = self.blocked_for(job.kind)
+            if wait_for > 0:
+                job.skipped += 1
+                self._schedule(self._jittered(wait_for), job)
+                continue
+            job.running = True
+            self._executor.submit(self._run, job)
+
+    def _run(self, job: _Job) -> None:
+        try:
+            out = PUBLISHERS[job.kind](job.city)
+            job.last_error = None if out.get("ok", True) else out.get("error")
+        except Exception as e:
+            job.last_error = str(e)
+        finally:
+            job.runs += 1
+            job.failures += 1 if job.last_error else 0
+            job.last_run = time.time()
+            job.running = False
+            self._schedule(self._jittered(self.interval(job.kind)), job)
+
+    def run_once(self) -> List[Dict[str, Any]]:
+        """Fetch every job once, synchronously (respecting circuits, not waiting on rate limits)."""
+        results = []
+        for city in self.cities or tracked_cities():
+            for kind in JOB_KINDS:
+                job = _Job(kind, city)
+                self._run_sync(job)
+                results.append({"kind": kind, "city": city, "error": job.last_error})
+        return results
+
+    def _run_sync(self, job: _Job) -> None:
+        providers = JOB_KINDS[job.kind][1]
+        if all(get_client(p).breaker.state == "open" for p in providers):
+            job.last_error = "circuit open"
+            return
+        try:
+            out = PUBLISHERS[job.kind](job.city)
+            job.last_error = None if out.get("ok", True) else out.get("error")
+        except Exception as e:
+            job.last_error = str(e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            jobs = list(self._jobs)
+            pending = len(self._heap)
+        return {
+            "running": self._thread is not None and self._pid == os.getpid() and not self._stop.is_set(),
+            "pending": pending,
+            "jobs": [{"kind": j.kind, "city": j.city, "runs": j.runs, "failures": j.failures,
+                      "postponed": j.skipped, "last_run": j.last_run, "last_error": j.last_error} for j in jobs],
+        }
+
+
+# process-wide scheduler, started by the app when INGEST_ENABLED is set
+ingest_scheduler = IngestScheduler()
+
+
+def ingest_enabled() -> bool:
+    return os.environ.get("INGEST_ENABLED", "").lower() in ("1", "true", "yes")
+
+
+if __name__ == "__main__":
+    from api.utils.observation_store import observation_store
+
+    for r in ingest_scheduler.run_once():
+        print(f"{r['kind']:8s} {r['city']:24s} {r['error'] or 'ok'}")
+    observation_store.flush()
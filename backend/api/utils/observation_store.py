@@ -0,0 +1,444 @@
+# api/utils/observation_store.py
+"""
+Local history of the weather and AQI readings fetched from upstream.
+
+Readings are normalized to a long format (ts, kind, city, metric, value,
+unit, source) and appended to Parquet files partitioned per kind, city and
+UTC day:
+
+    <root>/kind=aqi/city=delhi/date=2024-05-03/part-<ms>-<pid>-<seq>.parquet
+
+String columns are dictionary-encoded, so a year of hourly readings for a
+city stays small. Writes are buffered in memory and flushed by a background
+writer thread as one new part file per partition (OBSERVATION_FLUSH_ROWS /
+OBSERVATION_FLUSH_SECONDS), never on the recording request's thread;
+`compact` merges the parts of past days. A reading already recorded with the
+same timestamp (an upstream value re-served on refresh) is skipped, and AQI
+parameters are stored under one name per pollutant (pm2_5 -> pm25).
+`scan` prunes partitions by kind, city and date from the directory names and pushes the time range and metric
+filters down to the Parquet row groups.
+
+pyarrow is optional: without it (or with OBSERVATION_STORE=0) recording is a
+no-op and scans return nothing.
+
+CLI:
+    python -m api.utils.observation_store compact [--days-old 1]
+    python -m api.utils.observation_store stats
+"""
+
+import os
+import time
+import atexit
+import logging
+import datetime
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+from typing import Any, Dict, Iterable, Optional
+
+from api.utils.aqi_record import PARAMETER_ALIASES
+from api.utils.geocode_index import normalize_city
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = pads = pq = None
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+STORE_DIR = os.environ.get("OBSERVATION_STORE_DIR") or os.path.join(BASE_DIR, "observations")
+FLUSH_ROWS = int(os.environ.get("OBSERVATION_FLUSH_ROWS", "5000"))
+FLUSH_SECONDS = float(os.environ.get("OBSERVATION_FLUSH_SECONDS", "60"))
+# (kind, city, metric) series whose last timestamp is remembered for dedupe
+DEDUPE_SERIES = int(os.environ.get("OBSERVATION_DEDUPE_SERIES", "50000"))
+
+COLUMNS = ("ts", "kind", "city", "metric", "value", "unit", "source")
+
+# OpenWeather `current` fields kept as weather observations -> unit
+WEATHER_METRICS = {
+    "temp": "C",
+    "feels_like": "C",
+    "dew_point": "C",
+    "humidity": "%",
+    "pressure": "hPa",
+    "clouds": "%",
+    "uvi": "index",
+    "visibility": "m",
+    "wind_speed": "m/s",
+    "wind_gust": "m/s",
+    "wind_deg": "deg",
+}
+
+
+def _schema():
+    dict_str = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("ts", pa.timestamp("s", tz="UTC")),
+        ("kind", dict_str),
+        ("city", dict_str),
+        ("metric", dict_str),
+        ("value", pa.float64()),
+        ("unit", dict_str),
+        ("source", dict_str),
+    ])
+
+
+def to_utc(value) -> Optional[datetime.datetime]:
+    """datetime / date / ISO string / epoch seconds -> aware UTC datetime (None if unparseable)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value, tz=datetime.timezone.utc)
+    if isinstance(value, datetime.datetime):
+        dt = value
+    elif isinstance(value, datetime.date):
+        dt = datetime.datetime(value.year, value.month, value.day)
+    else:
+        try:
+            dt = datetime.datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.astimezone(datetime.timezone.utc)
+
+
+def city_key(city: str) -> str:
+    """Partition directory name for a city (the geocode index key, URL-quoted)."""
+    return quote(normalize_city(city), safe="")
+
+
+class ObservationStore:
+    """Buffered, partitioned Parquet store of normalized observations. Thread-safe."""
+
+    def __init__(self, root: str = STORE_DIR, flush_rows: int = FLUSH_ROWS,
+                 flush_seconds: float = FLUSH_SECONDS):
+        self.root = root
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.enabled = pa is not None and \
+            os.environ.get("OBSERVATION_STORE", "1").lower() not in ("0", "false", "no")
+        self._buffer: Dict[tuple, list] = {}
+        self._rows = 0
+        self._last_flush = time.monotonic()
+        self._pid = os.getpid()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_ts: "OrderedDict[tuple, datetime.datetime]" = OrderedDict()
+        self._due = threading.Event()
+        self._writer = None
+        self._writer_pid = None
+        self._counters = {"recorded": 0, "duplicates": 0, "flushes": 0, "files_written": 0,
+                          "rows_written": 0, "errors": 0, "flush_failures": 0}
+        self._last_error = None
+
+    def _ensure_writer(self):
+        # threads don't survive a fork: each worker starts its own writer
+        if self._writer is not None and self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer is not None and self._writer_pid == os.getpid():
+                return
+            self._writer_pid = os.getpid()
+            self._writer = threading.Thread(target=self._run, name="observation-writer", daemon=True)
+            self._writer.start()
+
+    def _run(self):
+        while True:
+            self._due.wait(self.flush_seconds)
+            self._due.clear()
+            if self._rows:
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.exception("observation store: flush failed")
+                    with self._lock:
+                        self._counters["flush_failures"] += 1
+                        self._last_error = str(e)
+
+    # -- writing ----------------------------------------------------------
+    def record(self, kind: str, city: str, ts, metrics: Dict[str, Any],
+               units: Optional[Dict[str, str]] = None, source: Optional[str] = None) -> int:
+        """Buffer one reading per numeric metric; returns how many were kept."""
+        if not self.enabled or not city:
+            return 0
+        when = to_utc(ts) or datetime.datetime.now(datetime.timezone.utc)
+        units = units or {}
+        rows = []
+        for metric, value in metrics.items():
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            rows.append((when, kind, str(city), metric, value, units.get(metric), source))
+        if not rows:
+            return 0
+
+        ckey = city_key(city)
+        part = (kind, ckey, when.date().isoformat())
+        with self._lock:
+            if self._pid != os.getpid():
+                # a forked worker must not re-write the parent's buffer
+                self._buffer, self._rows, self._pid = {}, 0, os.getpid()
+            fresh = []
+            for row in rows:
+                series = (kind, ckey, row[3])
+                if self._last_ts.get(series) == when:
+                    continue
+                self._last_ts[series] = when
+                self._last_ts.move_to_end(series)
+                fresh.append(row)
+            while len(self._last_ts) > DEDUPE_SERIES:
+                self._last_ts.popitem(last=False)
+            self._counters["duplicates"] += len(rows) - len(fresh)
+            if not fresh:
+                return 0
+            self._buffer.setdefault(part, []).extend(fresh)
+            self._rows += len(fresh)
+            self._counters["recorded"] += len(fresh)
+            due = self._rows >= self.flush_rows
+        self._ensure_writer()
+        if due:
+            # the writer thread does the Parquet write, not this (request) thread
+            self._due.set()
+        return len(fresh)
+
+    def record_weather(self, city: str, current: Dict[str, Any], source: str = "openweather") -> int:
+        """Record an OpenWeather `current` block (metric units)."""
+        if not current:
+            return 0
+        metrics = {k: current.get(k) for k in WEATHER_METRICS}
+        rain = current.get("rain")
+        if isinstance(rain, dict) and "1h" in rain:
+            metrics["rain_1h"] = rain["1h"]
+        units = dict(WEATHER_METRICS, rain_1h="mm")
+        return self.record("weather", city, current.get("dt"), metrics, units, source)
+
+    def record_aqi(self, city: str, result: Dict[str, Any]) -> int:
+        """Record the measurements of a fetch_aqi_for-shaped result."""
+        kept = 0
+        for m in result.get("measurements") or []:
+            param = (m.get("parameter") or "").lower()
+            if not param:
+                continue
+            param = PARAMETER_ALIASES.get(param, param)
+            kept += self.record("aqi", city, m.get("lastUpdated") or result.get("fetched_at"),
+                                {param: m.get("value")}, {param: m.get("unit")}, m.get("sourceName"))
+        return kept
+
+    def _table(self, rows):
+        cols = list(zip(*rows))
+        arrays = [
+            pa.array(cols[0], type=pa.timestamp("s", tz="UTC")),
+            pa.array(cols[1]).dictionary_encode(),
+            pa.array(cols[2]).dictionary_encode(),
+            pa.array(cols[3]).dictionary_encode(),
+            pa.array(cols[4], type=pa.float64()),
+            pa.array(cols[5], type=pa.string()).dictionary_encode(),
+            pa.array(cols[6], type=pa.string()).dictionary_encode(),
+        ]
+        return pa.Table.from_arrays(arrays, schema=_schema())
+
+    def _part_dir(self, kind, ckey, day):
+        return os.path.join(self.root, f"kind={kind}", f"city={ckey}", f"date={day}")
+
+    def _write(self, directory, table):
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._seq += 1
+            name = f"part-{int(time.time() * 1000)}-{os.getpid()}-{self._seq}.parquet"
+        tmp = os.path.join(directory, "." + name + ".tmp")
+        pq.write_table(table, tmp, compression="zstd")
+        # readers never see a half-written file
+        os.replace(tmp, os.path.join(directory, name))
+
+    def flush(self) -> int:
+        """Write every buffered partition as a new part file; returns rows written."""
+        if not self.enabled:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                buffer, self._buffer, self._rows = self._buffer, {}, 0
+                self._last_flush = time.monotonic()
+            written = files = errors = 0
+            for (kind, ckey, day), rows in buffer.items():
+                try:
+                    rows.sort(key=lambda r: r[0])
+                    self._write(self._part_dir(kind, ckey, day), self._table(rows))
+                    written += len(rows)
+                    files += 1
+                except Exception as e:
+                    errors += 1
+                    logger.exception("observation store: failed to write %s/%s/%s", kind, ckey, day)
+                    with self._lock:
+                        self._last_error = f"{kind}/{ckey}/{day}: {e}"
+            with self._lock:
+                self._counters["files_written"] += files
+                self._counters["errors"] += errors
+                self._counters["flushes"] += 1
+                self._counters["rows_written"] += written
+            return written
+
+    def compact(self, before: Optional[datetime.date] = None) -> int:
+        """Merge the part files of each partition dated before `before` (default: today) into one."""
+        if not self.enabled or not os.path.isdir(self.root):
+            return 0
+        before = (before or datetime.datetime.now(datetime.timezone.utc).date()).isoformat()
+        merged = 0
+        for directory in self._partition_dirs(None, None, None, None):
+            if directory.rsplit("date=", 1)[-1] >= before:
+                continue
+            parts = sorted(f for f in os.listdir(directory) if f.endswith(".parquet"))
+            if len(parts) < 2:
+                continue
+            paths = [os.path.join(directory, f) for f in parts]
+            table = pa.concat_tables([pq.read_table(p, schema=_schema()) for p in paths]).sort_by("ts")
+            self._write(directory, table)
+            for p in paths:
+                os.remove(p)
+            merged += 1
+        return merged
+
+    # -- reading ----------------------------------------------------------
+    def _partition_dirs(self, kinds, cities, start_day, end_day):
+        kinds = kinds or [d[5:] for d in _listdir(self.root) if d.startswith("kind=")]
+        for kind in kinds:
+            kind_dir = os.path.join(self.root, f"kind={kind}")
+            keys = [city_key(c) for c in cities] if cities else \
+                [d[5:] for d in _listdir(kind_dir) if d.startswith("city=")]
+            for ckey in keys:
+                city_dir = os.path.join(kind_dir, f"city={ckey}")
+                for d in _listdir(city_dir):
+                    if not d.startswith("date="):
+                        continue
+                    day = d[5:]
+                    if (start_day and day < start_day) or (end_day and day > end_day):
+                        continue
+                    yield os.path.join(city_dir, d)
+
+    def scan(self, kind: Optional[str] = None, cities: Optional[Iterable[str]] = None,
+             start=None, end=None, metrics: Optional[Iterable[str]] = None,
+             columns: Optional[Iterable[str]] = None, include_buffered: bool = True):
+        """
+        Observations matching the filters as a pyarrow Table (None without pyarrow).
+        `start` is inclusive and `end` exclusive; both accept datetimes, dates,
+        ISO strings or epoch seconds. Kind/city/day prune whole partitions;
+        the ts and metric predicates are pushed down to the Parquet reader.
+        """
+        if pa is None:
+            return None
+        start, end = to_utc(start), to_utc(end)
+        cities = list(cities) if cities else None
+        metrics = list(metrics) if metrics else None
+        columns = list(columns) if columns else list(COLUMNS)
+
+        files = []
+        for directory in self._partition_dirs([kind] if kind else None, cities,
+                                              start.date().isoformat() if start else None,
+                                              end.date().isoformat() if end else None):
+            files.extend(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".parquet"))
+
+        predicate = None
+        for expr in (
+            pads.field("ts") >= pa.scalar(start, type=pa.timestamp("s", tz="UTC")) if start else None,
+            pads.field("ts") < pa.scalar(end, type=pa.timestamp("s", tz="UTC")) if end else None,
+            pads.field("metric").isin(metrics) if metrics else None,
+        ):
+            if expr is not None:
+                predicate = expr if predicate is None else predicate & expr
+
+        tables = []
+        if files:
+            dataset = pads.dataset(files, schema=_schema(), format="parquet")
+            tables.append(dataset.to_table(columns=columns, filter=predicate))
+        if include_buffered and self.enabled:
+            rows = self._buffered(kind, cities, start, end, metrics)
+            if rows:
+                tables.append(self._table(rows).select(columns))
+        if not tables:
+            return _schema().empty_table().select(columns)
+        # parts carry their own dictionaries; unify so group_by/compute work across them
+        table = (pa.concat_tables(tables) if len(tables) > 1 else tables[0]).unify_dictionaries()
+        return table.sort_by("ts") if "ts" in columns else table
+
+    def fingerprint(self, kind: Optional[str] = None, cities: Optional[Iterable[str]] = None,
+                    start=None, end=None) -> str:
+        """
+        Cheap validator for what `scan` would return: changes whenever a part
+        file is added/compacted or rows are buffered for the matching
+        partitions, without reading any data.
+        """
+        import hashlib
+
+        start, end = to_utc(start), to_utc(end)
+        cities = list(cities) if cities else None
+        h = hashlib.blake2b(digest_size=12)
+        for directory in self._partition_dirs([kind] if kind else None, cities,
+                                              start.date().isoformat() if start else None,
+                                              end.date().isoformat() if end else None):
+            h.update(directory.encode())
+            for f in _listdir(directory):
+                h.update(f.encode())
+        keys = {city_key(c) for c in cities} if cities else None
+        with self._lock:
+            pending = sum(len(rows) for p, rows in self._buffer.items()
+                          if (kind is None or p[0] == kind) and (keys is None or p[1] in keys))
+        h.update(str(pending).encode())
+        return h.hexdigest()
+
+    def _buffered(self, kind, cities, start, end, metrics):
+        keys = {city_key(c) for c in cities} if cities else None
+        metrics = set(metrics) if metrics else None
+        with self._lock:
+            parts = [(p, list(rows)) for p, rows in self._buffer.items()
+                     if (kind is None or p[0] == kind) and (keys is None or p[1] in keys)]
+        return [r for _, rows in parts for r in rows
+                if (start is None or r[0] >= start) and (end is None or r[0] < end)
+                and (metrics is None or r[3] in metrics)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._counters)
+            out.update({"enabled": self.enabled, "buffered": self._rows, "root": self.root,
+                        "last_error": self._last_error})
+        return out
+
+
+def _listdir(path):
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
+
+
+# process-wide store; fetchers record into it, /api/visualize and training read it
+observation_store = ObservationStore()
+atexit.register(observation_store.flush)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain the local observation store.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_compact = sub.add_parser("compact", help="merge the part files of past days")
+    p_compact.add_argument("--days-old", type=int, default=1)
+    sub.add_parser("stats", help="row counts per kind and city")
+    args = parser.parse_args()
+
+    if args.cmd == "compact":
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        cutoff = today - datetime.timedelta(days=args.days_old - 1)
+        print(f"compacted {observation_store.compact(cutoff)} partitions under {observation_store.root}")
+    else:
+        table = observation_store.scan(columns=["kind", "city"])
+        if table is None:
+            print("pyarrow is not installed")
+        else:
+            counts = table.group_by(["kind", "city"]).aggregate([("city", "count")]).to_pylist()
+            for row in counts:
+                print(f"{row['kind']:8s} {row['city']:24s} {row['city_count']}")
@@ -0,0 +1,87 @@
+# api/utils/singleflight.py
+"""
+Single-flight coalescing for upstream fetches.
+
+Concurrent callers asking for the same key share one call: the first caller
+(the leader) runs the fetch on its own thread, later callers wait for it and
+get the same result, or the same exception re-raised on their own thread.
+Each waiter has its own timeout (SINGLEFLIGHT_TIMEOUT seconds by default);
+a waiter that gives up gets SingleFlightTimeout while the leader carries on,
+so its result still reaches the other waiters and the cache.
+
+Used by the upstream cache on misses (weather, AQI) and by the geocode
+index on lookups, with the same normalized keys those use.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+DEFAULT_TIMEOUT = float(os.environ.get("SINGLEFLIGHT_TIMEOUT", "20"))
+
+
+class SingleFlightTimeout(TimeoutError):
+    """A waiter gave up on an in-flight call before it finished."""
+
+
+class _Call:
+    __slots__ = ("done", "value", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Per-key in-flight call table. Thread-safe."""
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "shared": 0, "timeouts": 0, "errors": 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """Return fn() for `key`, sharing the call with concurrent callers for the same key."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self._counters["calls"] += 1
+            else:
+                leader = False
+                call.waiters += 1
+                self._counters["shared"] += 1
+
+        if leader:
+            try:
+                call.value = fn()
+            except BaseException as e:
+                call.error = e
+                with self._lock:
+                    self._counters["errors"] += 1
+                raise
+            finally:
+                # later callers start a new call instead of reusing this result
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+            return call.value
+
+        if not call.done.wait(self.timeout if timeout is None else timeout):
+            with self._lock:
+                self._counters["timeouts"] += 1
+            raise SingleFlightTimeout(f"timed out waiting for in-flight fetch of {key!r}")
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._counters)
+            out["in_flight"] = len(self._calls)
+            out["waiting"] = sum(c.waiters for c in self._calls.values())
+        return out
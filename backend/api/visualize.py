@@ -1,30 +1,164 @@
 # backend/api/visualize.py
+"""
+Historical series for dashboards, served from the local observation store
+(no upstream calls per page load).
+
+GET /api/visualize?city=Delhi&range=7d&resolution=daily&metrics=temp,pm25
+    range       "24h", "7d", "30d", ... ending now (default 7d), or
+    from / to   explicit ISO bounds (to defaults to now)
+    resolution  "hourly" or "daily" (default: hourly up to 2 days, else daily)
+    metrics     comma-separated; weather metrics come from kind=weather,
+                anything else from kind=aqi (default temp,pm25); AQI
+                aliases are folded, so pm25 also covers readings stored
+                as pm2_5 before the store normalized parameter names
+
+Each metric is downsampled per bucket to min/max/mean/count with vectorized
+NumPy reductions. Responses carry an ETag derived from the store's partition
+listing, so polling clients get a 304 without the series being recomputed.
+"""
+import datetime
+import hashlib
+import re
+
+import numpy as np
 from flask import Blueprint, request, jsonify
-from .utils.fetch_weather import geocode_city, fetch_weather_for
-from .utils.fetch_aqi import fetch_openaq_latest
-from datetime import datetime, timedelta
+
+from compression import etag_match
+
+from .utils.aqi_record import PARAMETER_ALIASES
+from .utils.observation_store import observation_store, WEATHER_METRICS, to_utc
 
 bp = Blueprint("visualize", __name__, url_prefix="/api")
 
+RESOLUTIONS = {"hourly": 3600, "daily": 86400}
+DEFAULT_METRICS = ("temp", "pm25")
+MAX_RANGE_DAYS = 366 * 5
+_RANGE_RE = re.compile(r"^(\d+)\s*([hdw])$")
+
+
+def _parse_range(args, now):
+    """(start, end) as aware UTC datetimes from ?range= or ?from=&to=."""
+    if args.get("from"):
+        start = to_utc(args.get("from"))
+        end = to_utc(args.get("to")) or now
+        if start is None or end is None:
+            raise ValueError("from/to must be ISO dates or datetimes")
+    else:
+        m = _RANGE_RE.match((args.get("range") or "7d").strip().lower())
+        if not m:
+            raise ValueError("range must look like 24h, 7d or 4w")
+        n, unit = int(m.group(1)), m.group(2)
+        start = now - datetime.timedelta(hours=n) if unit == "h" else \
+            now - datetime.timedelta(days=n * (7 if unit == "w" else 1))
+        end = now
+    if end <= start:
+        raise ValueError("empty range")
+    if end - start > datetime.timedelta(days=MAX_RANGE_DAYS):
+        raise ValueError(f"range too large (max {MAX_RANGE_DAYS} days)")
+    return start, end
+
+
+def downsample(ts, values, step):
+    """
+    Bucket `values` (ts in epoch seconds, sorted ascending) into `step`-second
+    buckets -> (bucket_start, min, max, mean, count) arrays, all vectorized.
+    """
+    if len(ts) == 0:
+        empty = np.empty(0)
+        return empty.astype(np.int64), empty, empty, empty, empty.astype(np.int64)
+    buckets = ts // step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(ts)])
+    sums = np.add.reduceat(values, starts)
+    return (buckets[starts] * step, np.minimum.reduceat(values, starts),
+            np.maximum.reduceat(values, starts), sums / counts, counts)
+
+
+def _stored_names(metric):
+    """`metric` plus the alias names older readings of it may be stored under."""
+    return [metric] + [alias for alias, name in PARAMETER_ALIASES.items() if name == metric]
+
+
+def _series(table, metric, step):
+    if table is None or table.num_rows == 0:
+        return []
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    rows = table.filter(pc.is_in(table["metric"].cast("string"), value_set=pa.array(_stored_names(metric))))
+    if rows.num_rows == 0:
+        return []
+    ts = rows["ts"].cast("int64").to_numpy()
+    values = rows["value"].to_numpy(zero_copy_only=False).astype(np.float64)
+    ok = ~np.isnan(values)
+    bucket, lo, hi, mean, count = downsample(ts[ok], values[ok], step)
+    return [
+        {"t": datetime.datetime.fromtimestamp(int(b), tz=datetime.timezone.utc).isoformat().replace("+00:00", "Z"),
+         "min": round(float(a), 3), "max": round(float(z), 3), "mean": round(float(m), 3), "count": int(c)}
+        for b, a, z, m, c in zip(bucket, lo, hi, mean, count)
+    ]
+
+
 @bp.route("/visualize", methods=["GET"])
 def visualize():
     city = request.args.get("city")
     if not city:
         return jsonify({"ok": False, "error": "city required"}), 400
-    lat, lon = geocode_city(city)
-    if lat is None:
-        return jsonify({"ok": False, "error": "geocode failed"}), 400
-
-    # quick demo: call current daily hourly and return last 7 hourly temps + pm25
-    w = fetch_weather_for(None, lat, lon)
-    a = fetch_openaq_latest(city)
-    # build trivial timeseries of length 7 for demo:
-    now = datetime.utcnow()
-    temps = []
-    pm25s = []
-    for i in range(7):
-        t = (now - timedelta(days=i)).strftime("%Y-%m-%d")
-        temps.append({"date": t, "temp": w.get("current", {}).get("temp", None)})
-        pm25s.append({"date": t, "pm25": a.get("pm25")})
-    return jsonify({"ok": True, "temps": list(reversed(temps)), "pm25": list(reversed(pm25s))})
 
+    now = datetime.datetime.now(datetime.timezone.utc)
+    try:
+        start, end = _parse_range(request.args, now)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    resolution = request.args.get("resolution") or ("hourly" if end - start <= datetime.timedelta(days=2) else "daily")
+    if resolution not in RESOLUTIONS:
+        return jsonify({"ok": False, "error": f"resolution must be one of {sorted(RESOLUTIONS)}"}), 400
+    step = RESOLUTIONS[resolution]
+    # align to bucket boundaries: the response (and its ETag) only changes per bucket or per new data
+    start = datetime.datetime.fromtimestamp(int(start.timestamp()) // step * step, tz=datetime.timezone.utc)
+
+    metrics = [m.strip() for m in (request.args.get("metrics") or ",".join(DEFAULT_METRICS)).split(",") if m.strip()]
+    metrics = list(dict.fromkeys(PARAMETER_ALIASES.get(m.lower(), m) for m in metrics))
+    by_kind = {"weather": [m for m in metrics if m in WEATHER_METRICS or m == "rain_1h"]}
+    by_kind["aqi"] = [m for m in metrics if m not in by_kind["weather"]]
+
+    validator = "|".join([city, start.isoformat(), request.args.get("to") or "", resolution, ",".join(metrics)] +
+                         [observation_store.fingerprint(kind, [city], start, end) for kind, ms in by_kind.items() if ms])
+    etag = hashlib.blake2b(validator.encode(), digest_size=12).hexdigest()
+    matched = etag_match(request.if_none_match, etag)
+    if matched:
+        # echo the variant the client holds (plain or "-gzip"/"-zstd" encoded)
+        resp = jsonify()
+        resp.status_code = 304
+        resp.set_etag(matched)
+        return resp
+
+    series = {}
+    for kind, kind_metrics in by_kind.items():
+        if not kind_metrics:
+            continue
+        table = observation_store.scan(kind=kind, cities=[city], start=start, end=end,
+                                       metrics=[n for m in kind_metrics for n in _stored_names(m)],
+                                       columns=["ts", "metric", "value"])
+        for m in kind_metrics:
+            series[m] = _series(table, m, step)
+
+    body = {
+        "ok": True,
+        "city": city,
+        "from": start.isoformat().replace("+00:00", "Z"),
+        "to": end.isoformat().replace("+00:00", "Z"),
+        "resolution": resolution,
+        "series": series,
+    }
+    if not observation_store.enabled:
+        body["note"] = "observation store disabled (pyarrow not installed)"
+    # previous response shape, kept for existing clients
+    body["temps"] = [{"date": p["t"][:10] if step >= 86400 else p["t"], "temp": p["mean"]} for p in series.get("temp", [])]
+    body["pm25"] = [{"date": p["t"][:10] if step >= 86400 else p["t"], "pm25": p["mean"]} for p in series.get("pm25", [])]
+
+    resp = jsonify(body)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
@@ -1,13 +1,16 @@
 # api/weather.py
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 import os
-import requests
 from datetime import datetime
+from api.utils.cache import upstream_cache
+from api.utils.http_client import upstream_get, OPENWEATHER_BASE_URL
+from api.utils.geocode_index import geocode_index
+from api.utils.bulk import bulk_weather, cities_from_request, ndjson_lines
 
 bp = Blueprint("weather", __name__, url_prefix="/api")
 
-OPENWEATHER_GEOCODE = "http://api.openweathermap.org/geo/1.0/direct"
-OPENWEATHER_ONECALL = "https://api.openweathermap.org/data/2.5/onecall"
+OPENWEATHER_GEOCODE = f"{OPENWEATHER_BASE_URL}/geo/1.0/direct"
+OPENWEATHER_ONECALL = f"{OPENWEATHER_BASE_URL}/data/2.5/onecall"
 
 # Demo fixed feature set (a simple, deterministic sample used for demo/presentation)
 DEMO_FEATURES = {
@@ -35,19 +38,32 @@ DEMO_FEATURES = {
 }
 
 def _geo_lookup(city, api_key):
-    params = {"q": city, "limit": 1, "appid": api_key}
-    r = requests.get(OPENWEATHER_GEOCODE, params=params, timeout=6)
-    r.raise_for_status()
-    data = r.json()
-    if not data:
-        raise ValueError("no geocode result")
-    return data[0]["lat"], data[0]["lon"]
+    def remote(q):
+        params = {"q": q, "limit": 1, "appid": api_key}
+        r = upstream_get(OPENWEATHER_GEOCODE, params=params, timeout=6)
+        r.raise_for_status()
+        data = r.json()
+        if not data:
+            raise ValueError("no geocode result")
+        return data[0]["lat"], data[0]["lon"]
+    return geocode_index.resolve(city, remote)
 
 def _onecall_features(lat, lon, api_key):
+    # cached per coordinate; callers get a copy so they can set Location freely
+    features = upstream_cache.get_or_fetch(
+        "onecall", {"lat": float(lat), "lon": float(lon)},
+        lambda: _fetch_onecall_features(lat, lon, api_key),
+    )
+    return dict(features)
+
+def _fetch_onecall_features(lat, lon, api_key):
     params = {"lat": lat, "lon": lon, "exclude": "minutely,hourly,alerts", "appid": api_key, "units": "metric"}
-    r = requests.get(OPENWEATHER_ONECALL, params=params, timeout=6)
+    r = upstream_get(OPENWEATHER_ONECALL, params=params, timeout=6)
     r.raise_for_status()
-    data = r.json()
+    return onecall_features(r.json())
+
+def onecall_features(data):
+    """Model features from a One Call response (also published by the ingest job)."""
     # Simplified mapping to model features (demo-level)
     today = data.get("current", {})
     daily = data.get("daily", [{}])[0]
@@ -96,3 +112,34 @@ def get_weather_features():
         demo = DEMO_FEATURES.copy()
         demo["Location"] = city
         return jsonify({"ok": False, "error": str(e), "city": city, "features": demo})
+
+
+def _demo_for(city, **extra):
+    demo = DEMO_FEATURES.copy()
+    demo["Location"] = city
+    return dict(extra, city=city, features=demo)
+
+@bp.route("/weather/bulk", methods=["GET", "POST"])
+def get_weather_bulk():
+    """
+    Model-ready features for many cities, streamed as NDJSON: one line per
+    city as each completes, then a {"done": true} line. Features come from
+    the same builder and per-coordinate cache entry as /api/weather, so a
+    line equals that endpoint's response for the city; ?date=YYYY-MM-DD only
+    sets Date_month / Date_day.
+    GET ?cities=a,b,c[&date=YYYY-MM-DD] or POST a JSON list / {"cities": [...]}.
+    """
+    try:
+        cities = cities_from_request(request)
+        date = request.args.get("date")
+        day = datetime.strptime(date.strip()[:10], "%Y-%m-%d").date() if date else None
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    key = os.environ.get("OPENWEATHER_API_KEY") or os.environ.get("OPENWEATHER_KEY") or None
+    if not key:
+        results = ((c, _demo_for(c, ok=True)) for c in cities)
+    else:
+        results = ((c, out if out.get("ok") else _demo_for(c, ok=False, error=out.get("error")))
+                   for c, out in bulk_weather(cities, key, day=day))
+    return Response(stream_with_context(ndjson_lines(results)), mimetype="application/x-ndjson")
@@ -1,5 +1,5 @@
 import os
-from flask import Flask, send_from_directory, render_template, jsonify, request
+from flask import Flask, send_from_directory, render_template, jsonify, request, g
 from flask_cors import CORS
 
 
@@ -17,6 +17,75 @@ def create_app():
 	CORS(app)
 
 
+	# per-request stage timers -> /api/metrics histograms and a Server-Timing header
+	import metrics
+
+	@app.before_request
+	def _begin_request_metrics():
+		g.request_metrics = metrics.begin_request(request.url_rule.rule if request.url_rule else "unmatched")
+
+	@app.after_request
+	def _end_request_metrics(response):
+		token = g.pop("request_metrics", None)
+		if token is not None:
+			timing = metrics.end_request(token, request.method, response.status_code)
+			if timing:
+				response.headers["Server-Timing"] = timing
+		return response
+
+
+	# gzip/zstd response bodies, negotiated per request from Accept-Encoding
+	from compression import compress_response
+
+	@app.after_request
+	def _compress(response):
+		return compress_response(response, request.headers.get("Accept-Encoding"))
+
+
+	# load + warm models once; under gunicorn preload_app this happens in the
+	# master, so forked workers share the loaded models copy-on-write
+	from models.registry import get_registry
+	app.model_registry = get_registry()
+	app.model_wrapper = app.model_registry.wrapper()
+	if app.model_wrapper is None:
+		app.logger.warning("no model found in %s; prediction endpoints will report no_model_loaded", app.model_registry.root)
+	elif os.environ.get("MODEL_WATCH", "").lower() in ("1", "true", "yes"):
+		# threads don't survive a fork, so each worker starts its own watcher on first request
+		@app.before_request
+		def _ensure_model_watcher():
+			app.model_wrapper.watch()
+
+
+	# per-worker warm-up behind /api/ready; gunicorn workers run it from the
+	# post_worker_init hook, other servers start it on the first request
+	from readiness import warmup
+
+	@app.before_request
+	def _ensure_warmup():
+		warmup.start(app)
+
+
+	# pre-fetch weather/AQI for tracked cities into the upstream cache; threads
+	# don't survive a fork, so each worker starts its scheduler on first request
+	from api.utils.ingest import ingest_scheduler, ingest_enabled
+	if ingest_enabled():
+		@app.before_request
+		def _ensure_ingest_scheduler():
+			ingest_scheduler.start()
+
+
+	# create/migrate the schema up front rather than on the first request
+	# thread; drop the pooled connections so none is shared across a fork
+	from db import ENGINE, db_init, db_session
+	db_init()
+	ENGINE.dispose()
+
+	# each request thread gets its own SQLAlchemy session; release it afterwards
+	@app.teardown_appcontext
+	def _remove_db_session(exc=None):
+		db_session.remove()
+
+
 	# internal dev ping route
 	@app.route("/internal_ping", methods=["GET"])
 	def internal_ping():
@@ -29,10 +98,20 @@ def create_app():
 	# register blueprints
 	from api.predict import predict_bp
 	from api.health import health_bp
+	from api.aqi_leaderboard import bp as aqi_leaderboard_bp
+	from api.predict_auto import bp as predict_auto_bp
+	from api.visualize import bp as visualize_bp
+	from api.aqi import bp as aqi_bp
+	from api.weather import bp as weather_bp
 
 
 	app.register_blueprint(predict_bp, url_prefix="/api")
 	app.register_blueprint(health_bp, url_prefix="/api")
+	app.register_blueprint(aqi_leaderboard_bp)
+	app.register_blueprint(predict_auto_bp)
+	app.register_blueprint(visualize_bp)
+	app.register_blueprint(aqi_bp)
+	app.register_blueprint(weather_bp)
 
 
 	@app.route("/", methods=["GET"])
@@ -0,0 +1,438 @@
+"""
+Benchmark suite: inference, feature assembly and endpoint latency.
+
+Microbenchmarks time ModelWrapper.predict_from_dict against predict_batch
+and the DataFrame path (_make_dataframe_from_features). Load tests drive
+/api/predict, /api/predict-auto and /api/aqi-leaderboard in-process
+(Flask test client, one per worker thread) while local stub servers stand
+in for OpenWeather and OpenAQ with configurable latency. "cold" scenarios
+use a new city per request, so every request goes through geocoding and
+the upstream fetchers; "warm" ones reuse a few cities and hit the caches.
+
+Every scenario reports count, p50/p95/p99/mean/max latency (ms) and
+throughput as JSON, tagged with the git commit, so runs can be compared:
+
+    python -m bench -o bench.json
+    python -m bench --only micro --model-path models/rain/<version>/model.cbm
+    python -m bench --upstream-latency-ms 80 --concurrency 16 --compare bench.json
+
+Without --model-path the registry's default model is used, or a small
+synthetic model when none is installed. App state (SQLite databases, geocode
+index, observation store) goes to a temporary directory.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+
+
+# ----------------------------------------------------------------------
+# stub upstream servers
+# ----------------------------------------------------------------------
+def _onecall(lat, lon):
+    now = int(time.time())
+    hourly = [{"dt": now - now % 3600 + h * 3600, "temp": 20.0 + h % 8, "humidity": 60 + h % 20,
+               "pressure": 1012 + h % 5, "wind_speed": 4.0, "wind_deg": (h * 25) % 360, "clouds": h % 8}
+              for h in range(48)]
+    return {"lat": lat, "lon": lon, "hourly": hourly,
+            "current": {"dt": now, "temp": 24.5, "humidity": 65, "pressure": 1013, "wind_speed": 5.1,
+                        "wind_gust": 9.3, "wind_deg": 200, "clouds": 40, "rain": {"1h": 0.2}}}
+
+
+def _stub_routes():
+    return {
+        "/geo/1.0/direct": lambda q: [{"name": q.get("q", ""), "lat": 10.0 + len(q.get("q", "")) % 50,
+                                       "lon": 70.0 + len(q.get("q", "")) % 40}],
+        "/data/2.5/onecall": lambda q: _onecall(float(q.get("lat", 0)), float(q.get("lon", 0))),
+        "/data/2.5/air_pollution": lambda q: {"list": [{"main": {"aqi": 3}, "components": {
+            "co": 230.3, "no2": 12.1, "o3": 40.2, "so2": 3.4, "pm2_5": 18.7, "pm10": 27.9}}]},
+        "/v2/latest": lambda q: {"results": [{"location": f"{q.get('city', '')} Central", "measurements": [
+            {"parameter": "pm25", "value": 18.7, "unit": "µg/m³", "lastUpdated": "2024-01-01T00:00:00Z"},
+            {"parameter": "pm10", "value": 27.9, "unit": "µg/m³", "lastUpdated": "2024-01-01T00:00:00Z"},
+        ]}]},
+    }
+
+
+class StubServer:
+    """Threaded local HTTP server answering provider paths after `latency_ms` (± jitter)."""
+
+    def __init__(self, latency_ms=50.0, jitter_ms=0.0):
+        routes = _stub_routes()
+        stub = self
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+                with stub._lock:
+                    stub.requests += 1
+                delay = stub.latency_ms + random.uniform(-stub.jitter_ms, stub.jitter_ms)
+                time.sleep(max(delay, 0.0) / 1000.0)
+                route = routes.get(parts.path)
+                body = json.dumps(route(query) if route else {"error": "not found"}).encode()
+                self.send_response(200 if route else 404)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, name="bench-stub", daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def configure_environment(weather_url, aqi_url, workdir):
+    """Point the app at the stubs and keep its state out of the source tree. Must run before app imports."""
+    os.environ.update({
+        "OPENWEATHER_BASE_URL": weather_url,
+        "OPENAQ_BASE_URL": aqi_url,
+        "OPENWEATHER_API_KEY": os.environ.get("OPENWEATHER_API_KEY") or "bench",
+        "ENVIROWATCH_DB_PATH": os.path.join(workdir, "envirowatch.db"),
+        "GEOCODE_INDEX_PATH": os.path.join(workdir, "geocode_index.db"),
+        "OBSERVATION_STORE_DIR": os.path.join(workdir, "observations"),
+        "INGEST_ENABLED": "0",
+        "MODEL_WATCH": "0",
+    })
+
+
+# ----------------------------------------------------------------------
+# model
+# ----------------------------------------------------------------------
+def synthetic_model(root, rows=5000, seed=0):
+    """Train a small CatBoost model on random rows with the served feature layout; returns its path."""
+    from catboost import CatBoostClassifier, Pool
+    import pandas as pd
+    from api.predict_auto import _demo_features
+    from models.registry import ModelRegistry
+
+    rng = np.random.default_rng(seed)
+    template = _demo_features("Sydney", "2024-01-01")
+    dirs = ["N", "NNE", "NE", "E", "SE", "S", "SW", "W", "NW", "NNW"]
+    cities = ["Sydney", "Melbourne", "Perth", "Delhi", "Mumbai", "Brisbane"]
+    data = {}
+    for name, value in template.items():
+        if name == "Location":
+            data[name] = rng.choice(cities, rows)
+        elif name == "RainToday":
+            data[name] = rng.choice(["Yes", "No"], rows)
+        elif isinstance(value, str):
+            data[name] = rng.choice(dirs, rows)
+        else:
+            data[name] = rng.normal(float(value), 1.0 + abs(float(value)) * 0.2, rows).astype(np.float32)
+    df = pd.DataFrame(data)
+    y = ((df["Humidity3pm"] > 55) ^ (df["RainToday"] == "Yes")).astype(int)
+    cat = [c for c, v in template.items() if isinstance(v, str)]
+
+    model = CatBoostClassifier(iterations=300, depth=6, random_seed=seed, verbose=False, allow_writing_files=False)
+    model.fit(Pool(df, y, cat_features=cat))
+    path = os.path.join(root, ModelRegistry.DEFAULT_NAME, "bench", "model.cbm")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    model.save_model(path)
+    try:
+        from models.compiled import export
+        export(model, path)
+    except Exception:
+        pass
+    return path
+
+
+def _has_model(root):
+    """Whether the registry would find a model under `root`, without loading it."""
+    import glob
+    from models.registry import ModelRegistry
+
+    if glob.glob(os.path.join(root, "*", "*", "model.cbm")):
+        return True
+    return any(os.path.exists(os.path.join(root, rel)) for rel in ModelRegistry.LEGACY_FILES)
+
+
+# ----------------------------------------------------------------------
+# measurement
+# ----------------------------------------------------------------------
+def summarize(latencies, wall_seconds, ops_per_call=1, errors=0):
+    ms = np.asarray(latencies, dtype=float) * 1000.0
+    if not len(ms):
+        return {"count": 0, "errors": errors}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "count": int(len(ms)),
+        "errors": int(errors),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+        "max_ms": round(float(ms.max()), 4),
+        "throughput_per_s": round(len(ms) * ops_per_call / max(wall_seconds, 1e-9), 2),
+    }
+
+
+def time_calls(fn, iterations, warmup=10, ops_per_call=1):
+    """Call `fn()` serially; returns a summary."""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - started, ops_per_call)
+
+
+def load_test(app, method, path, payloads, concurrency, requests_total):
+    """Send `requests_total` requests from `concurrency` threads; payloads(i) -> (query string, JSON body)."""
+    local = threading.local()
+    counter = iter(range(requests_total))
+    counter_lock = threading.Lock()
+    latencies, errors = [], [0]
+    results_lock = threading.Lock()
+
+    def worker():
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            query, body = payloads(i)
+            t0 = time.perf_counter()
+            resp = client.open(path + query, method=method, json=body)
+            elapsed = time.perf_counter() - t0
+            with results_lock:
+                latencies.append(elapsed)
+                if resp.status_code >= 400:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench-load") as pool:
+        for f in [pool.submit(worker) for _ in range(concurrency)]:
+            f.result()
+    return summarize(latencies, time.perf_counter() - started, errors=errors[0])
+
+
+def _random_row(rng, template):
+    row = dict(template)
+    for k, v in template.items():
+        if isinstance(v, float):
+            row[k] = round(v + rng.normal(0.0, 2.0), 2)
+    return row
+
+
+def run_micro(wrapper, args):
+    from models.model_wrapper import ModelWrapper
+    from api.predict_auto import _demo_features, _make_dataframe_from_features
+
+    rng = np.random.default_rng(args.seed)
+    template = _demo_features("Sydney", "2024-03-15")
+    row = _random_row(rng, template)
+    active = wrapper._current()
+    # no prediction cache, so every call runs the model
+    uncached = ModelWrapper(model=active.model, version=active.version, path=active.path)
+    uncached.predict_from_dict(row)
+    results = {
+        "predict_from_dict": time_calls(lambda: uncached.predict_from_dict(row), args.iterations),
+        "make_dataframe_from_features": time_calls(lambda: _make_dataframe_from_features(row, uncached),
+                                                   args.iterations),
+    }
+    if uncached._active.compiled is not None:
+        # same call with the exported predictor switched off, for comparison
+        full = ModelWrapper(model=active.model, version=active.version)
+        results["predict_from_dict_full_model"] = time_calls(lambda: full.predict_from_dict(row), args.iterations)
+    for size in args.batch_sizes:
+        rows = [_random_row(rng, template) for _ in range(size)]
+        results[f"predict_batch_{size}"] = time_calls(lambda: uncached.predict_batch(rows),
+                                                      max(args.iterations // size, 20), ops_per_call=size)
+    if wrapper.cache is not None:
+        results["predict_from_dict_cached"] = time_calls(lambda: wrapper.predict_from_dict(row), args.iterations)
+    return results
+
+
+def run_feature_assembly(args):
+    from api.predict_auto import build_features_from_external
+
+    seq = iter(range(10 ** 9))
+    return {
+        "build_features_cold": time_calls(
+            lambda: build_features_from_external(f"Bench Assembly {next(seq)}", "2024-03-15", "09:00"),
+            max(args.requests // 10, 20), warmup=2),
+        "build_features_warm": time_calls(
+            lambda: build_features_from_external("Bench Warm", "2024-03-15", "09:00"),
+            max(args.requests // 10, 20), warmup=2),
+    }
+
+
+def run_endpoints(app, args):
+    from api.predict_auto import _demo_features
+
+    rng = np.random.default_rng(args.seed)
+    template = _demo_features("Sydney", "2024-03-15")
+    predict_rows = [_random_row(rng, template) for _ in range(256)]
+    warm_cities = [f"Bench Warm {i}" for i in range(5)]
+    per_board = args.leaderboard_cities
+    n, c = args.requests, args.concurrency
+
+    def unique(prefix):
+        return lambda i: f"{prefix} {os.getpid()}-{i}"
+
+    cold_city = unique("Bench Cold")
+    board_city = unique("Bench Board")
+    scenarios = {
+        "api_predict": ("POST", "/api/predict", lambda i: ("", predict_rows[i % len(predict_rows)])),
+        "api_predict_auto_cold": ("POST", "/api/predict-auto",
+                                  lambda i: ("?live=1", {"city": cold_city(i), "date": "2024-03-15", "time": "09:00"})),
+        "api_predict_auto_warm": ("POST", "/api/predict-auto",
+                                  lambda i: ("?live=1", {"city": warm_cities[i % len(warm_cities)],
+                                                         "date": "2024-03-15", "time": "09:00"})),
+        "api_aqi_leaderboard_cold": ("GET", "/api/aqi-leaderboard",
+                                     lambda i: ("?cities=" + ",".join(board_city(i * per_board + j)
+                                                                      for j in range(per_board)), None)),
+        "api_aqi_leaderboard_warm": ("GET", "/api/aqi-leaderboard",
+                                     lambda i: ("?cities=" + ",".join(warm_cities), None)),
+    }
+    results = {}
+    for name, (method, path, payloads) in scenarios.items():
+        if name.endswith("_warm"):
+            load_test(app, method, path, payloads, 1, len(warm_cities))
+        results[name] = load_test(app, method, path, payloads, c, n)
+    return results
+
+
+# ----------------------------------------------------------------------
+# reporting
+# ----------------------------------------------------------------------
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(report, baseline, tolerance):
+    """Scenarios whose p95 grew by more than `tolerance` (a fraction) over `baseline`."""
+    regressions = []
+    for name, cur in report["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old or not old.get("p95_ms") or not cur.get("p95_ms"):
+            continue
+        change = cur["p95_ms"] / old["p95_ms"] - 1.0
+        if change > tolerance:
+            regressions.append({"scenario": name, "baseline_p95_ms": old["p95_ms"],
+                                "p95_ms": cur["p95_ms"], "change": round(change, 3)})
+    return regressions
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark inference, feature assembly and endpoint latency.")
+    parser.add_argument("-o", "--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--only", choices=["micro", "features", "endpoints"], action="append",
+                        help="run only these parts (repeatable)")
+    parser.add_argument("--model-path", help="benchmark this .cbm/.pkl instead of the registry's default model")
+    parser.add_argument("--iterations", type=int, default=2000, help="calls per microbenchmark")
+    parser.add_argument("--batch-sizes", default="1,32,256")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--leaderboard-cities", type=int, default=10, help="cities per cold leaderboard request")
+    parser.add_argument("--upstream-latency-ms", type=float, default=50.0)
+    parser.add_argument("--upstream-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", help="baseline report; exit 1 if any p95 regressed beyond --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed p95 growth vs --compare")
+    args = parser.parse_args(argv)
+    args.batch_sizes = [int(s) for s in args.batch_sizes.split(",") if s.strip()]
+    parts = set(args.only or ["micro", "features", "endpoints"])
+    random.seed(args.seed)
+
+    workdir = tempfile.mkdtemp(prefix="envirowatch-bench-")
+    weather = StubServer(args.upstream_latency_ms, args.upstream_jitter_ms)
+    aqi = StubServer(args.upstream_latency_ms, args.upstream_jitter_ms)
+    configure_environment(weather.url, aqi.url, workdir)
+
+    sys.path.insert(0, BASE)
+    from models.registry import ModelRegistry
+    if not args.model_path and not _has_model(ModelRegistry().root):
+        synthetic_model(os.path.join(workdir, "models"), seed=args.seed)
+        os.environ["MODEL_DIR"] = os.path.join(workdir, "models")
+
+    from app import create_app
+    app = create_app()
+    if args.model_path:
+        app.model_registry.register(ModelRegistry.DEFAULT_NAME, args.model_path, version="bench")
+        app.model_wrapper = app.model_registry.wrapper()
+    wrapper = app.model_wrapper
+    if wrapper is None:
+        raise SystemExit("no model loaded; pass --model-path")
+
+    results = {}
+    if "micro" in parts:
+        results.update(run_micro(wrapper, args))
+    if "features" in parts:
+        results.update(run_feature_assembly(args))
+    if "endpoints" in parts:
+        results.update(run_endpoints(app, args))
+    weather.close()
+    aqi.close()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model": wrapper.metadata(),
+            "config": {k: getattr(args, k) for k in ("iterations", "batch_sizes", "requests", "concurrency",
+                                                     "leaderboard_cities", "upstream_latency_ms",
+                                                     "upstream_jitter_ms", "seed")},
+            "upstream_requests": {"openweather": weather.requests, "openaq": aqi.requests},
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            regressions = compare(report, json.load(fh), args.tolerance)
+        print(json.dumps({"regressions": regressions}), file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
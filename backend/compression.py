@@ -0,0 +1,131 @@
+"""
+Response compression negotiated per request from Accept-Encoding.
+
+zstd is preferred when the client accepts it and the optional `zstandard`
+package is installed, then gzip. Only buffered responses are compressed:
+compressible types (JSON, text, JS, SVG) of at least COMPRESS_MIN_BYTES, not
+already encoded, and not streamed (NDJSON streams are left alone so each line
+still reaches the client as it is produced). Compressed responses get
+`Vary: Accept-Encoding`, and their ETag gets the coding appended
+("<tag>-gzip"), since the encoded bytes are a different representation;
+views answering If-None-Match compare with `etag_match`.
+
+    COMPRESS_ENABLED     default on
+    COMPRESS_MIN_BYTES   default 1024
+    COMPRESS_GZIP_LEVEL  default 6
+    COMPRESS_ZSTD_LEVEL  default 3
+"""
+
+import os
+import gzip
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+def _env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+ENABLED = _env_flag("COMPRESS_ENABLED", default=True)
+MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.environ.get("COMPRESS_ZSTD_LEVEL", "3"))
+
+COMPRESSIBLE = ("application/json", "application/javascript", "image/svg+xml")
+
+
+def _compress_zstd(data):
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+def _compress_gzip(data):
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _encoders():
+    """Supported encodings in server preference order."""
+    encoders = []
+    if zstandard is not None:
+        encoders.append(("zstd", _compress_zstd))
+    encoders.append(("gzip", _compress_gzip))
+    return encoders
+
+
+def accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header value (q=0 entries kept, meaning refused)."""
+    out = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        out[coding] = q
+    return out
+
+
+def negotiate(header):
+    """(name, compress) of the best encoding the client accepts, or None."""
+    accepted = accepted_encodings(header)
+    best, best_q = None, 0.0
+    for name, fn in _encoders():
+        q = accepted.get(name, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = (name, fn), q
+    return best
+
+
+def encoded_etag(tag, coding):
+    """The ETag of `tag`'s representation compressed with `coding`."""
+    return f"{tag}-{coding}"
+
+
+def etag_match(if_none_match, tag):
+    """The ETag in `if_none_match` (a werkzeug ETags) that `tag` or one of its
+    encoded variants matches, or None."""
+    for candidate in [tag] + [encoded_etag(tag, name) for name, _ in _encoders()]:
+        if if_none_match.contains_weak(candidate):
+            return candidate
+    return None
+
+
+def _compressible(mimetype):
+    return bool(mimetype) and (mimetype.startswith("text/") or mimetype in COMPRESSIBLE
+                               or mimetype.endswith("+json"))
+
+
+def compress_response(response, accept_encoding):
+    """Compress `response` in place for the request's Accept-Encoding, when worthwhile."""
+    if not ENABLED or response.direct_passthrough or response.is_streamed:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if "Content-Encoding" in response.headers or not _compressible(response.mimetype):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoder = negotiate(accept_encoding)
+    if encoder is None:
+        return response
+    data = response.get_data()
+    if len(data) < MIN_BYTES:
+        return response
+    name, fn = encoder
+    response.set_data(fn(data))
+    response.headers["Content-Encoding"] = name
+    tag, weak = response.get_etag()
+    if tag:
+        response.set_etag(encoded_etag(tag, name), weak=weak)
+    return response
@@ -1,20 +1,172 @@
-from sqlalchemy import create_engine, Column, Integer, Float, Text, DateTime
+from sqlalchemy import create_engine, event, text, Column, Integer, Float, Text, String, Date, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-import datetime, os
+from sqlalchemy.orm import sessionmaker, scoped_session
+import datetime, json, os
 
 BASE = declarative_base()
-DB_PATH = os.path.join(os.path.dirname(__file__), "envirowatch.db")
-ENGINE = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False})
+DB_PATH = os.environ.get("ENVIROWATCH_DB_PATH") or os.path.join(os.path.dirname(__file__), "envirowatch.db")
+ENGINE = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False, "timeout": 15})
+
+
+@event.listens_for(ENGINE, "connect")
+def _sqlite_pragmas(dbapi_conn, _record):
+    # WAL lets readers run alongside the prediction log writer; NORMAL skips
+    # the fsync per commit (still durable at checkpoints)
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA cache_size=-20000")      # ~20 MB page cache per connection
+    cur.execute("PRAGMA mmap_size=268435456")    # 256 MB memory-mapped reads
+    cur.close()
+
+
 SessionLocal = sessionmaker(bind=ENGINE)
-db_session = SessionLocal()
+# one session per thread (i.e. per request); the app removes it on teardown
+db_session = scoped_session(SessionLocal)
+
+# bump when migrate() learns a new step; stored in PRAGMA user_version
+SCHEMA_VERSION = 1
+
 
 class Prediction(BASE):
     __tablename__ = "predictions"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     input_json = Column(Text)
     predicted_value = Column(Float)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+    # normalized out of input_json so history queries can use indexes
+    city = Column(String(64))
+    date = Column(Date)
+    model_version = Column(String(64))
+    probability = Column(Float)
+
+    __table_args__ = (
+        Index("ix_predictions_city_date", "city", "date"),
+        Index("ix_predictions_date", "date"),
+        Index("ix_predictions_model_version_timestamp", "model_version", "timestamp"),
+    )
+
+
+class Forecast(BASE):
+    """Precomputed rain probability for a tracked city and day (see forecast.py)."""
+    __tablename__ = "forecasts"
+    id = Column(Integer, primary_key=True)
+    city = Column(String(64), nullable=False)
+    city_key = Column(String(64), nullable=False)
+    target_date = Column(Date, nullable=False)
+    model_name = Column(String(64), nullable=False)
+    model_version = Column(String(64), nullable=False)
+    prediction = Column(Text)
+    probabilities = Column(Text)
+    features_json = Column(Text)
+    generated_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        Index("ux_forecasts_city_date_model", "city_key", "target_date", "model_name", unique=True),
+        Index("ix_forecasts_generated_at", "generated_at"),
+    )
+
+
+def city_from_features(features):
+    if not isinstance(features, dict):
+        return None
+    city = features.get("Location") or features.get("city") or features.get("City") or features.get("location")
+    return str(city)[:64] if city not in (None, "") else None
+
+
+def date_from_features(features, fallback=None):
+    """The day a prediction is for: the row's "date" field, else `fallback` (the log timestamp)."""
+    value = features.get("date") if isinstance(features, dict) else None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if value:
+        try:
+            return datetime.date.fromisoformat(str(value).strip()[:10])
+        except ValueError:
+            pass
+    return fallback.date() if isinstance(fallback, datetime.datetime) else fallback
+
+
+def migrate(batch_size=5000):
+    """
+    Bring an existing envirowatch.db up to the current schema: add the
+    normalized columns, build the indexes, and backfill city/date from
+    input_json in batches. Idempotent; skipped once PRAGMA user_version
+    records SCHEMA_VERSION.
+    """
+    with ENGINE.begin() as conn:
+        if conn.execute(text("PRAGMA user_version")).scalar() >= SCHEMA_VERSION:
+            return
+        existing = {row[1] for row in conn.execute(text("PRAGMA table_info(predictions)"))}
+        for name, ddl in (("city", "VARCHAR(64)"), ("date", "DATE"),
+                          ("model_version", "VARCHAR(64)"), ("probability", "FLOAT")):
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE predictions ADD COLUMN {name} {ddl}"))
+        # the primary key is already indexed; the old explicit index only slowed inserts
+        conn.execute(text("DROP INDEX IF EXISTS ix_predictions_id"))
+    for index in Prediction.__table__.indexes:
+        index.create(bind=ENGINE, checkfirst=True)
+
+    last_id = 0
+    while True:
+        with ENGINE.begin() as conn:
+            rows = conn.execute(
+                text("SELECT id, input_json, timestamp FROM predictions"
+                     " WHERE id > :last AND city IS NULL AND date IS NULL ORDER BY id LIMIT :n"),
+                {"last": last_id, "n": batch_size},
+            ).fetchall()
+            if not rows:
+                break
+            updates = []
+            for row_id, input_json, ts in rows:
+                try:
+                    features = json.loads(input_json) if input_json else {}
+                except ValueError:
+                    features = {}
+                if isinstance(ts, str):
+                    try:
+                        ts = datetime.datetime.fromisoformat(ts)
+                    except ValueError:
+                        ts = None
+                day = date_from_features(features, ts)
+                updates.append({"id": row_id, "city": city_from_features(features),
+                                "date": day.isoformat() if day else None})
+            conn.execute(text("UPDATE predictions SET city = :city, date = :date WHERE id = :id"), updates)
+            last_id = rows[-1][0]
+
+    with ENGINE.begin() as conn:
+        conn.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION}"))
+        conn.execute(text("ANALYZE"))
+
+
+_initialized = False
+
 
 def db_init():
+    """Create and migrate the schema; a no-op once done (the schema lives in the
+    file, so workers forked after the app called this skip it too)."""
+    global _initialized
+    if _initialized:
+        return
     BASE.metadata.create_all(bind=ENGINE)
+    migrate()
+    _initialized = True
+
+
+def prediction_history(city=None, start=None, end=None, model_version=None, limit=500, session=None):
+    """Most recent predictions, filtered on indexed columns only (city, date range, model version)."""
+    session = session or db_session
+    q = session.query(Prediction)
+    if city:
+        q = q.filter(Prediction.city == city)
+    if start:
+        q = q.filter(Prediction.date >= start)
+    if end:
+        q = q.filter(Prediction.date <= end)
+    if model_version:
+        q = q.filter(Prediction.model_version == model_version)
+    order = (Prediction.date.desc(), Prediction.id.desc()) if (city or start or end) else (Prediction.id.desc(),)
+    return q.order_by(*order).limit(limit).all()
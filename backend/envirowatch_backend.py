@@ -1,6 +1,4 @@
 # --- Standard Library ---
-import os
-import pickle
 import datetime
 
 # --- Third-Party ---
@@ -9,22 +7,18 @@ import numpy as np
 from flask import Flask, render_template, url_for, request, jsonify
 from flask_cors import cross_origin
 
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "models", "cat.pkl")
-model = pickle.load(open(MODEL_PATH, "rb"))
-print("Model Loaded")
-
-from flask import Flask,render_template,url_for,request,jsonify
-from flask_cors import cross_origin
-import pandas as pd
-import numpy as np
-import datetime
-import pickle
+# --- Local ---
+from models.registry import get_registry
+from models.feature_schema import FeatureSchema
+from prediction_log import prediction_logger
 
+# loaded and warmed once by the shared registry (cat.cbm, falling back to cat.pkl)
+model = get_registry().get().model
+schema = FeatureSchema.from_model(model)
+print("Model Loaded")
 
 
 app = Flask(__name__, template_folder="template")
-model = pickle.load(open("./models/cat.pkl", "rb"))
-print("Model Loaded")
 
 @app.route("/",methods=['GET'])
 @cross_origin()
@@ -88,11 +82,18 @@ def predict():
 		# Rain Today
 		rainToday = float(request.form['raintoday'])
 
-		input_lst = [location , minTemp , maxTemp , rainfall , evaporation , sunshine ,
-					 windGustDir , windGustSpeed , winddDir9am , winddDir3pm , windSpeed9am , windSpeed3pm ,
-					 humidity9am , humidity3pm , pressure9am , pressure3pm , cloud9am , cloud3pm , temp9am , temp3pm ,
-					 rainToday , month , day]
-		pred = model.predict(input_lst)
+		# named features; the schema maps them onto the model's column order
+		features = {
+			"Location": location, "MinTemp": minTemp, "MaxTemp": maxTemp, "Rainfall": rainfall,
+			"Evaporation": evaporation, "Sunshine": sunshine, "WindGustDir": windGustDir,
+			"WindGustSpeed": windGustSpeed, "WindDir9am": winddDir9am, "WindDir3pm": winddDir3pm,
+			"WindSpeed9am": windSpeed9am, "WindSpeed3pm": windSpeed3pm, "Humidity9am": humidity9am,
+			"Humidity3pm": humidity3pm, "Pressure9am": pressure9am, "Pressure3pm": pressure3pm,
+			"Cloud9am": cloud9am, "Cloud3pm": cloud3pm, "Temp9am": temp9am, "Temp3pm": temp3pm,
+			"RainToday": rainToday, "month": month, "day": day,
+		}
+		pred = model.predict(schema.pool([features]))
+		prediction_logger.log(features, {"prediction": pred.tolist()})
 		output = pred
 		if output == 0:
 			return render_template("after_sunny.html")
@@ -0,0 +1,161 @@
+"""
+Precomputed rain forecasts for tracked cities.
+
+`generate()` assembles predict-auto features for every tracked city and each
+of the next FORECAST_DAYS days (concurrently, on the shared bulk fetch pool),
+scores them all with one
+ModelWrapper.predict_batch call and upserts the rows into the `forecasts`
+table (unique per city/day/model). /api/predict-auto answers from that table
+when it holds a row for the requested city and date that was produced by the
+currently served model version and is younger than FORECAST_MAX_AGE_HOURS,
+and falls back to live inference otherwise.
+
+Run nightly (e.g. from cron, in backend/):
+    python -m forecast [--days 3] [--cities Delhi,Mumbai]
+"""
+
+import os
+import json
+import datetime
+import threading
+
+from sqlalchemy.dialects.sqlite import insert
+
+FORECAST_DAYS = int(os.environ.get("FORECAST_DAYS", "3"))
+MAX_AGE_HOURS = float(os.environ.get("FORECAST_MAX_AGE_HOURS", "26"))
+
+_db_ready = False
+_db_lock = threading.Lock()
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _as_utc(value):
+    """DateTime columns hold naive UTC (as utcnow() wrote them); attach the zone."""
+    return value.replace(tzinfo=datetime.timezone.utc) if value.tzinfo is None else value
+
+
+def _iso_z(value):
+    return _as_utc(value).replace(tzinfo=None).isoformat() + "Z"
+
+
+def _ensure_db():
+    global _db_ready
+    if not _db_ready:
+        with _db_lock:
+            if not _db_ready:
+                from db import db_init
+                db_init()
+                _db_ready = True
+
+
+def generate(wrapper=None, cities=None, days=FORECAST_DAYS, start=None):
+    """Score tracked cities for `days` days from `start` (default today, UTC); returns a summary."""
+    from db import ENGINE, Forecast
+    from api.predict_auto import build_features_from_external
+    from api.utils.bulk import _get_executor
+    from api.utils.geocode_index import normalize_city
+    from api.utils.ingest import tracked_cities
+
+    if wrapper is None:
+        from models.registry import get_registry
+        wrapper = get_registry().wrapper()
+    if wrapper is None:
+        raise RuntimeError("no model loaded")
+    _ensure_db()
+
+    start = start or _utcnow().date()
+    cities = cities or tracked_cities()
+    keys = [(city, (start + datetime.timedelta(days=i)).isoformat()) for city in cities for i in range(days)]
+    # each row is an upstream round trip (cached per city/date); fetch them in parallel
+    executor = _get_executor()
+    futures = [executor.submit(build_features_from_external, city=city, date=day, time="09:00")
+               for city, day in keys]
+    rows = [f.result() for f in futures]
+
+    meta = wrapper.metadata()
+    results = wrapper.predict_batch(rows)
+    generated_at = _utcnow()
+    values, failed = [], []
+    for (city, day), features, r in zip(keys, rows, results):
+        if not r.get("ok"):
+            failed.append({"city": city, "date": day, "error": r.get("error")})
+            continue
+        values.append({
+            "city": city,
+            "city_key": normalize_city(city),
+            "target_date": datetime.date.fromisoformat(day),
+            "model_name": meta.get("model_name") or "default",
+            "model_version": meta.get("model_version") or "",
+            "prediction": json.dumps([r["prediction"]]),
+            "probabilities": json.dumps([r["probabilities"]]) if r.get("probabilities") is not None else None,
+            "features_json": json.dumps(features, default=str),
+            # naive UTC, like the column's default and every other DateTime in db.py
+            "generated_at": generated_at.replace(tzinfo=None),
+        })
+
+    if values:
+        stmt = insert(Forecast.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["city_key", "target_date", "model_name"],
+            set_={c: stmt.excluded[c] for c in ("city", "model_version", "prediction", "probabilities",
+                                                "features_json", "generated_at")},
+        )
+        with ENGINE.begin() as conn:
+            conn.execute(stmt, values)
+
+    return {"ok": True, "rows": len(values), "failed": failed, "generated_at": _iso_z(generated_at), **meta}
+
+
+def lookup(city, date, model_name=None, model_version=None, max_age_hours=MAX_AGE_HOURS):
+    """
+    Stored forecast for (city, date) as a predict-auto style dict, or None on
+    a miss (no row, another model version, or older than `max_age_hours`).
+    """
+    from sqlalchemy.exc import SQLAlchemyError
+    from db import db_session, Forecast
+    from api.utils.geocode_index import normalize_city
+
+    try:
+        day = date if isinstance(date, datetime.date) else datetime.date.fromisoformat(str(date).strip()[:10])
+    except ValueError:
+        return None
+    try:
+        _ensure_db()
+        q = db_session.query(Forecast).filter(Forecast.city_key == normalize_city(city), Forecast.target_date == day)
+        if model_name:
+            q = q.filter(Forecast.model_name == model_name)
+        row = q.order_by(Forecast.generated_at.desc()).first()
+    except SQLAlchemyError:
+        return None
+    if row is None or (model_version and row.model_version != model_version):
+        return None
+
+    generated_at = _as_utc(row.generated_at)
+    staleness = (_utcnow() - generated_at).total_seconds()
+    if staleness > max_age_hours * 3600:
+        return None
+    return {
+        "prediction": json.loads(row.prediction) if row.prediction else None,
+        "probabilities": json.loads(row.probabilities) if row.probabilities else None,
+        "features_used": json.loads(row.features_json) if row.features_json else None,
+        "generated_at": _iso_z(generated_at),
+        "staleness_seconds": round(staleness, 1),
+        "model_name": row.model_name,
+        "model_version": row.model_version,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    from api.aqi_leaderboard import _parse_cities
+
+    parser = argparse.ArgumentParser(description="Precompute rain forecasts for tracked cities.")
+    parser.add_argument("--days", type=int, default=FORECAST_DAYS)
+    parser.add_argument("--cities", help="comma-separated; default: the tracked cities")
+    args = parser.parse_args()
+
+    summary = generate(cities=_parse_cities(args.cities) or None, days=args.days)
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,29 @@
+# gunicorn.conf.py
+# run from backend/:  gunicorn app:app
+import gc
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "4"))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+
+# import the app (and load + warm every model) once in the master; workers
+# are forked afterwards and share those pages copy-on-write
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # move everything allocated so far (models included) out of the GC's
+    # tracked generations so collections in workers don't touch, and copy,
+    # the shared pages
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # warm this worker (model, database, caches; see readiness.py) before it
+    # accepts connections; the app's first-request trigger then finds it done.
+    # Bounded by WARMUP_DEADLINE, which must stay below the worker timeout.
+    from app import app
+    from readiness import warmup
+
+    warmup.start(app, wait=True)
@@ -0,0 +1,260 @@
+"""
+Request-level latency instrumentation.
+
+Every request gets a RequestTimings collector (held in a context variable,
+so upstream calls made from executor threads find it when submitted
+through `bind()`). Code on the hot path reports named stages (geocode,
+onecall, openaq, openweather_aqi, features, dataframe, predict, ...) with
+`stage()` / `record_stage()`; each stage is both added to the request's
+`Server-Timing` header and observed in a fixed-bucket histogram.
+
+Histograms and counters are sharded per thread: a thread only ever writes
+its own shard (no locks on the hot path) and `render()` sums the shards
+when /api/metrics is scraped. Shards of threads that have exited are folded
+into one retired total, so short-lived threads don't accumulate shards.
+Metrics are per process; under gunicorn each worker reports its own.
+
+Series:
+    envirowatch_request_seconds{route,method}            histogram
+    envirowatch_requests_total{route,method,status}      counter
+    envirowatch_stage_seconds{route,stage}               histogram
+    envirowatch_upstream_request_seconds{provider,endpoint}  histogram
+    envirowatch_upstream_errors_total{provider,endpoint}     counter
+    envirowatch_model_predict_seconds{model,version,kind}    histogram
+    envirowatch_model_errors_total{model,version,kind}       counter
+"""
+
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# seconds; Prometheus' conventional latency buckets plus a 1 ms floor
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_HELP = {
+    "envirowatch_request_seconds": "HTTP request latency by route.",
+    "envirowatch_requests_total": "HTTP requests by route and status.",
+    "envirowatch_stage_seconds": "Time spent in named request stages.",
+    "envirowatch_upstream_request_seconds": "Upstream provider call latency (including retries).",
+    "envirowatch_upstream_errors_total": "Upstream calls that failed or returned an error status.",
+    "envirowatch_model_predict_seconds": "Model scoring latency.",
+    "envirowatch_model_errors_total": "Model scoring calls that raised.",
+}
+
+
+def _labels(labels):
+    return tuple(sorted((k, "" if v is None else str(v)) for k, v in labels.items()))
+
+
+def _merge(into, shard):
+    """Add a (hists, counters) shard into `into`; never mutates the shard's values."""
+    hists, counters = into
+    for key, h in shard[0].copy().items():
+        total = hists.get(key)
+        hists[key] = list(h) if total is None else [a + b for a, b in zip(total, h)]
+    for key, n in shard[1].copy().items():
+        counters[key] = counters.get(key, 0) + n
+
+
+class Metrics:
+    """Per-thread sharded histograms and counters."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._shards = []
+        self._retired = ({}, {})
+        self._lock = threading.Lock()
+        self._tls = threading.local()
+
+    def _shard(self):
+        shard = getattr(self._tls, "shard", None)
+        if shard is None:
+            shard = self._tls.shard = ({}, {})
+            with self._lock:
+                self._fold_dead()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _fold_dead(self):
+        # an exited thread never writes its shard again; caller holds the lock
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _merge(self._retired, shard)
+        self._shards = live
+
+    def observe(self, name, seconds, **labels):
+        hists = self._shard()[0]
+        key = (name, _labels(labels))
+        h = hists.get(key)
+        if h is None:
+            # one slot per bucket, one for +Inf, then the running sum
+            h = hists[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        h[bisect.bisect_left(self.buckets, seconds)] += 1
+        h[-1] += seconds
+
+    def inc(self, name, amount=1, **labels):
+        counters = self._shard()[1]
+        key = (name, _labels(labels))
+        counters[key] = counters.get(key, 0) + amount
+
+    def collect(self):
+        """({(name, labels): [bucket counts..., sum]}, {(name, labels): count}) summed over threads."""
+        with self._lock:
+            self._fold_dead()
+            shards = [shard for _, shard in self._shards]
+            out = (dict(self._retired[0]), dict(self._retired[1]))
+        for shard in shards:
+            _merge(out, shard)
+        return out
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)."""
+        hists, counters = self.collect()
+        lines = []
+        for name in sorted({k[0] for k in hists}):
+            lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for (n, labels), h in sorted(hists.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), h[:-1]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_fmt(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_fmt(labels)} {h[-1]:.6f}")
+                lines.append(f"{name}_count{_fmt(labels)} {cumulative}")
+        for name in sorted({k[0] for k in counters}):
+            lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for (n, labels), count in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{name}{_fmt(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+metrics = Metrics()
+
+
+# ----------------------------------------------------------------------
+# per-request stages
+# ----------------------------------------------------------------------
+class RequestTimings:
+    """Stages recorded while serving one request."""
+    __slots__ = ("route", "started", "stages")
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.stages = []
+
+    def server_timing(self, total):
+        """`Server-Timing` header value: stages summed by name (in first-seen order) plus the total."""
+        totals, counts = {}, {}
+        for name, seconds in list(self.stages):
+            totals[name] = totals.get(name, 0.0) + seconds
+            counts[name] = counts.get(name, 0) + 1
+        parts = []
+        for name, seconds in totals.items():
+            part = f"{name};dur={seconds * 1000.0:.2f}"
+            if counts[name] > 1:
+                part += f';desc="{counts[name]} calls"'
+            parts.append(part)
+        parts.append(f"total;dur={total * 1000.0:.2f}")
+        return ", ".join(parts)
+
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+def record_stage(name, seconds):
+    timings = _current.get()
+    if timings is not None:
+        timings.stages.append((name, seconds))
+        metrics.observe("envirowatch_stage_seconds", seconds, route=timings.route, stage=name)
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as stage `name` of the current request (no-op outside requests)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - t0)
+
+
+def bind(fn, *args, **kwargs):
+    """Zero-argument callable running fn(*args, **kwargs) in a copy of the caller's context,
+    so stages it records from an executor thread still count towards the request."""
+    ctx = contextvars.copy_context()
+    return lambda: ctx.run(fn, *args, **kwargs)
+
+
+def begin_request(route):
+    """Start timing a request; returns a token for `end_request`."""
+    return _current.set(RequestTimings(route))
+
+
+def end_request(token, method, status):
+    """Record the request's total latency and status; returns its Server-Timing header value."""
+    timings = _current.get()
+    try:
+        _current.reset(token)
+    except ValueError:
+        # token from another context (e.g. an async view); just clear it
+        _current.set(None)
+    if timings is None:
+        return None
+    total = time.perf_counter() - timings.started
+    metrics.observe("envirowatch_request_seconds", total, route=timings.route, method=method)
+    metrics.inc("envirowatch_requests_total", route=timings.route, method=method, status=status)
+    return timings.server_timing(total)
+
+
+# ----------------------------------------------------------------------
+# upstream and model helpers
+# ----------------------------------------------------------------------
+# provider URL path -> stage / endpoint name
+UPSTREAM_ENDPOINTS = {
+    "/geo/1.0/direct": "geocode",
+    "/data/2.5/onecall": "onecall",
+    "/data/2.5/air_pollution": "openweather_aqi",
+    "/v2/latest": "openaq",
+}
+
+
+def upstream_endpoint(path):
+    for suffix, name in UPSTREAM_ENDPOINTS.items():
+        if path.endswith(suffix):
+            return name
+    return path.rstrip("/").rsplit("/", 1)[-1] or "root"
+
+
+def record_upstream(provider, endpoint, seconds, error=False):
+    metrics.observe("envirowatch_upstream_request_seconds", seconds, provider=provider, endpoint=endpoint)
+    if error:
+        metrics.inc("envirowatch_upstream_errors_total", provider=provider, endpoint=endpoint)
+    record_stage(endpoint, seconds)
+
+
+def record_model(model, version, kind, seconds, error=False):
+    metrics.observe("envirowatch_model_predict_seconds", seconds, model=model, version=version, kind=kind)
+    if error:
+        metrics.inc("envirowatch_model_errors_total", model=model, version=version, kind=kind)
+    record_stage("predict", seconds)
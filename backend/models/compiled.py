@@ -0,0 +1,287 @@
+"""
+Standalone single-row predictor exported from a CatBoost model.
+
+`export()` writes CatBoost's own standalone applier (save_model(format="python"))
+next to the model file as `<model file>.py`. The applier evaluates the trees
+on plain Python lists, so scoring one row skips the Pool construction and
+wrapper overhead of `predict_proba`. ModelWrapper picks it up for single rows
+when all of the following hold:
+
+- the file exists (train_catboost.py exports it; `python -m models.compiled
+  export <model.cbm> --data <training csv>` does so for existing models)
+- the model is a binary Logloss/CrossEntropy classifier
+- its probabilities match the full model's on probe rows within PARITY_TOLERANCE
+  (see `probe_rows`: real held-out rows from the metadata.json sidecar plus
+  rows cycling the known weatherAUS category values, so the categorical
+  (CTR) part of the trees is exercised, not just the missing-value paths)
+- MODEL_COMPILED is "on", or "auto" (default) and it is faster than the full
+  model on this machine
+
+Check parity against a CSV of weatherAUS-shaped rows (run from backend/):
+    python -m models.compiled check models/rain/<version>/model.cbm --data models/holdout.csv
+"""
+
+import os
+import sys
+import math
+import time
+import json
+import logging
+import weakref
+import threading
+import importlib.util
+
+import numpy as np
+
+from models.feature_schema import FeatureSchema
+
+MODE = os.environ.get("MODEL_COMPILED", "auto").lower()
+PARITY_TOLERANCE = 1e-9
+BINARY_LOSSES = ("Logloss", "CrossEntropy")
+
+logger = logging.getLogger(__name__)
+
+# id(model) -> (weakref to the model, (applier path, mtime), predictor or None).
+# CatBoost models aren't hashable, so entries are keyed by id() and removed by
+# the weakref callback when the model is collected, before its id can be reused.
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def applier_path(model_path):
+    return model_path + ".py"
+
+
+def supported(model):
+    """Only binary Logloss models map raw scores to probabilities with a plain sigmoid."""
+    if not hasattr(model, "get_all_params"):
+        return False
+    try:
+        return model.get_all_params().get("loss_function") in BINARY_LOSSES
+    except Exception:
+        return False
+
+
+def export(model, model_path, out=None, pool=None):
+    """
+    Write the standalone applier for `model` (saved at `model_path`); returns its path.
+    Models with categorical features need `pool`, the training data (or any
+    Pool with the category values to map), since the applier embeds the
+    category value -> hash table.
+    """
+    if not supported(model):
+        raise ValueError("only binary Logloss/CrossEntropy CatBoost models can be exported")
+    out = out or applier_path(model_path)
+    tmp = out + ".tmp"
+    model.save_model(tmp, format="python", pool=pool)
+    os.replace(tmp, out)
+    return out
+
+
+class CompiledPredictor:
+    """Scores model-order rows (as written by FeatureSchema.encode_row) with an exported applier."""
+
+    def __init__(self, apply, schema, path=None):
+        self._apply = apply
+        self.schema = schema
+        self.path = path
+
+    @classmethod
+    def load(cls, path, schema):
+        spec = importlib.util.spec_from_file_location(f"_catboost_applier_{abs(hash(path))}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return cls(module.apply_catboost_model, schema, path)
+
+    def raw(self, row):
+        num = [float(row[i]) for i in self.schema.num_indices]
+        cat = [row[i] for i in self.schema.cat_indices]
+        return self._apply(num, cat)
+
+    def predict_proba_row(self, row):
+        """(1, 2) probability matrix for one model-order row, like predict_proba."""
+        raw = self.raw(row)
+        # sigmoid without overflow for large |raw|
+        if raw >= 0:
+            p = 1.0 / (1.0 + math.exp(-raw))
+        else:
+            e = math.exp(raw)
+            p = e / (1.0 + e)
+        return np.array([[1.0 - p, p]])
+
+
+def _full_proba(model, schema, row):
+    return np.asarray(model.predict_proba(schema.row_pool(row[None, :]), thread_count=1))
+
+
+def parity(model, predictor, rows):
+    """Largest absolute probability difference between `predictor` and `model` over feature dicts `rows`."""
+    schema = predictor.schema
+    worst = 0.0
+    for data in rows:
+        row = schema.encode_row(data)[0].copy()
+        diff = np.abs(predictor.predict_proba_row(row) - _full_proba(model, schema, row)).max()
+        worst = max(worst, float(diff))
+    return worst
+
+
+def _median_seconds(fn, repeat=25):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return sorted(times)[len(times) // 2]
+
+
+WIND_DIRECTIONS = ["N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
+                   "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW"]
+KNOWN_CATEGORIES = {
+    "WindGustDir": WIND_DIRECTIONS,
+    "WindDir9am": WIND_DIRECTIONS,
+    "WindDir3pm": WIND_DIRECTIONS,
+    "RainToday": ["No", "Yes"],
+}
+SYNTHETIC_PROBES = 32
+
+
+def _sidecar(model_path):
+    try:
+        with open(os.path.join(os.path.dirname(model_path), "metadata.json"), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def probe_rows(model, model_path=None, n=SYNTHETIC_PROBES):
+    """
+    Rows to check parity on: all-missing, the registry's dummy row (0.0 /
+    "Unknown"), the held-out `probe_rows` train_catboost saves in the
+    metadata.json sidecar, and `n` rows cycling the known category values
+    (and the probes' locations) over spread-out numeric values.
+    """
+    from models.registry import dummy_row
+
+    dummy = dummy_row(model)
+    meta = _sidecar(model_path) if model_path else {}
+    saved = [r for r in meta.get("probe_rows") or [] if isinstance(r, dict)]
+    categories = {name: values for name, values in KNOWN_CATEGORIES.items() if name in dummy}
+    locations = sorted({str(r["Location"]) for r in saved if r.get("Location")})
+    if locations and "Location" in dummy:
+        categories["Location"] = locations
+    numeric = {name: float((meta.get("fill_values") or {}).get(name, 10.0))
+               for name, value in dummy.items() if not isinstance(value, str)}
+
+    rows = [{}, dummy] + saved
+    for i in range(n):
+        row = {name: round(value * (0.25 + 1.5 * i / max(n - 1, 1)), 3) for name, value in numeric.items()}
+        for j, (name, values) in enumerate(categories.items()):
+            row[name] = values[(i + 5 * j) % len(values)]
+        rows.append(row)
+    return rows
+
+
+def load_for(model, model_path, schema=None):
+    """
+    CompiledPredictor for `model` if one was exported next to `model_path`,
+    matches the model and (in auto mode) is faster; otherwise None.
+    Results are remembered per model object (weakly, so a model dropped by a
+    reload takes its applier with it) and applier file.
+    """
+    if MODE == "off" or not model_path or not supported(model):
+        return None
+    path = applier_path(model_path)
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        return None
+    with _loaded_lock:
+        cached = _loaded.get(id(model))
+        if cached is not None and cached[0]() is model and cached[1] == key:
+            return cached[2]
+        try:
+            schema = schema or FeatureSchema.from_model(model)
+            predictor = CompiledPredictor.load(path, schema)
+            diff = parity(model, predictor, probe_rows(model, model_path))
+            if diff > PARITY_TOLERANCE:
+                logger.warning("compiled predictor %s disagrees with the model (max diff %.3g); not used", path, diff)
+                predictor = None
+            elif MODE != "on":
+                row = schema.encode_row({})[0].copy()
+                compiled_s = _median_seconds(lambda: predictor.predict_proba_row(row))
+                full_s = _median_seconds(lambda: _full_proba(model, schema, row))
+                if compiled_s >= full_s:
+                    predictor = None
+        except Exception:
+            logger.exception("compiled predictor %s failed to load", path)
+            predictor = None
+        _loaded[id(model)] = (weakref.ref(model, _forget_id(id(model))), key, predictor)
+        return predictor
+
+
+def _forget_id(model_id):
+    # no lock: the callback can run from a GC triggered while _loaded_lock is held
+    def callback(ref):
+        if _loaded.get(model_id, (None,))[0] is ref:
+            _loaded.pop(model_id, None)
+    return callback
+
+
+def forget(model):
+    """Drop the predictor remembered for `model` (called when a reload swaps it out)."""
+    with _loaded_lock:
+        _loaded.pop(id(model), None)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export or check the standalone single-row predictor.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="write <model file>.py next to a .cbm")
+    p_export.add_argument("model_path")
+    p_export.add_argument("--data", help="training CSV (needed when the model has categorical features)")
+    p_check = sub.add_parser("check", help="compare compiled and full-model probabilities row by row")
+    p_check.add_argument("model_path")
+    p_check.add_argument("--data", help="CSV of weatherAUS-shaped rows (default: probe rows only)")
+    p_check.add_argument("--rows", type=int, default=1000, help="rows of --data to check")
+    args = parser.parse_args(argv)
+
+    from models.registry import load_model_file
+
+    model = load_model_file(args.model_path)
+    if args.command == "export":
+        pool = None
+        if args.data:
+            import pandas as pd
+            from preprocessing import add_date_parts, fill_missing
+
+            schema = FeatureSchema.from_model(model)
+            frame = fill_missing(add_date_parts(pd.read_csv(args.data, low_memory=False)))
+            pool = schema.pool(frame.to_dict("records"))
+        print(export(model, args.model_path, pool=pool))
+        return
+
+    schema = FeatureSchema.from_model(model)
+    predictor = CompiledPredictor.load(applier_path(args.model_path), schema)
+    rows = probe_rows(model, args.model_path)
+    if args.data:
+        import pandas as pd
+
+        rows += pd.read_csv(args.data, nrows=args.rows).to_dict("records")
+    diff = parity(model, predictor, rows)
+    row = schema.encode_row(rows[-1])[0].copy()
+    summary = {
+        "rows": len(rows),
+        "max_abs_diff": diff,
+        "ok": diff <= PARITY_TOLERANCE,
+        "compiled_us": round(_median_seconds(lambda: predictor.predict_proba_row(row)) * 1e6, 1),
+        "full_model_us": round(_median_seconds(lambda: _full_proba(model, schema, row)) * 1e6, 1),
+    }
+    print(json.dumps(summary))
+    if not summary["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
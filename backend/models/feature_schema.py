@@ -0,0 +1,207 @@
+import math
+import datetime
+import threading
+
+import numpy as np
+
+
+DEFAULT_CATEGORY = "Unknown"
+
+# alternative spellings seen across the codebase -> model column
+ALIASES = {
+    "month": "Date_month",
+    "day": "Date_day",
+    "city": "Location",
+}
+
+
+def _norm(key):
+    """Case-, space- and punctuation-insensitive key ("Date_month" == "date month")."""
+    return "".join(ch for ch in str(key) if ch.isalnum()).casefold()
+
+
+class FeatureError(ValueError):
+    """A field could not be coerced to the type the model expects."""
+    def __init__(self, field, message):
+        super().__init__(f"{field}: {message}")
+        self.field = field
+
+
+class FeatureSchema:
+    """
+    Column layout compiled once from a loaded model (`feature_names_` and
+    categorical indices). Encodes feature dicts straight into NumPy buffers
+    for a CatBoost Pool, validating, coercing and defaulting every field in
+    a single pass:
+
+    - keys match case/space/underscore-insensitively, plus ALIASES
+      ("month" -> Date_month); a "date" (YYYY-MM-DD) fills Date_month /
+      Date_day when those aren't given explicitly; unknown keys are ignored
+    - numeric columns become float (missing -> NaN, which CatBoost treats
+      as a missing value); non-numeric input raises FeatureError
+    - categorical columns become str (missing -> "Unknown", as in training)
+    """
+
+    def __init__(self, names, cat_indices, defaults=None):
+        self.names = tuple(names)
+        cat = set(int(i) for i in cat_indices)
+        self.cat_indices = [i for i in range(len(self.names)) if i in cat]
+        self.num_indices = [i for i in range(len(self.names)) if i not in cat]
+        self.cat_names = [self.names[i] for i in self.cat_indices]
+        self.num_names = [self.names[i] for i in self.num_indices]
+
+        # lookup key -> (is_cat, position within its block, model column index)
+        self._slots = {}
+        for pos, i in enumerate(self.num_indices):
+            self._add_slot(self.names[i], (False, pos, i))
+        for pos, i in enumerate(self.cat_indices):
+            self._add_slot(self.names[i], (True, pos, i))
+        for alias, target in ALIASES.items():
+            slot = self._slots.get(target)
+            if slot is not None:
+                self._slots.setdefault(alias, slot)
+                self._slots.setdefault(_norm(alias), slot)
+        self._month = self._slots.get("Date_month")
+        self._day = self._slots.get("Date_day")
+
+        # default row, copied into the buffer before each row is written
+        self._template = np.empty(len(self.names), dtype=object)
+        self._template[self.num_indices] = math.nan
+        self._template[self.cat_indices] = DEFAULT_CATEGORY
+        self._num_template = np.full(len(self.num_indices), np.nan, dtype=np.float32)
+        self._cat_template = np.full(len(self.cat_indices), DEFAULT_CATEGORY, dtype=object)
+        for key, value in (defaults or {}).items():
+            slot = self._lookup(key)
+            if slot is not None and value is not None:
+                self._write(slot, value, self._template, self._num_template, self._cat_template)
+
+        self._tls = threading.local()
+
+    def _add_slot(self, name, slot):
+        self._slots[name] = slot
+        self._slots.setdefault(_norm(name), slot)
+
+    def _lookup(self, key):
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots.get(_norm(key))
+        return slot
+
+    @classmethod
+    def from_model(cls, model, defaults=None):
+        names = list(getattr(model, "feature_names_", None) or [])
+        if not names:
+            raise ValueError("model does not expose feature_names_")
+        cat = model.get_cat_feature_indices() if hasattr(model, "get_cat_feature_indices") else []
+        return cls(names, cat, defaults=defaults)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _coerce(self, slot, value):
+        """Coerced value for `slot`, or None to keep the default."""
+        is_cat, _, idx = slot
+        if value is None or value == "":
+            return None
+        if is_cat:
+            if isinstance(value, float):
+                if math.isnan(value):
+                    return None
+                if value.is_integer():
+                    value = int(value)
+            return value if isinstance(value, str) else str(value)
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise FeatureError(self.names[idx], f"expected a number, got {value!r}")
+
+    @staticmethod
+    def _write(slot, value, row, num, cat):
+        is_cat, pos, idx = slot
+        if row is not None:
+            row[idx] = value
+        if is_cat:
+            if cat is not None:
+                cat[pos] = value
+        elif num is not None:
+            num[pos] = value
+
+    def _fill(self, data, row=None, num=None, cat=None):
+        """Write one feature dict into a model-order row and/or num/cat block rows."""
+        if not isinstance(data, dict):
+            raise FeatureError("row", "row must be a JSON object")
+        date = None
+        month_set = day_set = False
+        for key, value in data.items():
+            slot = self._lookup(key)
+            if slot is None:
+                if _norm(key) == "date":
+                    date = value
+                continue
+            value = self._coerce(slot, value)
+            if value is None:
+                continue
+            self._write(slot, value, row, num, cat)
+            month_set = month_set or slot is self._month
+            day_set = day_set or slot is self._day
+
+        if date is not None and (self._month or self._day) and not (month_set and day_set):
+            try:
+                d = date if isinstance(date, (datetime.date, datetime.datetime)) \
+                    else datetime.date.fromisoformat(str(date).strip()[:10])
+            except ValueError:
+                raise FeatureError("date", f"expected YYYY-MM-DD, got {date!r}")
+            if self._month and not month_set:
+                self._write(self._month, float(d.month), row, num, cat)
+            if self._day and not day_set:
+                self._write(self._day, float(d.day), row, num, cat)
+
+    def encode_row(self, data):
+        """
+        Encode one dict into this thread's preallocated model-order buffer.
+        The returned array is reused by the next call on the same thread, so
+        hand it to CatBoost (which copies it into a Pool) before encoding again.
+        """
+        buf = getattr(self._tls, "row", None)
+        if buf is None:
+            buf = self._tls.row = np.empty((1, len(self.names)), dtype=object)
+        buf[0] = self._template
+        self._fill(data, row=buf[0])
+        return buf
+
+    def encode_blocks(self, rows):
+        """Encode many dicts into (float32 numeric block, object categorical block)."""
+        n = len(rows)
+        num = np.empty((n, len(self.num_indices)), dtype=np.float32)
+        cat = np.empty((n, len(self.cat_indices)), dtype=object)
+        num[:] = self._num_template
+        cat[:] = self._cat_template
+        for i, data in enumerate(rows):
+            self._fill(data, num=num[i], cat=cat[i])
+        return num, cat
+
+    def row_pool(self, buf):
+        """CatBoost Pool over a buffer returned by `encode_row`."""
+        from catboost import Pool
+
+        return Pool(buf, cat_features=self.cat_indices, feature_names=list(self.names))
+
+    def pool(self, rows):
+        """CatBoost Pool for `rows`; raises FeatureError on the first invalid row."""
+        from catboost import Pool, FeaturesData
+
+        if len(rows) == 1:
+            return self.row_pool(self.encode_row(rows[0]))
+        num, cat = self.encode_blocks(rows)
+        return Pool(FeaturesData(
+            num_feature_data=num,
+            cat_feature_data=cat,
+            num_feature_names=self.num_names,
+            cat_feature_names=self.cat_names,
+        ))
+
+    def to_dict(self, data):
+        """Validated, coerced and defaulted copy of `data` keyed by model column names."""
+        row = self._template.copy()
+        self._fill(data, row=row)
+        return {n: (None if isinstance(v, float) and math.isnan(v) else v) for n, v in zip(self.names, row.tolist())}
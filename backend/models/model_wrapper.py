@@ -0,0 +1,432 @@
+import os
+import time
+import logging
+import threading
+import joblib
+import json
+import numpy as np
+import pandas as pd
+
+from metrics import record_model
+from models.feature_schema import FeatureError, FeatureSchema
+from models.prediction_cache import prediction_key
+
+logger = logging.getLogger(__name__)
+
+
+# hot-reload validation: a candidate may not lose more than this much
+# accuracy on the held-out sample compared with the model it replaces
+MAX_ACCURACY_DROP = float(os.environ.get("MODEL_MAX_ACCURACY_DROP", "0.02"))
+LABEL_COLUMN = "RainTomorrow"
+
+
+def _error_type(exc):
+    """"invalid_input" for rows the schema rejected, else "model_error"."""
+    return "invalid_input" if isinstance(exc, FeatureError) else "model_error"
+
+
+class _Active:
+    """The model being served plus its metadata; replaced as a whole on swap."""
+    __slots__ = ("model", "version", "path", "swapped_at", "swap_ms", "_schema", "_compiled")
+
+    def __init__(self, model, version=None, path=None, swapped_at=None, swap_ms=None):
+        self.model = model
+        self.version = version
+        self.path = path
+        self.swapped_at = swapped_at
+        self.swap_ms = swap_ms
+        self._schema = None
+        self._compiled = None
+
+    @property
+    def schema(self):
+        """FeatureSchema compiled from the model, or None if it has no feature names."""
+        if self._schema is None and self.model is not None:
+            try:
+                self._schema = FeatureSchema.from_model(self.model)
+            except Exception:
+                self._schema = False
+        return self._schema or None
+
+    @property
+    def compiled(self):
+        """Exported single-row predictor (models/compiled.py), or None if there is none or it isn't used."""
+        if self._compiled is None:
+            from models.compiled import load_for
+
+            schema = self.schema
+            self._compiled = (load_for(self.model, self.path, schema) if schema is not None else None) or False
+        return self._compiled or None
+
+
+class ModelWrapper:
+    """Lightweight wrapper that lazy-loads a CatBoost model saved either as
+    joblib pickle (.pkl) or CatBoost native (.cbm). Provides `predict_from_dict`
+    for single rows and `predict_batch` for many rows in one model call.
+
+    The served model can be replaced at runtime with `reload()` (or by
+    `watch()`ing its file): the candidate is loaded, warmed and validated in
+    the background and then swapped in with a single attribute assignment,
+    so requests already running finish on the model they started with.
+    """
+    def __init__(self, model_dir=None, model=None, name=None, version=None, path=None, registry=None, cache=None):
+        base = os.path.dirname(os.path.dirname(__file__))
+        self.model_dir = model_dir or os.path.join(base, "models")
+        # candidate files
+        self.pkl_path = os.path.join(self.model_dir, "cat.pkl")
+        self.cbm_path = os.path.join(self.model_dir, "cat.cbm")
+        self.holdout_path = os.environ.get("MODEL_HOLDOUT_PATH") or os.path.join(self.model_dir, "holdout.csv")
+        self.name = name
+        self.registry = registry
+        # optional PredictionCache memoizing single-row predictions
+        self.cache = cache
+        # a model already loaded by the registry skips the lazy load entirely
+        self._active = _Active(model, version, path)
+        self._load_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._watch_pid = None
+        self.last_reload = None
+
+    def _load(self):
+        # try native cbm first (safer across numpy/catboost wheel mismatches)
+        if os.path.exists(self.cbm_path):
+            try:
+                from catboost import CatBoostClassifier
+                cb = CatBoostClassifier()
+                cb.load_model(self.cbm_path)
+                self._active = _Active(cb, self._active.version, self.cbm_path)
+                return
+            except Exception:
+                logger.warning("loading %s failed; trying %s", self.cbm_path, self.pkl_path, exc_info=True)
+
+        if os.path.exists(self.pkl_path):
+            # joblib pickle (may require same catboost binary)
+            self._active = _Active(joblib.load(self.pkl_path), self._active.version, self.pkl_path)
+            return
+
+        raise FileNotFoundError("No model found (cat.cbm or cat.pkl) in %s" % self.model_dir)
+
+    def _current(self):
+        """Snapshot of the served model; use one snapshot for a whole request."""
+        active = self._active
+        if active.model is None:
+            with self._load_lock:
+                if self._active.model is None:
+                    self._load()
+            active = self._active
+        return active
+
+    @property
+    def model(self):
+        return self._current().model
+
+    @property
+    def version(self):
+        return self._active.version
+
+    @property
+    def schema(self):
+        return self._current().schema
+
+    @property
+    def feature_names_(self):
+        schema = self.schema
+        return list(schema.names) if schema is not None else getattr(self.model, "feature_names_", None)
+
+    def metadata(self, active=None):
+        """Model identity + last swap latency, for response metadata."""
+        active = active or self._active
+        return {
+            "model_name": self.name,
+            "model_version": active.version,
+            "model_swapped_at": active.swapped_at,
+            "model_swap_ms": active.swap_ms,
+            "model_compiled": bool(active._compiled),
+        }
+
+    @staticmethod
+    def _frame(rows, m):
+        """Build one columnar DataFrame for `rows`, in the model's column order if known."""
+        columns = getattr(m, "feature_names_", None)
+        if columns:
+            return pd.DataFrame.from_records(rows, columns=list(columns))
+        return pd.DataFrame.from_records(rows)
+
+    @staticmethod
+    def _labels_from_proba(m, probs):
+        """Derive class labels from a probability matrix instead of a second predict call."""
+        idx = np.argmax(probs, axis=1)
+        classes = getattr(m, "classes_", None)
+        if classes is not None and len(classes) == probs.shape[1]:
+            return np.asarray(classes)[idx].tolist()
+        return idx.tolist()
+
+    def _score(self, m, rows, schema=None, compiled=None):
+        """Return (labels, probabilities) for `rows`; probabilities is None if unsupported.
+        With a compiled schema the rows are encoded straight into a CatBoost Pool;
+        otherwise (e.g. legacy pickles without feature names) via a DataFrame.
+        A single row goes through the exported predictor instead, if one is given.
+        """
+        if compiled is not None and len(rows) == 1:
+            probs = compiled.predict_proba_row(schema.encode_row(rows[0])[0])
+            return self._labels_from_proba(m, probs), probs
+        data = schema.pool(rows) if schema is not None else self._frame(rows, m)
+        if hasattr(m, "predict_proba"):
+            if len(rows) == 1:
+                # a thread pool costs more than it saves on one row
+                probs = np.asarray(m.predict_proba(data, thread_count=1))
+            else:
+                probs = np.asarray(m.predict_proba(data))
+            return self._labels_from_proba(m, probs), probs
+        preds = m.predict(data)
+        return (preds.tolist() if hasattr(preds, "tolist") else list(preds)), None
+
+    def predict_from_dict(self, data: dict):
+        """Accepts a single-row dict with feature names -> returns prediction dict.
+        Encodes the row through the model's feature schema and calls
+        predict_proba once; labels are derived from the probabilities.
+        With a cache attached, repeat feature vectors are answered from it
+        ("cache": "hit" / "shared_hit" / "miss" in the result).
+        """
+        active = self._current()
+        out = {"ok": True}
+        start = time.perf_counter()
+
+        try:
+            if self.cache is not None and active.schema is not None:
+                out.update(self._predict_cached(active, data))
+            else:
+                labels, probs = self._score(active.model, [data], active.schema, active.compiled)
+                out["probabilities"] = probs.tolist() if probs is not None else None
+                out["prediction"] = labels
+        except Exception as e:
+            if isinstance(e, FeatureError):
+                # the caller's input, not the model: no traceback
+                logger.debug("rejected row for model %s@%s: %s", self.name, active.version, e)
+            else:
+                logger.exception("prediction failed for model %s@%s", self.name, active.version)
+            out["ok"] = False
+            out["probabilities"] = None
+            out["prediction"] = None
+            out["error"] = str(e)
+            out["error_type"] = _error_type(e)
+
+        kind = "single" if out.get("cache") in (None, "miss") else "cached"
+        record_model(self.name, active.version, kind, time.perf_counter() - start, error="error" in out)
+        out.update(self.metadata(active))
+        return out
+
+    def _predict_cached(self, active, data):
+        schema, m = active.schema, active.model
+        buf = schema.encode_row(data)
+        version = active.version or f"id-{id(m)}"
+        key = prediction_key(self.name, version, buf[0])
+        cached, status = self.cache.get(key)
+        if cached is not None:
+            return dict(cached, cache=status)
+
+        compiled = active.compiled
+        if compiled is not None:
+            probs = compiled.predict_proba_row(buf[0])
+            value = {"prediction": self._labels_from_proba(m, probs), "probabilities": probs.tolist()}
+        elif hasattr(m, "predict_proba"):
+            probs = np.asarray(m.predict_proba(schema.row_pool(buf), thread_count=1))
+            value = {"prediction": self._labels_from_proba(m, probs), "probabilities": probs.tolist()}
+        else:
+            preds = m.predict(schema.row_pool(buf))
+            value = {"prediction": preds.tolist() if hasattr(preds, "tolist") else list(preds), "probabilities": None}
+        self.cache.put(key, value)
+        return dict(value, cache=status)
+
+    def predict_batch(self, rows):
+        """Score a list of feature dicts with a single model call.
+
+        Returns one result dict per input row, in order. Rows that are not
+        dicts, or that cannot be scored, come back as {"ok": False, "error": ...,
+        "error_type": "invalid_input" | "model_error"} without failing the
+        rest of the batch.
+        """
+        results = [None] * len(rows)
+        valid = []
+        for i, row in enumerate(rows):
+            if isinstance(row, dict):
+                valid.append(i)
+            else:
+                results[i] = {"index": i, "ok": False, "error": "row must be a JSON object",
+                              "error_type": "invalid_input"}
+
+        if not valid:
+            return results
+
+        active = self._current()
+        m, schema = active.model, active.schema
+        start = time.perf_counter()
+        try:
+            labels, probs = self._score(m, [rows[i] for i in valid], schema)
+        except Exception as e:
+            # a single bad row fails the vectorized call; fall back to scoring
+            # rows one at a time so the error is pinned to the row that caused it
+            logger.debug("batch of %d rows failed (%s); scoring rows one at a time", len(valid), e)
+            labels = probs = None
+        record_model(self.name, active.version, "batch", time.perf_counter() - start, error=labels is None)
+
+        if labels is not None:
+            for j, i in enumerate(valid):
+                results[i] = {
+                    "index": i,
+                    "ok": True,
+                    "prediction": labels[j],
+                    "probabilities": probs[j].tolist() if probs is not None else None,
+                }
+            return results
+
+        for i in valid:
+            try:
+                row_labels, row_probs = self._score(m, [rows[i]], schema)
+                results[i] = {
+                    "index": i,
+                    "ok": True,
+                    "prediction": row_labels[0],
+                    "probabilities": row_probs[0].tolist() if row_probs is not None else None,
+                }
+            except Exception as e:
+                if not isinstance(e, FeatureError):
+                    logger.exception("prediction failed for row %d, model %s@%s", i, self.name, active.version)
+                results[i] = {"index": i, "ok": False, "error": str(e), "error_type": _error_type(e)}
+        return results
+
+    # ------------------------------------------------------------------
+    # hot reload
+    # ------------------------------------------------------------------
+    def _holdout(self):
+        """(rows, labels) from the held-out CSV, or (None, None) if there is none."""
+        if not self.holdout_path or not os.path.exists(self.holdout_path):
+            return None, None
+        df = pd.read_csv(self.holdout_path)
+        labels = None
+        if LABEL_COLUMN in df.columns:
+            labels = df.pop(LABEL_COLUMN)
+            if not pd.api.types.is_numeric_dtype(labels):
+                labels = labels.map({"Yes": 1, "No": 0})
+            labels = labels.to_numpy()
+        return df.to_dict("records"), labels
+
+    def _accuracy(self, m, rows, labels, schema=None):
+        predicted, _ = self._score(m, rows, schema)
+        return float(np.mean(np.asarray(predicted).astype(str) == labels.astype(str)))
+
+    def validate(self, candidate):
+        """Raise ValueError unless `candidate` scores the held-out sample sanely
+        and (when labels are present) at least as well as the current model,
+        within MODEL_MAX_ACCURACY_DROP."""
+        from models.registry import dummy_row
+
+        rows, labels = self._holdout()
+        if rows is None:
+            rows = [dummy_row(candidate)]
+        schema = _Active(candidate).schema
+        _, probs = self._score(candidate, rows, schema)
+        if probs is not None and (probs.ndim != 2 or probs.shape[0] != len(rows) or not np.isfinite(probs).all()):
+            raise ValueError("candidate model returned malformed probabilities on the validation sample")
+
+        report = {"validation_rows": len(rows)}
+        if labels is not None:
+            report["holdout_accuracy"] = new_acc = self._accuracy(candidate, rows, labels, schema)
+            current = self._active
+            if current.model is not None:
+                report["current_accuracy"] = old_acc = self._accuracy(current.model, rows, labels, current.schema)
+                if new_acc < old_acc - MAX_ACCURACY_DROP:
+                    raise ValueError(f"holdout accuracy {new_acc:.4f} is below current {old_acc:.4f}")
+        return report
+
+    def reload(self, path=None, version=None, wait=True):
+        """
+        Load the model at `path` (default: the current file), warm and validate
+        it, then swap it in atomically. With wait=False this runs in a
+        background thread and returns immediately. Returns a status dict.
+        """
+        if not wait:
+            if self._reload_lock.locked():
+                return {"ok": False, "error": "reload_in_progress"}
+            threading.Thread(target=self.reload, kwargs={"path": path, "version": version},
+                             name="model-reload", daemon=True).start()
+            return {"ok": True, "status": "started"}
+
+        if not self._reload_lock.acquire(blocking=False):
+            return {"ok": False, "error": "reload_in_progress"}
+        path = path or self._active.path or self.cbm_path
+        try:
+            from models.registry import load_model_file, warm_model, file_version
+
+            start = time.perf_counter()
+            candidate = load_model_file(path)
+            warm_model(candidate, path)
+            report = self.validate(candidate)
+            version = version or file_version(path)
+            swap_ms = round((time.perf_counter() - start) * 1000.0, 2)
+            # single reference assignment: in-flight requests keep their snapshot
+            previous, self._active = self._active, _Active(candidate, version, path, time.time(), swap_ms)
+            if previous.model is not None and previous.model is not candidate:
+                from models.compiled import forget
+                forget(previous.model)
+            if self.registry is not None and self.name:
+                self.registry.add(self.name, version, path, candidate, swap_ms / 1000.0)
+            status = dict(report, ok=True, version=version, path=path, swap_ms=swap_ms)
+            logger.info("model %s reloaded from %s as %s in %.1f ms", self.name, path, version, swap_ms)
+        except Exception as e:
+            logger.exception("model reload from %s failed", path)
+            status = {"ok": False, "error": str(e), "path": path}
+        finally:
+            self._reload_lock.release()
+        status["at"] = time.time()
+        self.last_reload = status
+        return status
+
+    def _watch_target(self):
+        """(path, version) of the newest model file to serve, or None."""
+        path = self._active.path or self.cbm_path
+        version_dir = os.path.dirname(path)
+        name_dir = os.path.dirname(version_dir)
+        if os.path.basename(path) == "model.cbm" and os.path.isdir(name_dir):
+            # versioned layout <name>/<version>/model.cbm: follow the newest version
+            from models.registry import ordered_versions
+
+            versions = ordered_versions(name_dir)
+            if versions:
+                return os.path.join(name_dir, versions[-1], "model.cbm"), versions[-1]
+        return (path, None) if os.path.exists(path) else None
+
+    def _fingerprint(self):
+        target = self._watch_target()
+        if target is None:
+            return None
+        st = os.stat(target[0])
+        return target, st.st_mtime_ns, st.st_size
+
+    def watch(self, interval=None):
+        """Poll the model file (or version directory) and hot-reload on change.
+        Safe to call repeatedly; starts one watcher thread per process."""
+        if self._watch_pid == os.getpid():
+            return
+        self._watch_pid = os.getpid()
+        interval = interval or float(os.environ.get("MODEL_WATCH_INTERVAL", "5"))
+        threading.Thread(target=self._watch_loop, args=(interval,), name="model-watch", daemon=True).start()
+
+    def _watch_loop(self, interval):
+        last = self._fingerprint()
+        while True:
+            time.sleep(interval)
+            try:
+                fp = self._fingerprint()
+                if fp is None or fp == last:
+                    continue
+                # wait for the file to stop changing so a half-written model isn't loaded
+                time.sleep(interval)
+                if self._fingerprint() != fp:
+                    continue
+                (path, version), _, _ = fp
+                self.reload(path=path, version=version)
+                last = fp
+            except Exception as e:
+                logger.exception("model watcher failed")
+                self.last_reload = {"ok": False, "error": str(e), "at": time.time()}
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def prediction_key(model_name, model_version, encoded_row):
+    """Stable hash of a canonicalized (schema-encoded) feature vector + model name and version.
+
+    `encoded_row` is the row after the schema has coerced and defaulted it, so
+    {"MinTemp": "10"} and {"min temp": 10.0} map to the same key; the model
+    name and version are part of the key, so swapping the model invalidates
+    every entry and two models sharing a version string (rain/v1, other/v1)
+    never see each other's predictions.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(model_name or "").encode())
+    h.update(b"\x00")
+    h.update(str(model_version).encode())
+    h.update(b"\x00")
+    h.update(repr(tuple(encoded_row)).encode())
+    return h.hexdigest()
+
+
+class PredictionCache:
+    """
+    Memo cache for single-row predictions: an in-process LRU bounded by entry
+    count, optionally backed by a SQLite file shared by every worker on the
+    host (PREDICTION_CACHE_PATH). Thread-safe; the lock only guards the LRU,
+    SQLite reads and writes run outside it on a per-thread connection.
+    """
+
+    def __init__(self, max_entries=10000, path=None, max_shared_entries=200000):
+        self.max_entries = max_entries
+        self.path = path
+        self.max_shared_entries = max_shared_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._tls = threading.local()
+        self._writes = 0
+        self._counters = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0, "shared_errors": 0}
+
+    def _connection(self):
+        # one connection per thread; sqlite connections must not cross a fork either
+        conn = getattr(self._tls, "conn", None)
+        if conn is None or self._tls.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS prediction_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_prediction_cache_created ON prediction_cache (created_at)")
+            conn.commit()
+            self._tls.conn, self._tls.pid = conn, os.getpid()
+        return conn
+
+    def _remember(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key):
+        """Return (value, "hit" | "shared_hit" | "miss")."""
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+                self._counters["hits"] += 1
+                return value, "hit"
+        if self.path:
+            try:
+                row = self._connection().execute(
+                    "SELECT value FROM prediction_cache WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error:
+                row = None
+                self._count("shared_errors")
+            if row is not None:
+                value = json.loads(row[0])
+                with self._lock:
+                    self._remember(key, value)
+                    self._counters["shared_hits"] += 1
+                return value, "shared_hit"
+        self._count("misses")
+        return None, "miss"
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+            if not self.path:
+                return
+            self._writes += 1
+            prune = self._writes % 1000 == 0
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO prediction_cache VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+            if prune:
+                # keep the shared file bounded: drop the oldest rows past the cap
+                conn.execute(
+                    "DELETE FROM prediction_cache WHERE key IN (SELECT key FROM prediction_cache"
+                    " ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_shared_entries,),
+                )
+            conn.commit()
+        except sqlite3.Error:
+            self._count("shared_errors")
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._counters)
+            out.update({"entries": len(self._data), "max_entries": self.max_entries, "shared_path": self.path})
+        return out
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """Process-wide cache configured from the environment, or None when disabled
+    (PREDICTION_CACHE_SIZE=0)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            size = int(os.environ.get("PREDICTION_CACHE_SIZE", "10000"))
+            if size <= 0:
+                return None
+            _cache = PredictionCache(max_entries=size, path=os.environ.get("PREDICTION_CACHE_PATH") or None)
+        return _cache
@@ -0,0 +1,232 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import datetime
+import threading
+
+from models.model_wrapper import ModelWrapper
+from models.prediction_cache import get_prediction_cache
+
+logger = logging.getLogger(__name__)
+
+
+class ModelEntry:
+    """A loaded, warmed model plus where it came from."""
+    def __init__(self, name, version, path, model, load_seconds, pinned=True):
+        self.name = name
+        self.version = version
+        self.path = path
+        self.model = model
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.warmed = False
+        # pinned entries (found on disk by discover/register) stay loaded;
+        # unpinned ones (hot reloads) are dropped once superseded as default
+        self.pinned = pinned
+
+    def describe(self):
+        return {
+            "name": self.name,
+            "version": self.version,
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 4),
+            "warmed": self.warmed,
+            "pinned": self.pinned,
+        }
+
+
+def file_version(path):
+    """Content-derived version for unversioned model files."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return "sha-" + h.hexdigest()[:12]
+
+
+def _natural_key(version):
+    # "v9" < "v10"; digit runs compare as numbers, text as text
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part) for part in re.split(r"(\d+)", version) if part]
+
+
+def _created_at(version_dir):
+    """Epoch seconds from metadata.json's created_at, else model.cbm's mtime."""
+    try:
+        with open(os.path.join(version_dir, "metadata.json")) as fh:
+            created = datetime.datetime.fromisoformat(json.load(fh)["created_at"])
+        if created.tzinfo is None:
+            created = created.replace(tzinfo=datetime.timezone.utc)
+        return created.timestamp()
+    except (OSError, ValueError, KeyError, TypeError):
+        return os.path.getmtime(os.path.join(version_dir, "model.cbm"))
+
+
+def ordered_versions(name_dir):
+    """Version directories under `name_dir` holding a model.cbm, oldest first
+    (by creation time, then natural order of the name)."""
+    versions = [v for v in os.listdir(name_dir) if os.path.exists(os.path.join(name_dir, v, "model.cbm"))]
+    return sorted(versions, key=lambda v: (_created_at(os.path.join(name_dir, v)), _natural_key(v)))
+
+
+def load_model_file(path):
+    """Load a CatBoost .cbm (native) or a legacy joblib .pkl."""
+    if path.endswith(".cbm"):
+        from catboost import CatBoostClassifier
+        cb = CatBoostClassifier()
+        cb.load_model(path)
+        return cb
+    import joblib
+    return joblib.load(path)
+
+
+def dummy_row(model):
+    """One syntactically valid row for the model: 0.0 for numeric, "Unknown" for categorical."""
+    names = list(getattr(model, "feature_names_", None) or [])
+    cat_idx = set()
+    if hasattr(model, "get_cat_feature_indices"):
+        try:
+            cat_idx = set(model.get_cat_feature_indices())
+        except Exception:
+            cat_idx = set()
+    return {n: ("Unknown" if i in cat_idx else 0.0) for i, n in enumerate(names)}
+
+
+def warm_model(model, path=None):
+    """Run one dummy prediction so the first real request doesn't pay lazy init costs.
+    Goes through the same single-row path as requests, which runs CatBoost
+    single-threaded, so no worker pool exists before a fork. With `path`, this
+    also loads and checks the exported single-row predictor next to it."""
+    row = dummy_row(model)
+    if row and hasattr(model, "predict_proba"):
+        out = ModelWrapper(model=model, path=path).predict_from_dict(row)
+        if out.get("error"):
+            raise RuntimeError(f"warm-up prediction failed: {out['error']}")
+
+
+class ModelRegistry:
+    """
+    Loads every model once and hands out ModelWrappers bound to them.
+
+    Layout under `root`:
+        <root>/<name>/<version>/model.cbm   versioned models (several side by side)
+        <root>/cat.cbm, <root>/cat.pkl,
+        <root>/models/catboost_model.cbm    legacy single files, registered as DEFAULT_NAME
+
+    Load it at import time of the app so that gunicorn's preload_app loads
+    the models in the master; forked workers then share the pages
+    copy-on-write instead of each unpickling its own copy.
+    """
+
+    DEFAULT_NAME = os.environ.get("MODEL_NAME", "rain")
+    LEGACY_FILES = ("cat.cbm", os.path.join("models", "catboost_model.cbm"), "cat.pkl")
+
+    def __init__(self, root=None):
+        base = os.path.dirname(os.path.dirname(__file__))
+        self.root = root or os.environ.get("MODEL_DIR") or os.path.join(base, "models")
+        self._entries = {}
+        self._defaults = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, path, version=None, make_default=True, warm=True):
+        start = time.perf_counter()
+        model = load_model_file(path)
+        entry = ModelEntry(name, version or file_version(path), path, model, time.perf_counter() - start)
+        if warm:
+            self.warm(entry)
+        with self._lock:
+            self._entries[(name, entry.version)] = entry
+            if make_default or name not in self._defaults:
+                self._defaults[name] = entry.version
+        return entry
+
+    @staticmethod
+    def warm(entry):
+        """Run one dummy prediction so the first real request doesn't pay lazy init costs."""
+        warm_model(entry.model, entry.path)
+        entry.warmed = True
+
+    def add(self, name, version, path, model, load_seconds=0.0, make_default=True, pinned=False):
+        """Record a model loaded elsewhere (e.g. a ModelWrapper hot reload).
+        When it becomes the default, the previous default is evicted unless
+        pinned, so repeated reloads don't keep every superseded model alive."""
+        entry = ModelEntry(name, version, path, model, load_seconds, pinned=pinned)
+        entry.warmed = True
+        with self._lock:
+            self._entries[(name, version)] = entry
+            if make_default:
+                previous = self._defaults.get(name)
+                self._defaults[name] = version
+                old = self._entries.get((name, previous))
+                if previous != version and old is not None and not old.pinned:
+                    del self._entries[(name, previous)]
+        return entry
+
+    def discover(self):
+        """Register every model found under root; the newest version of each name becomes its default."""
+        if not os.path.isdir(self.root):
+            return []
+        found = []
+        for name in sorted(os.listdir(self.root)):
+            name_dir = os.path.join(self.root, name)
+            if not os.path.isdir(name_dir) or name == "models":
+                continue
+            # oldest first, so the newest version that loads becomes the default
+            for v in ordered_versions(name_dir):
+                path = os.path.join(name_dir, v, "model.cbm")
+                try:
+                    found.append(self.register(name, path, version=v))
+                except Exception:
+                    logger.exception("model load failed for %s", path)
+
+        if self.DEFAULT_NAME not in self._defaults:
+            for rel in self.LEGACY_FILES:
+                path = os.path.join(self.root, rel)
+                if os.path.exists(path):
+                    try:
+                        found.append(self.register(self.DEFAULT_NAME, path))
+                        break
+                    except Exception:
+                        logger.exception("model load failed for %s", path)
+        return found
+
+    def get(self, name=None, version=None):
+        name = name or self.DEFAULT_NAME
+        with self._lock:
+            version = version or self._defaults.get(name)
+            entry = self._entries.get((name, version))
+        if entry is None:
+            raise KeyError(f"model not loaded: {name}@{version}")
+        return entry
+
+    def wrapper(self, name=None, version=None):
+        """ModelWrapper bound to a loaded model, or None if it isn't loaded."""
+        try:
+            entry = self.get(name, version)
+        except KeyError:
+            return None
+        return ModelWrapper(model=entry.model, name=entry.name, version=entry.version,
+                            path=entry.path, registry=self, cache=get_prediction_cache())
+
+    def list(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            defaults = dict(self._defaults)
+        return [dict(e.describe(), default=(defaults.get(e.name) == e.version)) for e in entries]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Process-wide registry, discovered and warmed on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+            _registry.discover()
+        return _registry
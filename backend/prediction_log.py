@@ -0,0 +1,201 @@
+"""
+Asynchronous audit log for predictions.
+
+Request threads only append (features, result) to a bounded in-memory
+queue; a background thread drains it and writes the rows to the
+`predictions` table in batched multi-row INSERTs, one transaction per
+batch. A full queue either drops the record (default) or blocks the
+caller for at most PREDICTION_LOG_BLOCK_SECONDS (PREDICTION_LOG_POLICY=block).
+Failed predictions (an error, or no prediction) are counted but not logged.
+Set PREDICTION_LOG=0 to disable logging altogether.
+"""
+
+import os
+import json
+import queue
+import atexit
+import logging
+import datetime
+import threading
+
+QUEUE_SIZE = int(os.environ.get("PREDICTION_LOG_QUEUE", "10000"))
+BATCH_SIZE = int(os.environ.get("PREDICTION_LOG_BATCH", "500"))
+FLUSH_SECONDS = float(os.environ.get("PREDICTION_LOG_FLUSH_SECONDS", "1.0"))
+POLICY = os.environ.get("PREDICTION_LOG_POLICY", "drop")
+BLOCK_SECONDS = float(os.environ.get("PREDICTION_LOG_BLOCK_SECONDS", "0.05"))
+
+logger = logging.getLogger(__name__)
+
+
+def _first(value):
+    while isinstance(value, (list, tuple)) and value:
+        value = value[0]
+    return value
+
+
+def predicted_value(result):
+    """The row's predicted label as a float (None if it isn't numeric)."""
+    try:
+        return float(_first(result.get("prediction")))
+    except (TypeError, ValueError):
+        return None
+
+
+def positive_probability(result):
+    """Probability of the last (positive) class for the row, if the model returned probabilities."""
+    probs = result.get("probabilities")
+    if isinstance(probs, (list, tuple)) and probs and isinstance(probs[0], (list, tuple)):
+        probs = probs[0]
+    try:
+        return float(probs[-1])
+    except (TypeError, ValueError, IndexError, KeyError):
+        return None
+
+
+def to_row(features, result, timestamp, date=None):
+    """Turn one queued record into a `predictions` row. `date` (the day the
+    prediction is for) wins over the row's own "date" field and the log time."""
+    from db import city_from_features, date_from_features
+
+    day = date_from_features({"date": date}) if date else None
+    return {
+        "input_json": json.dumps(features, default=str),
+        "predicted_value": predicted_value(result),
+        "timestamp": timestamp,
+        "city": city_from_features(features),
+        "date": day or date_from_features(features, timestamp),
+        "model_version": result.get("model_version"),
+        "probability": positive_probability(result),
+    }
+
+
+class PredictionLogger:
+    """Bounded queue + background batch writer for the predictions table."""
+
+    def __init__(self, engine=None, max_queue=QUEUE_SIZE, batch_size=BATCH_SIZE,
+                 flush_seconds=FLUSH_SECONDS, policy=POLICY, block_seconds=BLOCK_SECONDS):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.policy = policy
+        self.block_seconds = block_seconds
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._counters = {"queued": 0, "written": 0, "dropped": 0, "skipped_failed": 0, "batches": 0,
+                          "errors": 0, "failed_batches": 0, "failed_rows": 0}
+        self._last_error = None
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def _ensure_writer(self):
+        # threads don't survive a fork: each worker starts its own writer
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # records queued in the parent belong to the parent
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            if self.engine is None:
+                from db import ENGINE, db_init
+                db_init()
+                self.engine = ENGINE
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+            self._thread.start()
+
+    def log(self, features, result, date=None):
+        """Queue one prediction; never raises and never waits on the database.
+        Pass `date` when the day predicted for isn't a "date" key of `features`."""
+        if isinstance(result, dict) and (result.get("error") or result.get("prediction") is None):
+            self._count("skipped_failed")
+            return
+        try:
+            self._ensure_writer()
+            record = (dict(features) if isinstance(features, dict) else features, result,
+                      datetime.datetime.utcnow(), date)
+            if self.policy == "block":
+                self._queue.put(record, timeout=self.block_seconds)
+            else:
+                self._queue.put_nowait(record)
+            self._count("queued")
+        except queue.Full:
+            self._count("dropped")
+        except Exception as e:
+            with self._lock:
+                self._counters["errors"] += 1
+                self._last_error = str(e)
+            logger.exception("prediction log: could not queue a record")
+
+    def _drain(self, first):
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        from db import Prediction
+
+        try:
+            # inside the try: an unconvertible record must not kill the writer thread
+            rows = [to_row(f, r, ts, day) for f, r, ts, day in batch]
+            with self.engine.begin() as conn:
+                conn.execute(Prediction.__table__.insert(), rows)
+            self._count("written", len(rows))
+            self._count("batches")
+        except Exception as e:
+            with self._lock:
+                self._counters["errors"] += 1
+                self._counters["failed_batches"] += 1
+                self._counters["failed_rows"] += len(batch)
+                self._last_error = str(e)
+            logger.exception("prediction log: failed to write %d rows", len(batch))
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                continue
+            self._write(self._drain(first))
+
+    def flush(self):
+        """Write everything queued so far on the calling thread (shutdown, tests, CLI)."""
+        while True:
+            try:
+                first = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._write(self._drain(first))
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._counters, last_error=self._last_error)
+        out.update({"queue_depth": self._queue.qsize(), "queue_max": self._queue.maxsize, "policy": self.policy})
+        return out
+
+
+class _NullLogger:
+    def log(self, features, result, date=None):
+        pass
+
+    def flush(self):
+        pass
+
+    def stats(self):
+        return {"enabled": False}
+
+
+if os.environ.get("PREDICTION_LOG", "1").lower() in ("0", "false", "no"):
+    prediction_logger = _NullLogger()
+else:
+    prediction_logger = PredictionLogger()
+    atexit.register(prediction_logger.flush)
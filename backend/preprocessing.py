@@ -0,0 +1,76 @@
+"""
+Preprocessing shared by training (train_catboost.py) and offline scoring
+(score.py), so a weatherAUS.csv-shaped frame is prepared the same way in
+both places.
+"""
+
+import numpy as np
+import pandas as pd
+
+TARGET = "RainTomorrow"
+UNKNOWN = "Unknown"
+
+# weatherAUS.csv columns and the compact dtypes they are read with
+NUMERIC = [
+    "MinTemp", "MaxTemp", "Rainfall", "Evaporation", "Sunshine", "WindGustSpeed",
+    "WindSpeed9am", "WindSpeed3pm", "Humidity9am", "Humidity3pm", "Pressure9am",
+    "Pressure3pm", "Cloud9am", "Cloud3pm", "Temp9am", "Temp3pm",
+]
+CATEGORICAL = ["Location", "WindGustDir", "WindDir9am", "WindDir3pm", "RainToday"]
+CSV_DTYPES = dict({c: "float32" for c in NUMERIC}, **{c: "category" for c in CATEGORICAL + [TARGET]}, Date="string")
+
+
+def encode_target(series):
+    """'Yes'/'No' -> 1/0."""
+    return series.map({"Yes": 1, "No": 0})
+
+
+def add_date_parts(df):
+    """Replace a `Date` column by the Date_month / Date_day features the served model uses."""
+    if "Date" not in df.columns:
+        return df
+    dt = pd.to_datetime(df["Date"], errors="coerce", format="mixed")
+    df = df.drop(columns=["Date"])
+    df["Date_month"] = dt.dt.month.astype("float32")
+    df["Date_day"] = dt.dt.day.astype("float32")
+    return df
+
+
+def numeric_fill_values(df):
+    """Per-column medians used to fill missing numeric values (computed on the training frame)."""
+    return {c: float(v) for c, v in df.median(numeric_only=True).items() if pd.notna(v)}
+
+
+def fill_missing(df, fill_values=None):
+    """
+    Numeric NaNs -> `fill_values` (training medians; this frame's own medians
+    if not given), everything else -> "Unknown".
+    """
+    if fill_values is None:
+        fill_values = numeric_fill_values(df)
+    df = df.fillna({c: v for c, v in fill_values.items() if c in df.columns})
+    for c in df.columns:
+        # categoricals only accept values that are already categories
+        if isinstance(df[c].dtype, pd.CategoricalDtype) and UNKNOWN not in df[c].cat.categories \
+                and df[c].isna().any():
+            df[c] = df[c].cat.add_categories([UNKNOWN])
+    return df.fillna(UNKNOWN)
+
+
+def model_blocks(df, num_names, cat_names):
+    """
+    Vectorized split of a preprocessed frame into the (float32 numeric,
+    object categorical) blocks CatBoost's FeaturesData takes. Columns the
+    frame lacks are filled with NaN / "Unknown".
+    """
+    n = len(df)
+    num = np.full((n, len(num_names)), np.nan, dtype=np.float32)
+    for j, c in enumerate(num_names):
+        if c in df.columns:
+            num[:, j] = pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float32, na_value=np.nan)
+    cat = np.full((n, len(cat_names)), UNKNOWN, dtype=object)
+    for j, c in enumerate(cat_names):
+        if c in df.columns:
+            col = df[c]
+            cat[:, j] = col.where(col.notna(), UNKNOWN).astype(str).to_numpy(dtype=object)
+    return num, cat
@@ -0,0 +1,218 @@
+"""
+Per-worker warm-up and the /api/ready report.
+
+/api/health and /api/ping only say the process is alive. A worker is
+*ready* once its warm-up has finished in that process:
+
+- model: the served model is loaded and has run a prediction here (this
+  also loads the exported single-row predictor, if any)
+- database: schema created and a pooled connection opened
+- caches (WARMUP_CACHES=1, default on when INGEST_ENABLED is set): weather
+  and AQI for the tracked cities fetched into the upstream cache, within
+  WARMUP_DEADLINE seconds; failed fetches are reported but don't block.
+  Every fetch passes the ingest scheduler's circuit check and token bucket
+  first, so N workers warming at once stay within the deployment's rate
+  budget; jobs that don't get a token are left to the scheduler
+
+and, at check time, the prediction log queue isn't full. Upstream circuit
+states are always reported; with READY_REQUIRE_UPSTREAM=1 a worker whose
+providers are all short-circuited is also reported unready (by default it
+still serves, falling back to demo features).
+
+Under gunicorn, gunicorn.conf.py's post_worker_init hook runs the warm-up in
+each freshly forked worker before it accepts connections. Elsewhere (flask
+run, other servers) it runs in a background thread started by the worker's
+first request, so the load balancer's first readiness probe kicks it off and
+gets 503 until it completes.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+def _env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+WARMUP_DEADLINE = float(os.environ.get("WARMUP_DEADLINE", "15"))
+REQUIRE_UPSTREAM = _env_flag("READY_REQUIRE_UPSTREAM")
+
+
+class Warmup:
+    """Warm-up steps for one worker process; `start()` is idempotent per process."""
+
+    def __init__(self):
+        self.state = "pending"
+        self.steps = {}
+        self.started_at = None
+        self.finished_at = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self, app, wait=False):
+        """Warm up this process in the background, or inline with `wait=True`."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.state = "running"
+            self.steps = {}
+            self.started_at = time.time()
+            self.finished_at = None
+        if wait:
+            self.run(app)
+        else:
+            threading.Thread(target=self.run, args=(app,), name="warmup", daemon=True).start()
+
+    def _step(self, name, fn):
+        t0 = time.perf_counter()
+        try:
+            detail = fn() or {}
+            ok = detail.pop("ok", True)
+            error = detail.pop("error", None)
+        except Exception as e:
+            ok, error, detail = False, str(e), {}
+        self.steps[name] = dict(detail, ok=ok, error=error, seconds=round(time.perf_counter() - t0, 3))
+        return ok
+
+    def run(self, app):
+        ok = self._step("model", lambda: warm_model(app))
+        ok = self._step("database", warm_database) and ok
+        if _env_flag("WARMUP_CACHES", default=_ingest_enabled()):
+            # best effort: an upstream outage mustn't keep every worker out of rotation
+            self._step("caches", warm_caches)
+        with self._lock:
+            self.state = "done" if ok else "failed"
+            self.finished_at = time.time()
+
+    def describe(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "steps": dict(self.steps),
+            }
+
+
+def _ingest_enabled():
+    from api.utils.ingest import ingest_enabled
+    return ingest_enabled()
+
+
+def warm_model(app):
+    from models.registry import dummy_row
+
+    wrapper = getattr(app, "model_wrapper", None)
+    if wrapper is None:
+        return {"ok": False, "error": "no_model_loaded"}
+    row = dummy_row(wrapper.model)
+    out = wrapper.predict_from_dict(row) if row else {}
+    if out.get("error"):
+        return {"ok": False, "error": f"warm-up prediction failed: {out['error']}"}
+    return {"version": wrapper.version, "compiled": bool(out.get("model_compiled"))}
+
+
+def warm_database():
+    from sqlalchemy import text
+    from db import ENGINE, db_init
+
+    db_init()
+    with ENGINE.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    return {}
+
+
+def warm_caches(deadline=WARMUP_DEADLINE, scheduler=None):
+    """
+    Fetch weather and AQI for every tracked city into the upstream cache,
+    concurrently, as far as the ingest rate limits and circuits allow.
+    """
+    from api.utils.ingest import PUBLISHERS, WORKERS, ingest_scheduler, tracked_cities
+
+    scheduler = scheduler or ingest_scheduler
+    jobs = [(kind, city) for city in tracked_cities() for kind in PUBLISHERS]
+    # never wait for a token here: the scheduler refreshes whatever is postponed
+    admitted = [(kind, city) for kind, city in jobs if scheduler.blocked_for(kind) == 0]
+    pool = ThreadPoolExecutor(max_workers=max(WORKERS, 1), thread_name_prefix="warmup")
+    futures = {pool.submit(PUBLISHERS[kind], city): (kind, city) for kind, city in admitted}
+    done, pending = wait(futures, timeout=deadline)
+    pool.shutdown(wait=False)
+    failed = []
+    for fut in done:
+        try:
+            out = fut.result()
+            if isinstance(out, dict) and out.get("ok") is False:
+                failed.append(futures[fut])
+        except Exception:
+            failed.append(futures[fut])
+    return {"fetched": len(done) - len(failed), "failed": len(failed), "timed_out": len(pending),
+            "postponed": len(jobs) - len(admitted), "jobs": len(jobs)}
+
+
+warmup = Warmup()
+
+
+def readiness(app):
+    """(ready, report) for this worker."""
+    from api.utils.cache import upstream_cache
+    from api.utils.http_client import upstream_stats
+    from api.utils.observation_store import observation_store
+    from models.prediction_cache import get_prediction_cache
+    from prediction_log import prediction_logger
+
+    reasons = []
+    warm = warmup.describe()
+    if warm["state"] != "done":
+        reasons.append(f"warmup_{warm['state']}")
+
+    registry = getattr(app, "model_registry", None)
+    models = registry.list() if registry is not None else []
+    wrapper = getattr(app, "model_wrapper", None)
+    if wrapper is None:
+        reasons.append("no_model_loaded")
+    elif not any(m["default"] and m["warmed"] for m in models):
+        reasons.append("model_not_warmed")
+
+    cache = upstream_cache.stats()
+    predictions = get_prediction_cache()
+
+    log = prediction_logger.stats()
+    if log.get("queue_max") and log.get("queue_depth", 0) >= log["queue_max"]:
+        reasons.append("prediction_log_queue_full")
+
+    upstream = upstream_stats()
+    circuits = {name: s.get("state") for name, s in upstream.items()}
+    if REQUIRE_UPSTREAM and circuits and all(state == "open" for state in circuits.values()):
+        reasons.append("upstreams_unavailable")
+
+    report = {
+        "ready": not reasons,
+        "reasons": reasons,
+        "pid": os.getpid(),
+        "warmup": warm,
+        "model": dict(wrapper.metadata(), loaded=True) if wrapper is not None else {"loaded": False},
+        "models": models,
+        "caches": {
+            "upstream": {
+                "entries": cache["entries"],
+                "max_entries": cache["max_entries"],
+                "fill": round(cache["entries"] / cache["max_entries"], 4) if cache["max_entries"] else None,
+                "bytes_fill": round(cache["bytes"] / cache["max_bytes"], 4) if cache["max_bytes"] else None,
+                "hit_ratio": cache["hit_ratio"],
+            },
+            "predictions": predictions.stats() if predictions is not None else None,
+        },
+        "upstream": {name: {"state": s.get("state"), "consecutive_failures": s.get("consecutive_failures")}
+                     for name, s in upstream.items()},
+        "writers": {
+            "prediction_log": {k: log.get(k) for k in ("queue_depth", "queue_max", "enabled") if k in log},
+            "observation_store": {k: v for k, v in observation_store.stats().items() if k in ("enabled", "buffered")},
+        },
+    }
+    return not reasons, report
@@ -0,0 +1,175 @@
+"""
+Bulk scoring of weatherAUS.csv-shaped files.
+
+Reads CSV or Parquet in fixed-size chunks, applies the training
+preprocessing (preprocessing.py), scores each chunk with one multi-threaded
+CatBoost call and streams the results to the output as it goes, so memory
+stays flat however large the input is. Progress and rows/sec go to stderr.
+
+    python -m score data/weatherAUS.csv -o predictions.csv
+    python -m score big.parquet -o out.parquet --chunk-size 200000 --threads 8
+    python -m score data/weatherAUS.csv -o - --keep Date,Location > out.csv
+
+Output format follows the extension: .csv, .parquet or .jsonl/.ndjson ("-" is
+CSV on stdout). Numeric fill values come from --fill-values (a JSON file of
+column -> value), else the `fill_values` of the metadata.json sidecar next to
+a versioned models/<name>/<version>/model.cbm; with neither, scoring refuses
+to run (the model was trained on filled columns) unless --leave-missing is
+passed to hand the NaNs to CatBoost as-is.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import TARGET, add_date_parts, fill_missing, model_blocks
+
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def read_chunks(path, chunk_size):
+    """Yield DataFrames of at most `chunk_size` rows from a CSV or Parquet file."""
+    if path.endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, low_memory=False)
+
+
+class ChunkWriter:
+    """Appends scored chunks to a CSV / Parquet / NDJSON output."""
+
+    def __init__(self, path):
+        self.path = path
+        self._parquet = None
+        self._first = True
+        if path == "-":
+            self._fh = sys.stdout
+        elif path.endswith((".parquet", ".pq")):
+            self._fh = None
+        else:
+            self._fh = open(path, "w", encoding="utf-8", newline="")
+
+    def write(self, df):
+        if self.path.endswith((".parquet", ".pq")):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+            self._parquet.write_table(table)
+        elif self.path.endswith((".jsonl", ".ndjson")):
+            df.to_json(self._fh, orient="records", lines=True)
+        else:
+            df.to_csv(self._fh, header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._fh is not None and self._fh is not sys.stdout:
+            self._fh.close()
+
+
+def load_fill_values(model_path, explicit=None):
+    """--fill-values file, else `fill_values` from the metadata.json next to a versioned model.cbm."""
+    if explicit:
+        with open(explicit, encoding="utf-8") as fh:
+            return json.load(fh)
+    sidecar = os.path.join(os.path.dirname(model_path or ""), "metadata.json")
+    if model_path and os.path.basename(model_path) == "model.cbm" and os.path.exists(sidecar):
+        with open(sidecar, encoding="utf-8") as fh:
+            return json.load(fh).get("fill_values")
+    return None
+
+
+def score_file(model, src, dst, chunk_size=DEFAULT_CHUNK_SIZE, threads=-1, keep=None,
+               fill_values=None, log=sys.stderr):
+    """Score `src` into `dst` chunk by chunk; returns a summary dict."""
+    from catboost import Pool, FeaturesData
+    from models.feature_schema import FeatureSchema
+
+    schema = FeatureSchema.from_model(model)
+    classes = getattr(model, "classes_", None)
+    classes = list(classes) if classes is not None else []
+    writer = ChunkWriter(dst)
+    rows = 0
+    started = time.perf_counter()
+    try:
+        for chunk in read_chunks(src, chunk_size):
+            t0 = time.perf_counter()
+            kept = chunk[[c for c in (keep or []) if c in chunk.columns]].reset_index(drop=True)
+            frame = add_date_parts(chunk.drop(columns=[TARGET], errors="ignore"))
+            if fill_values is not None:
+                frame = fill_missing(frame, fill_values)
+            num, cat = model_blocks(frame, schema.num_names, schema.cat_names)
+            pool = Pool(FeaturesData(num_feature_data=num, cat_feature_data=cat,
+                                     num_feature_names=schema.num_names, cat_feature_names=schema.cat_names))
+            probs = np.asarray(model.predict_proba(pool, thread_count=threads))
+
+            out = kept
+            labels = probs.argmax(axis=1)
+            out["prediction"] = np.asarray(classes)[labels] if classes else labels
+            out["probability"] = probs[:, -1]
+            writer.write(out)
+
+            rows += len(chunk)
+            elapsed = time.perf_counter() - started
+            if log is not None:
+                print(f"scored {rows} rows ({len(chunk) / max(time.perf_counter() - t0, 1e-9):,.0f} rows/s chunk, "
+                      f"{rows / max(elapsed, 1e-9):,.0f} rows/s overall)", file=log, flush=True)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    return {"rows": rows, "seconds": round(elapsed, 3), "rows_per_second": round(rows / max(elapsed, 1e-9), 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a weatherAUS.csv-shaped CSV/Parquet file in chunks.")
+    parser.add_argument("input")
+    parser.add_argument("-o", "--output", required=True, help=".csv, .parquet, .jsonl or - for stdout")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--threads", type=int, default=-1, help="CatBoost thread_count (-1 = all cores)")
+    parser.add_argument("--keep", default="Date,Location", help="input columns copied to the output")
+    parser.add_argument("--model", help="registered model name (default: the default model)")
+    parser.add_argument("--version", help="registered model version")
+    parser.add_argument("--model-path", help="score with this .cbm/.pkl instead of the registry")
+    parser.add_argument("--fill-values", help="JSON file of numeric column -> fill value")
+    parser.add_argument("--leave-missing", action="store_true",
+                        help="score without fill values when the model has no metadata.json sidecar")
+    args = parser.parse_args(argv)
+
+    if args.model_path:
+        from models.registry import load_model_file
+        model, model_path = load_model_file(args.model_path), args.model_path
+    else:
+        from models.registry import ModelRegistry
+        registry = ModelRegistry()
+        registry.discover()
+        entry = registry.get(args.model, args.version)
+        model, model_path = entry.model, entry.path
+
+    fill_values = load_fill_values(model_path, args.fill_values)
+    if fill_values is None and not args.leave_missing:
+        parser.error(f"no fill values for {model_path}: pass --fill-values (or --leave-missing to score NaNs as-is)")
+
+    summary = score_file(
+        model, args.input, args.output,
+        chunk_size=args.chunk_size, threads=args.threads,
+        keep=[c.strip() for c in args.keep.split(",") if c.strip()],
+        fill_values=fill_values,
+    )
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the app's modules import each other from backend/ (e.g. `from models.registry import ...`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
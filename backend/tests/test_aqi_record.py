@@ -0,0 +1,53 @@
+import pytest
+
+from api.utils.aqi_record import Measurement, category, sub_index, us_aqi
+
+
+def test_pm25_breakpoints():
+    assert sub_index("pm25", 35.4, "µg/m³") == 100
+    assert sub_index("pm25", 12.0, "µg/m³") == 56
+    assert sub_index("pm25", 0.0, "µg/m³") == 0
+    assert sub_index("pm25", 1000, "µg/m³") == 500
+
+
+def test_gases_are_converted_to_reporting_units():
+    # 100 µg/m³ of O3 is ~0.051 ppm, truncated to 0.050
+    assert sub_index("o3", 100, "µg/m³") == 46
+    assert sub_index("o3", 0.050, "ppm") == 46
+    assert sub_index("no2", 53, "ppb") == 50
+
+
+def test_unknown_pollutants_and_units_have_no_index():
+    assert sub_index("bc", 3.0, "µg/m³") is None
+    assert sub_index("o3", 10, "furlongs") is None
+    assert sub_index("pm25", None, "µg/m³") is None
+    assert sub_index("pm25", -1, "µg/m³") is None
+
+
+def test_us_aqi_takes_the_highest_sub_index():
+    aqi, cat, dominant = us_aqi([
+        Measurement("pm10", 40, "µg/m³"),
+        Measurement("pm2_5", 40.0, "µg/m³"),
+        Measurement("o3", 0.02, "ppm"),
+    ])
+    assert (aqi, cat, dominant) == (112, "Unhealthy for Sensitive Groups", "pm25")
+
+
+def test_us_aqi_reads_measurement_dicts_too():
+    assert us_aqi([{"parameter": "PM25", "value": 9.0, "unit": "µg/m³"}]) == (50, "Good", "pm25")
+
+
+def test_us_aqi_without_rated_pollutants():
+    assert us_aqi([]) == (None, None, None)
+    assert us_aqi([Measurement("bc", 1.0, "µg/m³")]) == (None, None, None)
+    assert category(None) is None
+
+
+@pytest.mark.parametrize("ppm, aqi", [
+    (0.000, 0), (0.054, 50), (0.055, 51), (0.070, 100), (0.071, 101), (0.085, 150),
+    (0.086, 151), (0.105, 200), (0.106, 201), (0.200, 300),
+    # above the 8-hour table: EPA 1-hour rows
+    (0.201, 196), (0.204, 200), (0.205, 201), (0.404, 300), (0.405, 301), (0.604, 500), (0.9, 500),
+])
+def test_o3_breakpoint_edges(ppm, aqi):
+    assert sub_index("o3", ppm, "ppm") == aqi
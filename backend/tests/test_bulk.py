@@ -0,0 +1,194 @@
+import json
+import threading
+import time
+
+import pytest
+
+from api.utils import bulk
+from api.utils.aqi_record import Measurement
+from api.utils.cache import upstream_cache
+from api.utils.geocode_index import GeocodeIndex, normalize_city
+from api.utils.observation_store import ObservationStore
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    index = GeocodeIndex(path=str(tmp_path / "geocode.db"), seed_csv=None)
+    index.put("Delhi", 28.61, 77.21)
+    index.put("New Delhi", 28.61, 77.21)
+    index.put("Mumbai", 19.08, 72.88)
+    monkeypatch.setattr(bulk, "geocode_index", index)
+    monkeypatch.setattr(bulk, "observation_store", ObservationStore(root=str(tmp_path / "obs")))
+    upstream_cache.clear()
+    yield index
+    upstream_cache.clear()
+
+
+# ----------------------------------------------------------------------
+# _drain: concurrency cap, deadline, errors
+# ----------------------------------------------------------------------
+def test_drain_caps_tasks_in_flight_per_request(monkeypatch):
+    monkeypatch.setattr(bulk, "REQUEST_CONCURRENCY", 2)
+    lock, running, peak = threading.Lock(), [0], [0]
+
+    def task_for(city):
+        def task():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return [(city, {"city": city, "ok": True})], []
+        return task, [city]
+
+    cities = [f"c{i}" for i in range(8)]
+    out = list(bulk._drain(bulk._get_executor(), [task_for(c) for c in cities], deadline=5))
+    assert sorted(c for c, _ in out) == cities
+    assert peak[0] == 2
+
+
+def test_drain_reports_errors_and_timeouts(monkeypatch):
+    monkeypatch.setattr(bulk, "REQUEST_CONCURRENCY", 1)
+    release = threading.Event()
+
+    def fast():
+        return [("a", {"city": "a", "ok": True})], []
+
+    def broken():
+        raise RuntimeError("upstream exploded")
+
+    def slow():
+        release.wait(5)
+        return [("c", {"city": "c", "ok": True})], []
+
+    tasks = [(fast, ["a"]), (broken, ["b"]), (slow, ["c"]), (fast, ["d"])]
+    out = dict(bulk._drain(bulk._get_executor(), tasks, deadline=0.3))
+    release.set()
+    assert out["a"]["ok"] is True
+    assert out["b"] == {"city": "b", "ok": False, "error": "upstream exploded"}
+    assert out["c"]["error"] == "timeout"  # still running at the deadline
+    assert out["d"]["error"] == "timeout"  # never started
+
+
+def test_drain_runs_follow_ups():
+    def follow_up():
+        return [("late", {"city": "late", "ok": True})], []
+
+    def first():
+        return [("early", {"city": "early", "ok": True})], [(follow_up, ["late"])]
+
+    assert [c for c, _ in bulk._drain(bulk._get_executor(), [(first, ["early"])], deadline=5)] == ["early", "late"]
+
+
+def test_ndjson_lines_summary():
+    lines = list(bulk.ndjson_lines(iter([
+        ("a", {"city": "a", "ok": True}),
+        ("b", {"city": "b", "ok": False, "error": "timeout"}),
+        ("c", {"city": "c", "ok": False, "error": "boom"}),
+    ])))
+    assert [json.loads(line)["city"] for line in lines[:3]] == ["a", "b", "c"]
+    summary = json.loads(lines[-1])
+    assert (summary["succeeded"], summary["timed_out"], summary["failed"], summary["done"]) == (1, 1, 1, True)
+
+
+# ----------------------------------------------------------------------
+# bulk_aqi: dedupe, cached hits first, one batch query
+# ----------------------------------------------------------------------
+def test_bulk_aqi_dedupes_and_yields_cached_cities_first(monkeypatch):
+    import api.utils.fetch_aqi as fetch_aqi
+
+    cached = {"city": "Mumbai", "ok": True, "aqi": 42, "measurements": []}
+    upstream_cache.put("aqi", {"city": "Mumbai", "limit": 1}, cached)
+    queries = []
+
+    def latest_many(cities, timeout=8):
+        queries.append(list(cities))
+        loc = {"city": "Delhi", "measurements": [
+            {"parameter": "pm25", "value": 40.0, "unit": "µg/m³", "lastUpdated": "2024-05-03T06:00:00Z"}]}
+        return {"ok": True, "error": None, "by_city": {normalize_city("Delhi"): [loc]}}
+
+    monkeypatch.setattr(fetch_aqi, "fetch_openaq_latest_many", latest_many)
+    out = list(bulk.bulk_aqi(["Delhi", "mumbai", " DELHI ", "Mumbai"]))
+
+    assert [c for c, _ in out] == ["mumbai", "Delhi"]
+    assert out[0][1]["aqi"] == 42
+    assert out[1][1]["aqi"] == 112 and out[1][1]["ok"] is True
+    assert queries == [["Delhi"]]
+    # the fresh result is now a cache hit for single-city requests
+    assert upstream_cache.get("aqi", {"city": "Delhi", "limit": 1})["aqi"] == 112
+
+
+def test_bulk_aqi_falls_back_per_coordinate(monkeypatch):
+    import api.utils.fetch_aqi as fetch_aqi
+
+    calls = []
+
+    def openweather(city, timeout=8, coords=None, include_raw=False):
+        calls.append(city)
+        return {"ok": True, "fetched_at": "2024-05-03T06:00:00Z", "openweather_index": 2,
+                "measurements": [Measurement("pm2_5", 12.0, "µg/m³")]}
+
+    monkeypatch.setattr(fetch_aqi, "fetch_openaq_latest_many",
+                        lambda cities, timeout=8: {"ok": True, "error": None, "by_city": {}})
+    monkeypatch.setattr(fetch_aqi, "fetch_openweather_aqi_by_city", openweather)
+    out = dict(bulk.bulk_aqi(["Delhi", "New Delhi"]))
+    assert calls == ["Delhi"]  # same coordinates: one call
+    assert out["New Delhi"]["aqi"] == out["Delhi"]["aqi"] == 56
+
+
+# ----------------------------------------------------------------------
+# /api/weather/bulk matches /api/weather
+# ----------------------------------------------------------------------
+ONECALL = {
+    "current": {"dt": 1714716000, "temp": 31.0, "humidity": 40, "pressure": 1004, "wind_speed": 3.5, "wind_deg": 280},
+    "daily": [{"temp": {"min": 26.0, "max": 38.0}, "humidity": 35, "rain": 1.2}],
+    "hourly": [{"dt": 1714716000, "temp": 30.0, "humidity": 45, "pressure": 1005}],
+}
+
+
+class _Response:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+def test_weather_bulk_lines_equal_the_single_city_endpoint(isolated, monkeypatch):
+    flask = pytest.importorskip("flask")
+    import api.weather as weather
+
+    calls = []
+
+    def upstream_get(url, params=None, timeout=None):
+        calls.append(url)
+        if url == weather.OPENWEATHER_GEOCODE:
+            return _Response([{"lat": 28.61, "lon": 77.21}])
+        assert url == weather.OPENWEATHER_ONECALL
+        return _Response(ONECALL)
+
+    monkeypatch.setenv("OPENWEATHER_API_KEY", "test-key")
+    monkeypatch.setattr(weather, "upstream_get", upstream_get)
+    monkeypatch.setattr(weather, "geocode_index", isolated)
+    app = flask.Flask(__name__)
+    app.register_blueprint(weather.bp)
+    client = app.test_client()
+
+    single = client.get("/api/weather?city=Delhi").get_json()
+    lines = [json.loads(line) for line in client.get("/api/weather/bulk?cities=Delhi,Mumbai").data.splitlines()]
+    by_city = {line["city"]: line for line in lines if "city" in line}
+
+    assert single["ok"] is True
+    assert by_city["Delhi"] == single
+    assert single["features"]["MinTemp"] == 26.0 and single["features"]["MaxTemp"] == 38.0
+    # Delhi came from the per-coordinate entry /api/weather filled; only Mumbai was fetched
+    assert calls.count(weather.OPENWEATHER_ONECALL) == 2
+    assert by_city["Mumbai"]["features"]["Location"] == "Mumbai"
+
+    dated = [json.loads(line) for line in client.get("/api/weather/bulk?cities=Delhi&date=2024-12-25").data.splitlines()]
+    assert (dated[0]["features"]["Date_month"], dated[0]["features"]["Date_day"]) == (12, 25)
+    assert client.get("/api/weather/bulk?cities=Delhi&date=tomorrow").status_code == 400
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+from api.utils.cache import UpstreamCache, normalize_params
+
+
+def test_params_are_normalized():
+    assert normalize_params({"city": "  New   Delhi ", "lat": 28.613912}) == \
+        normalize_params({"lat": 28.61391, "city": "new delhi"})
+
+
+def test_hit_after_miss_and_callers_get_copies():
+    cache = UpstreamCache()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return {"temp": 30}
+
+    first = cache.get_or_fetch("weather", {"city": "Delhi"}, fetch)
+    first["Location"] = "mutated"
+    second = cache.get_or_fetch("weather", {"city": "delhi "}, fetch)
+    assert calls == [1]
+    assert second == {"temp": 30}
+    assert cache.get("weather", {"city": "DELHI"}) == {"temp": 30}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+
+def test_uncacheable_values_are_returned_but_not_stored():
+    cache = UpstreamCache()
+    out = cache.get_or_fetch("aqi", {"city": "x"}, lambda: {"ok": False}, cacheable=lambda v: v.get("ok"))
+    assert out == {"ok": False}
+    assert cache.get("aqi", {"city": "x"}) is None
+    assert cache.stats()["uncacheable"] == 1
+
+
+def test_fetch_errors_propagate_on_a_miss():
+    cache = UpstreamCache()
+
+    def fetch():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_fetch("weather", {"city": "x"}, fetch)
+    assert cache.get("weather", {"city": "x"}) is None
+
+
+def test_stale_entries_are_served_while_one_refresh_runs():
+    cache = UpstreamCache(ttls={"test": 0}, stale_seconds=60)
+    cache.put("test", {"k": 1}, {"v": "old"})
+    refreshed = threading.Event()
+
+    def fetch():
+        refreshed.set()
+        return {"v": "new"}
+
+    assert cache.get_or_fetch("test", {"k": 1}, fetch) == {"v": "old"}
+    assert refreshed.wait(5)
+    deadline = time.monotonic() + 5
+    while cache.stats()["refreshes"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.get("test", {"k": 1}) == {"v": "new"}
+    assert cache.stats()["stale_hits"] >= 1
+
+
+def test_lru_eviction_by_entry_count():
+    cache = UpstreamCache(max_entries=2)
+    cache.put("weather", {"city": "a"}, 1)
+    cache.put("weather", {"city": "b"}, 2)
+    assert cache.get("weather", {"city": "a"}) == 1  # a is now most recently used
+    cache.put("weather", {"city": "c"}, 3)
+    assert cache.get("weather", {"city": "b"}) is None
+    assert cache.get("weather", {"city": "a"}) == 1
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+catboost = pytest.importorskip("catboost")
+np = pytest.importorskip("numpy")
+
+from models import compiled
+from models.compiled import CompiledPredictor, KNOWN_CATEGORIES, WIND_DIRECTIONS
+from models.feature_schema import FeatureSchema
+
+LOCATIONS = ["Albury", "Sydney", "Melbourne", "Brisbane", "Perth", "Darwin", "Hobart"]
+NUMERIC = ["MinTemp", "MaxTemp", "Rainfall", "Humidity3pm", "Pressure3pm", "Date_month"]
+CATEGORICAL = ["Location", "WindGustDir", "WindDir3pm", "RainToday"]
+
+
+def _row(rng):
+    row = {
+        "MinTemp": rng.uniform(-5, 25),
+        "MaxTemp": rng.uniform(5, 45),
+        "Rainfall": rng.choice([0.0, 0.0, rng.uniform(0, 80)]),
+        "Humidity3pm": rng.uniform(5, 100),
+        "Pressure3pm": rng.uniform(980, 1040),
+        "Date_month": float(rng.randint(1, 12)),
+        "Location": rng.choice(LOCATIONS),
+        "WindGustDir": rng.choice(WIND_DIRECTIONS),
+        "WindDir3pm": rng.choice(WIND_DIRECTIONS),
+        "RainToday": rng.choice(KNOWN_CATEGORIES["RainToday"]),
+    }
+    # some missing values, as in weatherAUS.csv
+    for name in rng.sample(NUMERIC + CATEGORICAL, rng.randint(0, 2)):
+        row.pop(name)
+    return row
+
+
+def _label(row, rng):
+    wet = (row.get("Humidity3pm", 50) > 70) + (row.get("RainToday") == "Yes") + \
+          (row.get("Location") in ("Darwin", "Hobart")) + (row.get("WindGustDir", "").startswith("W"))
+    return int(wet + rng.random() > 2)
+
+
+@pytest.fixture(scope="module")
+def exported(tmp_path_factory):
+    rng = random.Random(7)
+    rows = [_row(rng) for _ in range(600)]
+    labels = [_label(r, rng) for r in rows]
+    names = NUMERIC + CATEGORICAL
+    data = [[r.get(n, "Unknown" if n in CATEGORICAL else np.nan) for n in names] for r in rows]
+    pool = catboost.Pool(data, labels, cat_features=list(range(len(NUMERIC), len(names))), feature_names=names)
+    model = catboost.CatBoostClassifier(iterations=60, depth=4, loss_function="Logloss",
+                                        random_seed=0, verbose=False, allow_writing_files=False)
+    model.fit(pool)
+    path = str(tmp_path_factory.mktemp("model") / "model.cbm")
+    model.save_model(path)
+    compiled.export(model, path, pool=pool)
+    return model, path
+
+
+def test_compiled_matches_predict_proba_on_realistic_rows(exported):
+    model, path = exported
+    schema = FeatureSchema.from_model(model)
+    predictor = CompiledPredictor.load(compiled.applier_path(path), schema)
+    rng = random.Random(11)
+    rows = [_row(rng) for _ in range(300)]
+    # unseen category values take the same path in both
+    rows += [dict(r, Location="Atlantis", WindGustDir="Unknown") for r in rows[:20]]
+
+    for data in rows:
+        row = schema.encode_row(data)[0].copy()
+        expected = np.asarray(model.predict_proba(schema.row_pool(row[None, :]), thread_count=1))
+        np.testing.assert_allclose(predictor.predict_proba_row(row), expected, rtol=0, atol=compiled.PARITY_TOLERANCE)
+
+
+def test_probe_rows_cover_known_categories(exported):
+    model, path = exported
+    rows = compiled.probe_rows(model, path)
+    seen = {r.get("WindGustDir") for r in rows}
+    assert set(WIND_DIRECTIONS) <= seen
+    assert {"Yes", "No"} <= {r.get("RainToday") for r in rows}
+    assert compiled.parity(model, CompiledPredictor.load(compiled.applier_path(path), FeatureSchema.from_model(model)),
+                           rows) <= compiled.PARITY_TOLERANCE
+
+
+def test_load_for_accepts_a_matching_applier(exported, monkeypatch):
+    model, path = exported
+    monkeypatch.setattr(compiled, "MODE", "on")
+    assert compiled.load_for(model, path) is not None
+
+
+def test_loaded_predictors_are_dropped_with_their_model(exported, monkeypatch):
+    model, path = exported
+    monkeypatch.setattr(compiled, "MODE", "on")
+    first = compiled.load_for(model, path)
+    assert compiled.load_for(model, path) is first
+    compiled.forget(model)
+    assert id(model) not in compiled._loaded
+    assert compiled.load_for(model, path) is not first
@@ -0,0 +1,59 @@
+import gzip
+
+import pytest
+
+import compression
+from compression import accepted_encodings, negotiate
+
+
+@pytest.fixture
+def no_zstd(monkeypatch):
+    monkeypatch.setattr(compression, "zstandard", None)
+
+
+def test_accepted_encodings_parses_q_values():
+    assert accepted_encodings("gzip, zstd;q=0.5, br;q=0") == {"gzip": 1.0, "zstd": 0.5, "br": 0.0}
+    assert accepted_encodings("gzip;q=oops") == {"gzip": 0.0}
+    assert accepted_encodings(None) == {}
+
+
+def test_negotiate_gzip(no_zstd):
+    name, fn = negotiate("gzip, deflate")
+    assert name == "gzip"
+    assert gzip.decompress(fn(b"x" * 100)) == b"x" * 100
+
+
+def test_negotiate_nothing_acceptable(no_zstd):
+    assert negotiate("") is None
+    assert negotiate("br, deflate") is None
+    assert negotiate("gzip;q=0") is None
+    # an explicit refusal wins over the wildcard
+    assert negotiate("gzip;q=0, *") is None
+
+
+def test_negotiate_wildcard(no_zstd):
+    assert negotiate("*")[0] == "gzip"
+
+
+def test_negotiate_prefers_zstd_when_available(monkeypatch):
+    monkeypatch.setattr(compression, "zstandard", object())
+    assert negotiate("gzip, zstd")[0] == "zstd"
+    assert negotiate("gzip, zstd;q=0.5")[0] == "gzip"
+    assert negotiate("gzip")[0] == "gzip"
+
+
+def test_compressed_response_gets_its_own_etag(no_zstd):
+    wrappers = pytest.importorskip("werkzeug.wrappers")
+    resp = wrappers.Response(b"{}" + b" " * 4096, mimetype="application/json")
+    resp.set_etag("abc")
+    compression.compress_response(resp, "gzip")
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert resp.get_etag() == ("abc-gzip", False)
+    assert "Accept-Encoding" in resp.vary
+
+
+def test_etag_match_accepts_encoded_variants(no_zstd):
+    datastructures = pytest.importorskip("werkzeug.datastructures")
+    assert compression.etag_match(datastructures.ETags(["abc-gzip"]), "abc") == "abc-gzip"
+    assert compression.etag_match(datastructures.ETags(["abc"]), "abc") == "abc"
+    assert compression.etag_match(datastructures.ETags(["other"]), "abc") is None
@@ -0,0 +1,80 @@
+import math
+import threading
+
+import numpy as np
+import pytest
+
+from models.feature_schema import FeatureError, FeatureSchema
+
+NAMES = ["MinTemp", "MaxTemp", "Location", "Date_month", "Date_day", "RainToday"]
+CAT = [2, 5]
+
+
+@pytest.fixture
+def schema():
+    return FeatureSchema(NAMES, CAT)
+
+
+def test_missing_values_become_nan_and_unknown(schema):
+    row = schema.encode_row({"MinTemp": 10})[0]
+    assert row[0] == 10.0
+    assert math.isnan(row[1]) and math.isnan(row[3]) and math.isnan(row[4])
+    assert row[2] == row[5] == "Unknown"
+
+    num, cat = schema.encode_blocks([{}, {"MaxTemp": None, "RainToday": ""}])
+    assert num.dtype == np.float32 and np.isnan(num).all()
+    assert cat.tolist() == [["Unknown", "Unknown"], ["Unknown", "Unknown"]]
+
+
+def test_keys_and_aliases_resolve_to_model_columns(schema):
+    row = schema.encode_row({"min temp": 1, "MAX_TEMP": 2, "city": "Sydney", "month": 5, "Day": 3})[0]
+    assert row.tolist() == [1.0, 2.0, "Sydney", 5.0, 3.0, "Unknown"]
+    # a date fills month/day only where they weren't given
+    row = schema.encode_row({"date": "2024-07-19", "month": 1})[0]
+    assert (row[3], row[4]) == (1.0, 19.0)
+    assert schema.encode_row({"unknown_field": 1})[0][2] == "Unknown"
+
+
+def test_string_numbers_are_coerced_and_bad_values_rejected(schema):
+    num, cat = schema.encode_blocks([{"MinTemp": "10.5", "MaxTemp": " 20 ", "RainToday": 1.0, "Location": 7}])
+    assert num[0, :2].tolist() == [10.5, 20.0]
+    assert cat[0].tolist() == ["7", "1"]
+    with pytest.raises(FeatureError) as err:
+        schema.encode_row({"MaxTemp": "warm"})
+    assert err.value.field == "MaxTemp"
+    with pytest.raises(FeatureError):
+        schema.encode_row({"date": "19/07/2024"})
+    with pytest.raises(FeatureError):
+        schema.encode_blocks([["not", "a", "dict"]])
+
+
+def test_encode_row_reuses_one_buffer_per_thread(schema):
+    first = schema.encode_row({"MinTemp": 1})
+    second = schema.encode_row({"MaxTemp": 2})
+    assert first is second
+    # the previous row's values don't leak into the next one
+    assert math.isnan(second[0, 0]) and second[0, 1] == 2.0
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(schema.encode_row({"MinTemp": 3})))
+    t.start()
+    t.join()
+    assert other[0] is not first
+    assert other[0][0, 0] == 3.0 and math.isnan(first[0, 0])
+
+
+def test_encode_blocks_match_encode_row(schema):
+    rows = [{"MinTemp": i, "Location": f"L{i}", "date": "2024-01-02"} for i in range(3)]
+    num, cat = schema.encode_blocks(rows)
+    for i, data in enumerate(rows):
+        row = schema.encode_row(data)[0]
+        np.testing.assert_array_equal(num[i], np.array([row[j] for j in schema.num_indices], dtype=np.float32))
+        assert cat[i].tolist() == [row[j] for j in schema.cat_indices]
+
+
+def test_defaults_fill_the_template():
+    schema = FeatureSchema(NAMES, CAT, defaults={"MinTemp": 12.5, "Location": "Albury"})
+    assert schema.to_dict({}) == {"MinTemp": 12.5, "MaxTemp": None, "Location": "Albury",
+                                  "Date_month": None, "Date_day": None, "RainToday": "Unknown"}
+    num, cat = schema.encode_blocks([{}])
+    assert num[0, 0] == 12.5 and cat[0, 0] == "Albury"
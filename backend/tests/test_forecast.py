@@ -0,0 +1,61 @@
+import datetime
+
+import pytest
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+
+import db
+import forecast
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+
+class StubWrapper:
+    def metadata(self):
+        return {"model_name": "rain", "model_version": "v2"}
+
+    def predict_batch(self, rows):
+        return [{"ok": True, "prediction": 1, "probabilities": [0.3, 0.7]} for _ in rows]
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'forecast.db'}")
+    session = scoped_session(sessionmaker(bind=engine))
+    monkeypatch.setattr(db, "ENGINE", engine)
+    monkeypatch.setattr(db, "db_session", session)
+    monkeypatch.setattr(db, "_initialized", False)
+    monkeypatch.setattr(forecast, "_db_ready", False)
+    import api.predict_auto
+    monkeypatch.setattr(api.predict_auto, "build_features_from_external",
+                        lambda city, date, time: {"Location": city, "date": date})
+    yield engine
+    session.remove()
+
+
+def test_generate_starts_on_the_utc_date(temp_db):
+    summary = forecast.generate(wrapper=StubWrapper(), cities=["Delhi"], days=2)
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    assert summary["rows"] == 2 and summary["generated_at"].endswith("Z")
+    with temp_db.connect() as conn:
+        stored = conn.execute(sqlalchemy.text("SELECT target_date, generated_at FROM forecasts ORDER BY target_date")).all()
+    assert [r[0] for r in stored] == [today.isoformat(), (today + datetime.timedelta(days=1)).isoformat()]
+    # stored naive, in UTC
+    assert "+" not in stored[0][1]
+
+
+def test_lookup_measures_staleness_in_utc(temp_db):
+    forecast.generate(wrapper=StubWrapper(), cities=["Delhi"], days=1)
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+
+    hit = forecast.lookup("delhi", today, model_name="rain", model_version="v2")
+    assert hit["probabilities"] == [[0.3, 0.7]]
+    assert 0 <= hit["staleness_seconds"] < 60
+    assert hit["generated_at"].endswith("Z") and "+00:00" not in hit["generated_at"]
+    assert forecast.lookup("delhi", today, model_version="v1") is None
+
+    old = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(hours=30)
+    with temp_db.begin() as conn:
+        conn.execute(sqlalchemy.text("UPDATE forecasts SET generated_at = :t"), {"t": old})
+    db.db_session.remove()
+    assert forecast.lookup("Delhi", today.isoformat(), max_age_hours=26) is None
+    assert forecast.lookup("Delhi", today.isoformat(), max_age_hours=31)["staleness_seconds"] == pytest.approx(30 * 3600, abs=60)
@@ -0,0 +1,187 @@
+import os
+
+import pytest
+import requests
+
+from api.utils import http_client
+from api.utils.http_client import CircuitBreaker, CircuitOpenError, RetryBudget, UpstreamClient
+
+
+class FakeClock:
+    """Stands in for the `time` module: monotonic time only moves on sleep() or advance()."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+
+class FakeSession:
+    """Replays `outcomes` (a status code, or an exception to raise); each call costs `cost` seconds."""
+
+    def __init__(self, clock, outcomes, cost=0.0):
+        self.clock = clock
+        self.outcomes = list(outcomes)
+        self.cost = cost
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append(timeout)
+        self.clock.advance(self.cost)
+        outcome = self.outcomes.pop(0) if self.outcomes else 200
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(http_client, "time", fake)
+    monkeypatch.setattr(http_client.random, "uniform", lambda lo, hi: hi)
+    return fake
+
+
+def make_client(clock, outcomes, cost=0.0):
+    client = UpstreamClient("test")
+    client._session, client._pid = FakeSession(clock, outcomes, cost), os.getpid()
+    return client
+
+
+def test_breaker_opens_after_threshold_and_recovers_through_one_probe(clock):
+    breaker = CircuitBreaker(threshold=3, reset_seconds=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.advance(29.9)
+    assert not breaker.allow()
+    clock.advance(0.1)
+    assert breaker.state == "half_open"
+    assert breaker.allow()  # the probe
+    assert not breaker.allow()  # nobody else while it is in flight
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+    assert breaker.snapshot() == {"state": "closed", "consecutive_failures": 0}
+
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(threshold=1, reset_seconds=10)
+    breaker.record_failure()
+    clock.advance(10)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    clock.advance(10)
+    assert breaker.allow()
+
+
+def test_retry_budget_runs_out_and_refills_per_request():
+    budget = RetryBudget(ratio=0.5, cap=2)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()  # 0.5 tokens
+    budget.deposit()
+    assert budget.withdraw()
+    for _ in range(10):
+        budget.deposit()
+    assert budget.tokens == 2
+
+
+def test_retries_retriable_statuses_until_success(clock, monkeypatch):
+    monkeypatch.setattr(http_client, "MAX_RETRIES", 2)
+    client = make_client(clock, [503, 502, 200])
+    assert client.get("https://example.test/x").status_code == 200
+    assert len(client._session.calls) == 3
+    assert client.stats()["retries"] == 2 and client.stats()["failures"] == 0
+    assert client.breaker.state == "closed"
+
+
+def test_exhausted_retry_budget_returns_the_failed_response(clock, monkeypatch):
+    monkeypatch.setattr(http_client, "MAX_RETRIES", 5)
+    client = make_client(clock, [503] * 10)
+    client.budget = RetryBudget(ratio=0.0, cap=1)
+    assert client.get("https://example.test/x").status_code == 503
+    assert len(client._session.calls) == 2  # one retry, then the budget is empty
+    assert client.get("https://example.test/x").status_code == 503
+    assert len(client._session.calls) == 3  # no retry at all
+    assert client.stats()["failures"] == 2
+
+
+def test_read_timeouts_are_not_retried(clock, monkeypatch):
+    monkeypatch.setattr(http_client, "RETRY_READ_TIMEOUTS", False)
+    client = make_client(clock, [requests.exceptions.ReadTimeout("slow")])
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.get("https://example.test/x")
+    assert len(client._session.calls) == 1
+    assert clock.sleeps == []
+
+
+def test_connect_errors_are_retried(clock, monkeypatch):
+    monkeypatch.setattr(http_client, "MAX_RETRIES", 2)
+    client = make_client(clock, [requests.exceptions.ConnectionError("refused"), 200])
+    assert client.get("https://example.test/x").status_code == 200
+    assert len(client._session.calls) == 2
+
+
+def test_retries_stop_at_the_deadline(clock, monkeypatch):
+    monkeypatch.setattr(http_client, "MAX_RETRIES", 10)
+    monkeypatch.setattr(http_client, "CONNECT_TIMEOUT", 1.0)
+    monkeypatch.setattr(http_client, "DEADLINE_SLACK", 2.0)
+    monkeypatch.setattr(http_client, "BACKOFF_BASE", 0.5)
+    monkeypatch.setattr(http_client, "BACKOFF_CAP", 0.5)
+    started = clock.now
+    # each attempt takes 1.5s; deadline is 4 + 2 = 6s after the start
+    client = make_client(clock, [503] * 10, cost=1.5)
+    assert client.get("https://example.test/x", timeout=4).status_code == 503
+    assert clock.now - started <= 4 + 2
+    assert len(client._session.calls) == 3
+    # later attempts get a read timeout shortened to what is left of the deadline
+    assert client._session.calls[0] == (1.0, 4)
+    assert client._session.calls[-1][1] < 4
+
+
+def test_open_circuit_short_circuits_without_calling(clock, monkeypatch):
+    monkeypatch.setattr(http_client, "MAX_RETRIES", 0)
+    client = make_client(clock, [500] * 10)
+    client.breaker = CircuitBreaker(threshold=2, reset_seconds=30)
+    client.get("https://example.test/x")
+    client.get("https://example.test/x")
+    with pytest.raises(CircuitOpenError):
+        client.get("https://example.test/x")
+    assert len(client._session.calls) == 2
+    assert client.stats()["short_circuited"] == 1 and client.stats()["state"] == "open"
+
+    clock.advance(30)
+    client._session.outcomes = [200]
+    assert client.get("https://example.test/x").status_code == 200
+    assert client.breaker.state == "closed"
+
+
+def test_upstream_get_routes_by_provider_host(clock, monkeypatch):
+    monkeypatch.setattr(http_client, "_clients", {})
+    client = make_client(clock, [200])
+    monkeypatch.setitem(http_client._clients, "openaq", client)
+    assert http_client.upstream_get(http_client.OPENAQ_BASE_URL + "/v2/latest", params={"city": "Delhi"}).status_code == 200
+    assert len(client._session.calls) == 1
+    assert http_client.provider_for("https://elsewhere.test/") == "default"
+    assert http_client.upstream_stats()["test"]["requests"] == 1
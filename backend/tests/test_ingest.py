@@ -0,0 +1,76 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import api.utils.ingest as ingest
+from api.utils.ingest import TokenBucket
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 500.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(ingest, "time", fake)
+    return fake
+
+
+def test_bucket_bursts_one_minute_then_refills_at_the_rate(clock):
+    bucket = TokenBucket(rate_per_minute=6)  # one token every 10 s
+    assert [bucket.take() for _ in range(6)] == [0.0] * 6
+    assert bucket.take() == pytest.approx(10.0)
+
+    clock.now += 4
+    assert bucket.take() == pytest.approx(6.0)  # 0.4 of a token so far
+    clock.now += 6
+    assert bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(10.0)
+
+    # an idle minute and more refills the burst, never beyond it
+    clock.now += 600
+    assert [bucket.take() for _ in range(7)][-2:] == [0.0, pytest.approx(10.0)]
+
+
+def test_bucket_below_one_per_minute_still_holds_one_token(clock):
+    bucket = TokenBucket(rate_per_minute=0.5)
+    assert bucket.capacity == 1.0
+    assert bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(120.0)
+    stopped = TokenBucket(rate_per_minute=0)
+    assert stopped.take() == 0.0 and stopped.take() == 60.0
+
+
+def _import_rates(**env):
+    """PROCESSES and RATES_PER_MINUTE as a fresh interpreter computes them at import under `env`."""
+    clean = {k: v for k, v in os.environ.items() if not k.startswith(("INGEST_", "GUNICORN_"))}
+    code = "import json, api.utils.ingest as i; print(json.dumps([i.PROCESSES, i.RATES_PER_MINUTE]))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, env=dict(clean, **env),
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_rate_budget_is_split_over_processes():
+    assert _import_rates() == [1, {"openweather": 50.0, "openaq": 30.0}]
+    assert _import_rates(GUNICORN_WORKERS="4") == [4, {"openweather": 12.5, "openaq": 7.5}]
+    # INGEST_PROCESSES wins over the worker count (e.g. a single ingesting process)
+    assert _import_rates(GUNICORN_WORKERS="4", INGEST_PROCESSES="1",
+                         INGEST_RATE_OPENAQ="60") == [1, {"openweather": 50.0, "openaq": 60.0}]
+    assert _import_rates(INGEST_PROCESSES="0")[0] == 1
+    assert _import_rates(INGEST_PROCESSES="bogus")[0] == 1
+
+
+def test_scheduler_buckets_use_the_divided_rates(monkeypatch):
+    monkeypatch.setattr(ingest, "RATES_PER_MINUTE", {"openweather": 12.5, "openaq": 7.5})
+    scheduler = ingest.IngestScheduler(cities=["Delhi"])
+    assert {p: b.rate * 60 for p, b in scheduler.buckets.items()} == {"openweather": 12.5, "openaq": 7.5}
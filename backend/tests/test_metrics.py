@@ -0,0 +1,87 @@
+import threading
+
+from metrics import Metrics
+
+
+def test_exited_thread_shards_are_folded_into_the_total():
+    m = Metrics()
+
+    def work():
+        m.inc("envirowatch_requests_total", route="/x")
+        m.observe("envirowatch_request_seconds", 0.003, route="/x")
+
+    threads = [threading.Thread(target=work) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    work()
+
+    hists, counters = m.collect()
+    assert counters[("envirowatch_requests_total", (("route", "/x"),))] == 21
+    assert sum(hists[("envirowatch_request_seconds", (("route", "/x"),))][:-1]) == 21
+    # only the calling thread's shard is still live
+    assert len(m._shards) == 1
+
+
+def _count(m):
+    return m.collect()[1].get(("envirowatch_requests_total", (("route", "/x"),)), 0)
+
+
+def test_threads_exiting_mid_scrape_are_counted_once():
+    m = Metrics()
+    release = threading.Event()
+    written = threading.Barrier(41)
+
+    def work():
+        m.inc("envirowatch_requests_total", route="/x")
+        written.wait()
+        release.wait()
+
+    threads = [threading.Thread(target=work) for _ in range(40)]
+    for t in threads:
+        t.start()
+    written.wait()
+
+    seen = []
+    release.set()  # threads exit while we keep scraping
+    while any(t.is_alive() for t in threads):
+        seen.append(_count(m))
+    for t in threads:
+        t.join()
+    seen.append(_count(m))
+    assert set(seen) == {40}
+    assert m._shards == [] and _count(m) == 40
+
+
+def test_shard_retired_between_snapshot_and_merge_is_not_double_counted(monkeypatch):
+    import metrics
+
+    m = Metrics()
+    release = threading.Event()
+
+    def work():
+        m.inc("envirowatch_requests_total", route="/x")
+        release.wait()
+
+    t = threading.Thread(target=work)
+    t.start()
+    while not m._shards:
+        pass
+
+    # collect() has taken its snapshot (the thread was alive); now the thread
+    # exits and a concurrent writer folds its shard into the retired total
+    real_merge = metrics._merge
+
+    def merge(into, shard):
+        if t.is_alive():
+            release.set()
+            t.join()
+            with m._lock:
+                m._fold_dead()
+        real_merge(into, shard)
+
+    monkeypatch.setattr(metrics, "_merge", merge)
+    assert _count(m) == 1
+    monkeypatch.setattr(metrics, "_merge", real_merge)
+    assert m._shards == [] and _count(m) == 1
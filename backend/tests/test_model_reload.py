@@ -0,0 +1,143 @@
+import threading
+
+import numpy as np
+import pytest
+
+import models.registry as registry_module
+from models.model_wrapper import ModelWrapper
+from models.registry import ModelRegistry, file_version
+
+
+class FakeModel:
+    """predict_proba-only model that gives every row probability `p` of rain."""
+    classes_ = np.array([0, 1])
+
+    def __init__(self, p=0.8, broken=False):
+        self.p = p
+        self.broken = broken
+
+    def predict_proba(self, data, thread_count=None):
+        probs = np.tile([1.0 - self.p, self.p], (len(data), 1))
+        if self.broken:
+            probs[:] = np.nan
+        return probs
+
+
+@pytest.fixture
+def models_on_disk(tmp_path, monkeypatch):
+    """path -> FakeModel; load_model_file returns the model registered for a path."""
+    by_path = {}
+    # unlabelled validation sample (FakeModel has no feature names, so no dummy row)
+    (tmp_path / "holdout.csv").write_text("MinTemp,MaxTemp\n10,20\n12,25\n")
+
+    def add(name, model, gate=None):
+        path = tmp_path / name
+        path.write_bytes(name.encode())
+        by_path[str(path)] = (model, gate)
+        return str(path)
+
+    def load(path):
+        model, gate = by_path[path]
+        if gate is not None:
+            gate.wait(5)
+        return model
+
+    monkeypatch.setattr(registry_module, "load_model_file", load)
+    return add
+
+
+def test_reload_swaps_atomically(models_on_disk, tmp_path):
+    old, new = FakeModel(0.2), FakeModel(0.9)
+    gate = threading.Event()
+    path = models_on_disk("next.pkl", new, gate)
+    wrapper = ModelWrapper(model_dir=str(tmp_path), model=old, name="rain", version="v1")
+    snapshot = wrapper._current()
+
+    assert wrapper.reload(path=path, wait=False) == {"ok": True, "status": "started"}
+    # while the candidate loads, requests keep being served by the old model
+    assert wrapper.predict_from_dict({"MinTemp": 10})["probabilities"] == [[0.8, 0.2]]
+    assert wrapper.reload(path=path) == {"ok": False, "error": "reload_in_progress"}
+    gate.set()
+    for _ in range(500):
+        if wrapper.last_reload is not None:
+            break
+        threading.Event().wait(0.01)
+
+    assert wrapper.last_reload["ok"] is True
+    assert wrapper.model is new and wrapper.version == file_version(path)
+    assert snapshot.model is old and snapshot.version == "v1"  # in-flight snapshot untouched
+    out = wrapper.predict_from_dict({"MinTemp": 10})
+    assert out["probabilities"] == [[pytest.approx(0.1), 0.9]]
+    assert out["model_version"] == file_version(path) and out["model_swap_ms"] is not None
+
+
+def test_reload_rejects_a_model_that_fails_validation(models_on_disk, tmp_path):
+    current = FakeModel(0.2)
+    registry = ModelRegistry(root=str(tmp_path))
+    registry.add("rain", "v1", "v1.pkl", current, pinned=True)
+    wrapper = ModelWrapper(model_dir=str(tmp_path), model=current, name="rain", version="v1", registry=registry)
+
+    status = wrapper.reload(path=models_on_disk("broken.pkl", FakeModel(broken=True)))
+    assert status["ok"] is False and "malformed probabilities" in status["error"]
+    assert wrapper.model is current and wrapper.version == "v1"
+    assert [e["version"] for e in registry.list()] == ["v1"]
+
+
+def test_reload_rejects_a_less_accurate_model(models_on_disk, tmp_path):
+    holdout = tmp_path / "holdout.csv"
+    holdout.write_text("MinTemp,RainTomorrow\n10,Yes\n12,Yes\n14,No\n")
+    current = FakeModel(0.9)  # predicts rain: 2/3 correct
+    wrapper = ModelWrapper(model_dir=str(tmp_path), model=current, name="rain", version="v1")
+    wrapper.holdout_path = str(holdout)
+
+    status = wrapper.reload(path=models_on_disk("dry.pkl", FakeModel(0.1)))  # 1/3 correct
+    assert status["ok"] is False and "below current" in status["error"]
+    assert wrapper.model is current
+
+    status = wrapper.reload(path=models_on_disk("wet.pkl", FakeModel(0.7)))
+    assert status["ok"] is True
+    assert status["holdout_accuracy"] == status["current_accuracy"] == pytest.approx(2 / 3)
+
+
+def test_registry_add_evicts_the_superseded_unpinned_default(tmp_path):
+    registry = ModelRegistry(root=str(tmp_path))
+    registry.add("rain", "v1", "v1.pkl", FakeModel(), pinned=True)
+    registry.add("rain", "sha-a", "a.pkl", FakeModel())
+    registry.add("rain", "sha-b", "b.pkl", FakeModel())
+    registry.add("other", "v1", "o.pkl", FakeModel())
+
+    listed = {(e["name"], e["version"]): e["default"] for e in registry.list()}
+    # the pinned v1 survives, sha-a was dropped when sha-b replaced it
+    assert listed == {("rain", "v1"): False, ("rain", "sha-b"): True, ("other", "v1"): True}
+    assert registry.get("rain").version == "sha-b"
+    with pytest.raises(KeyError):
+        registry.get("rain", "sha-a")
+
+    # an entry that doesn't become the default never evicts anything
+    registry.add("rain", "sha-c", "c.pkl", FakeModel(), make_default=False)
+    assert registry.get("rain").version == "sha-b" and registry.get("rain", "sha-c")
+
+
+def test_reload_registers_the_new_model(models_on_disk, tmp_path):
+    registry = ModelRegistry(root=str(tmp_path))
+    registry.add("rain", "v1", "v1.pkl", FakeModel(0.3), pinned=True)
+    wrapper = registry.wrapper("rain")
+    wrapper.model_dir, wrapper.holdout_path = str(tmp_path), str(tmp_path / "holdout.csv")
+    path_a = models_on_disk("a.pkl", FakeModel(0.4))
+    path_b = models_on_disk("b.pkl", FakeModel(0.5))
+
+    assert wrapper.reload(path=path_a)["ok"] and wrapper.reload(path=path_b)["ok"]
+    assert sorted(e["version"] for e in registry.list()) == sorted(["v1", file_version(path_b)])
+    assert registry.get("rain").model is wrapper.model
+
+
+def test_failures_are_logged(models_on_disk, tmp_path, caplog):
+    wrapper = ModelWrapper(model_dir=str(tmp_path), model=FakeModel(broken=True), name="rain", version="v1")
+    with caplog.at_level("DEBUG", logger="models.model_wrapper"):
+        wrapper.reload(path=models_on_disk("bad.pkl", FakeModel(broken=True)))
+        wrapper._active.model.predict_proba = lambda data, thread_count=None: 1 / 0
+        assert wrapper.predict_from_dict({"MinTemp": 1})["ok"] is False
+    failures = [r for r in caplog.records if r.levelname == "ERROR"]
+    assert [r.getMessage() for r in failures] == ["model reload from %s failed" % (tmp_path / "bad.pkl"),
+                                                  "prediction failed for model rain@v1"]
+    assert all(r.exc_info for r in failures)
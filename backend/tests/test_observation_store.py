@@ -0,0 +1,128 @@
+import datetime
+import os
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from api.utils.aqi_record import Measurement
+from api.utils.observation_store import ObservationStore
+
+UTC = datetime.timezone.utc
+DAY1 = datetime.datetime(2024, 5, 3, 6, 0, tzinfo=UTC)
+DAY2 = datetime.datetime(2024, 5, 4, 6, 0, tzinfo=UTC)
+
+
+@pytest.fixture
+def store(tmp_path):
+    # thresholds high enough that only explicit flush() calls write
+    return ObservationStore(root=str(tmp_path), flush_rows=10_000, flush_seconds=3600)
+
+
+def _weather(ts, temp):
+    return {"dt": int(ts.timestamp()), "temp": temp, "humidity": 60, "rain": {"1h": 0.4}}
+
+
+def _aqi(ts, value, parameter="pm25"):
+    return {"ok": True, "measurements": [Measurement(parameter, value, "µg/m³", ts.isoformat(), "Delhi", "openaq")]}
+
+
+def _parts(root):
+    return sorted(os.path.relpath(os.path.join(d, f), root)
+                  for d, _, files in os.walk(root) for f in files if f.endswith(".parquet"))
+
+
+def test_record_flush_and_scan(store):
+    assert store.record_weather("Delhi", _weather(DAY1, 31.5)) == 3  # temp, humidity, rain_1h
+    assert store.record_aqi("Delhi", _aqi(DAY1, 80.0)) == 1
+    assert store.flush() == 4
+    assert _parts(store.root)[0].startswith(os.path.join("kind=aqi", "city=delhi", "date=2024-05-03"))
+
+    table = store.scan(kind="weather", cities=["delhi"], metrics=["temp", "rain_1h"])
+    assert sorted(zip(table["metric"].cast("string").to_pylist(), table["value"].to_pylist())) == \
+        [("rain_1h", 0.4), ("temp", 31.5)]
+    aqi = store.scan(kind="aqi", cities=["Delhi"]).to_pylist()
+    assert [(r["metric"], r["value"], r["source"]) for r in aqi] == [("pm25", 80.0, "openaq")]
+
+
+def test_pollutant_aliases_are_stored_under_one_name(store):
+    store.record_aqi("Delhi", _aqi(DAY1, 12.0, parameter="pm2_5"))
+    store.record_aqi("Delhi", _aqi(DAY2, 14.0, parameter="PM2.5"))
+    assert set(store.scan(kind="aqi")["metric"].cast("string").to_pylist()) == {"pm25"}
+
+
+def test_scan_date_filters(store):
+    store.record_weather("Delhi", _weather(DAY1, 30.0))
+    store.record_weather("Delhi", _weather(DAY2, 32.0))
+    store.flush()
+    store.record_weather("Delhi", _weather(DAY2 + datetime.timedelta(hours=1), 33.0))  # still buffered
+
+    def temps(**kw):
+        return store.scan(kind="weather", metrics=["temp"], **kw)["value"].to_pylist()
+
+    assert temps() == [30.0, 32.0, 33.0]
+    assert temps(start=DAY2) == [32.0, 33.0]
+    assert temps(end=DAY2) == [30.0]  # end is exclusive
+    assert temps(start="2024-05-03", end="2024-05-04") == [30.0]
+    assert temps(start=DAY2, include_buffered=False) == [32.0]
+
+
+def test_repeated_readings_are_skipped(store):
+    assert store.record_aqi("Delhi", _aqi(DAY1, 80.0)) == 1
+    assert store.record_aqi("delhi ", _aqi(DAY1, 80.0)) == 0
+    assert store.record_aqi("Delhi", _aqi(DAY2, 85.0)) == 1
+    assert store.stats()["duplicates"] == 1
+    store.flush()
+    assert store.record_aqi("Delhi", _aqi(DAY2, 85.0)) == 0
+    assert store.scan(kind="aqi")["value"].to_pylist() == [80.0, 85.0]
+
+
+def test_compact_merges_past_days_only(store):
+    for hour in range(3):
+        store.record_weather("Delhi", _weather(DAY1 + datetime.timedelta(hours=hour), 30.0 + hour))
+        store.record_weather("Delhi", _weather(DAY2 + datetime.timedelta(hours=hour), 40.0 + hour))
+        store.flush()
+    assert len(_parts(store.root)) == 6
+
+    assert store.compact(before=DAY2.date()) == 1
+    parts = _parts(store.root)
+    assert len([p for p in parts if "date=2024-05-03" in p]) == 1
+    assert len([p for p in parts if "date=2024-05-04" in p]) == 3
+    assert store.scan(kind="weather", metrics=["temp"])["value"].to_pylist() == \
+        [30.0, 31.0, 32.0, 40.0, 41.0, 42.0]
+
+
+def test_fingerprint_changes_with_new_data(store):
+    empty = store.fingerprint("weather", ["Delhi"])
+    store.record_weather("Delhi", _weather(DAY1, 30.0))
+    buffered = store.fingerprint("weather", ["Delhi"])
+    assert buffered != empty
+    store.flush()
+    flushed = store.fingerprint("weather", ["Delhi"])
+    assert flushed != buffered
+    assert store.fingerprint("weather", ["Delhi"]) == flushed
+
+    # other cities and kinds don't invalidate it
+    store.record_weather("Mumbai", _weather(DAY1, 29.0))
+    store.record_aqi("Delhi", _aqi(DAY1, 80.0))
+    assert store.fingerprint("weather", ["Delhi"]) == flushed
+
+    # nor does a partition outside the requested days, once flushed
+    day1 = store.fingerprint("weather", ["Delhi"], start=DAY1, end=DAY1.replace(hour=23))
+    store.record_weather("Delhi", _weather(DAY2, 31.0))
+    store.flush()
+    assert store.fingerprint("weather", ["Delhi"], start=DAY1, end=DAY1.replace(hour=23)) == day1
+    assert store.fingerprint("weather", ["Delhi"]) != flushed
+
+
+def test_write_failures_are_counted(store, monkeypatch):
+    store.record_weather("Delhi", _weather(DAY1, 30.0))
+
+    def fail(directory, table):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store, "_write", fail)
+    assert store.flush() == 0
+    stats = store.stats()
+    assert stats["errors"] == 1
+    assert "disk full" in stats["last_error"]
@@ -0,0 +1,115 @@
+import pytest
+
+flask = pytest.importorskip("flask")
+
+import api.predict as predict
+from models.feature_schema import FeatureError
+from models.model_wrapper import _error_type
+
+
+class StubWrapper:
+    """Scores {"MinTemp": <number>} rows; "boom" rows fail inside the model."""
+
+    def metadata(self):
+        return {"model_name": "rain", "model_version": "v1"}
+
+    def _one(self, i, row):
+        if not isinstance(row, dict):
+            return {"index": i, "ok": False, "error": "row must be a JSON object", "error_type": "invalid_input"}
+        try:
+            if row.get("boom"):
+                raise RuntimeError("tree evaluation failed")
+            value = float(row.get("MinTemp", 0))
+        except (TypeError, ValueError):
+            e = FeatureError("MinTemp", f"expected a number, got {row['MinTemp']!r}")
+            return {"index": i, "ok": False, "error": str(e), "error_type": _error_type(e)}
+        except Exception as e:
+            return {"index": i, "ok": False, "error": str(e), "error_type": _error_type(e)}
+        p = 0.9 if value > 20 else 0.1
+        return {"index": i, "ok": True, "prediction": int(p > 0.5), "probabilities": [1 - p, p]}
+
+    def predict_batch(self, rows):
+        return [self._one(i, row) for i, row in enumerate(rows)]
+
+    def predict_from_dict(self, row):
+        out = self._one(0, row)
+        out.pop("index")
+        out.setdefault("prediction", None)
+        return dict(out, **self.metadata())
+
+
+@pytest.fixture
+def client(monkeypatch):
+    logged = []
+
+    class Recorder:
+        def log(self, features, result, date=None):
+            logged.append(features)
+
+    monkeypatch.setattr(predict, "prediction_logger", Recorder())
+    app = flask.Flask(__name__)
+    app.register_blueprint(predict.predict_bp, url_prefix="/api")
+    app.model_wrapper = StubWrapper()
+    return app.test_client(), logged
+
+
+def test_batch_all_valid_is_200(client):
+    http, logged = client
+    resp = http.post("/api/predict/batch", json=[{"MinTemp": 25}, {"MinTemp": "10"}])
+    body = resp.get_json()
+    assert resp.status_code == 200
+    assert body["ok"] is True and (body["count"], body["failed"], body["invalid"]) == (2, 0, 0)
+    assert [r["prediction"] for r in body["results"]] == [1, 0]
+    assert len(logged) == 2
+
+
+def test_batch_with_invalid_rows_is_400_but_scores_the_rest(client):
+    http, logged = client
+    resp = http.post("/api/predict/batch", json=[{"MinTemp": 25}, {"MinTemp": "warm"}, "not a row"])
+    body = resp.get_json()
+    assert resp.status_code == 400
+    assert body["ok"] is False and body["error"] == "invalid_rows"
+    assert (body["failed"], body["invalid"]) == (2, 2)
+    assert body["results"][0]["ok"] is True
+    assert [r.get("error_type") for r in body["results"][1:]] == ["invalid_input", "invalid_input"]
+    assert logged == [{"MinTemp": 25}]
+
+
+def test_batch_ndjson_parse_errors_are_invalid_input(client):
+    http, _ = client
+    resp = http.post("/api/predict/batch", data='{"MinTemp": 25}\n{not json\n', content_type="application/x-ndjson")
+    body = resp.get_json()
+    assert resp.status_code == 400
+    assert body["results"][1]["error"].startswith("invalid JSON") and body["results"][1]["error_type"] == "invalid_input"
+
+
+def test_batch_with_a_scoring_failure_is_500(client):
+    http, _ = client
+    resp = http.post("/api/predict/batch", json=[{"MinTemp": 25}, {"MinTemp": "warm"}, {"boom": True}])
+    body = resp.get_json()
+    assert resp.status_code == 500
+    assert body["error"] == "model_predict_failed" and (body["failed"], body["invalid"]) == (2, 1)
+    assert body["results"][2] == {"index": 2, "ok": False, "error": "tree evaluation failed",
+                                  "error_type": "model_error"}
+
+
+def test_batch_rejects_empty_and_oversized_bodies(client, monkeypatch):
+    http, _ = client
+    assert http.post("/api/predict/batch", json=[]).status_code == 400
+    monkeypatch.setattr(predict, "BATCH_MAX_ROWS", 2)
+    assert http.post("/api/predict/batch", json=[{}, {}, {}]).status_code == 413
+
+
+def test_single_prediction_status_codes(client):
+    http, _ = client
+    assert http.post("/api/predict", json={"MinTemp": 25}).status_code == 200
+    bad = http.post("/api/predict", json={"MinTemp": "warm"})
+    assert bad.status_code == 400 and bad.get_json()["error_type"] == "invalid_input"
+    assert http.post("/api/predict", json={"boom": True}).status_code == 500
+
+
+def test_wrapper_marks_non_dict_rows_as_invalid_input():
+    from models.model_wrapper import ModelWrapper
+
+    results = ModelWrapper(model=object()).predict_batch(["a", 3])
+    assert [r["error_type"] for r in results] == ["invalid_input", "invalid_input"]
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from models.prediction_cache import PredictionCache, prediction_key
+
+
+def test_same_inputs_same_key():
+    assert prediction_key("rain", "v1", [1.0, "N"]) == prediction_key("rain", "v1", (1.0, "N"))
+
+
+def test_key_depends_on_model_name_version_and_row():
+    base = prediction_key("rain", "v1", [1.0, "N"])
+    assert prediction_key("other", "v1", [1.0, "N"]) != base
+    assert prediction_key("rain", "v2", [1.0, "N"]) != base
+    assert prediction_key("rain", "v1", [1.0, "S"]) != base
+
+
+def test_name_and_version_are_separated():
+    assert prediction_key("ab", "c", [1.0]) != prediction_key("a", "bc", [1.0])
+
+
+def test_lru_eviction():
+    cache = PredictionCache(max_entries=2)
+    cache.put("a", {"p": 1})
+    cache.put("b", {"p": 2})
+    assert cache.get("a") == ({"p": 1}, "hit")
+    cache.put("c", {"p": 3})
+    assert cache.get("b") == (None, "miss")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_shared_file_serves_other_instances(tmp_path):
+    path = str(tmp_path / "predictions.sqlite")
+    PredictionCache(path=path).put("k", {"prediction": [1]})
+    other = PredictionCache(path=path)
+    assert other.get("k") == ({"prediction": [1]}, "shared_hit")
+    assert other.get("k") == ({"prediction": [1]}, "hit")
+
+
+def test_lookups_do_not_wait_for_a_shared_write(tmp_path):
+    cache = PredictionCache(path=str(tmp_path / "predictions.sqlite"))
+    cache.put("hot", {"p": 1})
+    writing, release = threading.Event(), threading.Event()
+    connection = cache._connection
+
+    def slow_connection():
+        if threading.current_thread().name == "writer":
+            writing.set()
+            release.wait(5)
+        return connection()
+
+    cache._connection = slow_connection
+    writer = threading.Thread(target=cache.put, args=("cold", {"p": 2}), name="writer")
+    writer.start()
+    assert writing.wait(5)
+    started = time.monotonic()
+    assert cache.get("hot") == ({"p": 1}, "hit")
+    assert cache.get("cold") == ({"p": 2}, "hit")  # the LRU was updated before the write
+    assert time.monotonic() - started < 1
+    release.set()
+    writer.join()
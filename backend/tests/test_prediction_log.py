@@ -0,0 +1,85 @@
+import os
+import threading
+
+import pytest
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+
+from db import BASE, Prediction
+from prediction_log import PredictionLogger
+
+RESULT = {"prediction": [1], "probabilities": [[0.25, 0.75]], "model_version": "v3"}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'predictions.db'}")
+    BASE.metadata.create_all(bind=engine)
+    return engine
+
+
+def _rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(sqlalchemy.select(Prediction.__table__).order_by(Prediction.id)).mappings().all()
+
+
+class _Parked(PredictionLogger):
+    """Writer thread that never drains, so the queue fills up; flush() writes on the caller's thread."""
+
+    def _ensure_writer(self):
+        self._pid, self._thread = os.getpid(), threading.current_thread()
+
+
+def test_flush_writes_in_batches(engine):
+    log = _Parked(engine=engine, batch_size=2)
+    for i in range(5):
+        log.log({"Location": "Sydney", "MinTemp": i, "date": "2024-05-0%d" % (i + 1)}, RESULT)
+    log.log({"Location": "Sydney"}, {"error": "bad row", "prediction": None})
+    log.flush()
+
+    rows = _rows(engine)
+    assert len(rows) == 5
+    assert rows[0]["city"] == "Sydney" and str(rows[0]["date"]) == "2024-05-01"
+    assert rows[0]["predicted_value"] == 1.0 and rows[0]["probability"] == 0.75 and rows[0]["model_version"] == "v3"
+    stats = log.stats()
+    assert (stats["written"], stats["batches"], stats["skipped_failed"], stats["queue_depth"]) == (5, 3, 1, 0)
+
+
+def test_explicit_date_wins_over_the_features(engine):
+    log = _Parked(engine=engine)
+    log.log({"Location": "Perth", "date": "2024-01-01"}, RESULT, date="2024-02-02")
+    log.flush()
+    assert str(_rows(engine)[0]["date"]) == "2024-02-02"
+
+
+def test_drop_policy_drops_when_full(engine):
+    log = _Parked(engine=engine, max_queue=2, policy="drop")
+    for _ in range(5):
+        log.log({"Location": "Sydney"}, RESULT)
+    stats = log.stats()
+    assert (stats["queued"], stats["dropped"], stats["queue_depth"]) == (2, 3, 2)
+
+
+def test_block_policy_waits_then_drops(engine):
+    log = _Parked(engine=engine, max_queue=1, policy="block", block_seconds=0.05)
+    log.log({"Location": "Sydney"}, RESULT)
+    freed = threading.Timer(0.01, log._queue.get_nowait)
+    freed.start()
+    log.log({"Location": "Sydney"}, RESULT)  # waits for the slot freed above
+    freed.join()
+    log.log({"Location": "Sydney"}, RESULT)  # nobody frees one: dropped after block_seconds
+    stats = log.stats()
+    assert (stats["queued"], stats["dropped"]) == (2, 1)
+
+
+def test_write_failures_are_counted_and_logged(tmp_path, caplog):
+    missing_table = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'empty.db'}")
+    log = _Parked(engine=missing_table, batch_size=10)
+    for _ in range(3):
+        log.log({"Location": "Sydney"}, RESULT)
+    with caplog.at_level("ERROR", logger="prediction_log"):
+        log.flush()
+    stats = log.stats()
+    assert (stats["written"], stats["failed_batches"], stats["failed_rows"], stats["errors"]) == (0, 1, 3, 1)
+    assert "predictions" in stats["last_error"]
+    assert caplog.records[0].getMessage() == "prediction log: failed to write 3 rows"
@@ -0,0 +1,37 @@
+import pytest
+
+import api.utils.ingest as ingest
+from api.utils.http_client import get_client
+from readiness import warm_caches
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    calls = []
+    publishers = {"weather": lambda city: calls.append(("weather", city)) or {"ok": True},
+                  "aqi": lambda city: calls.append(("aqi", city)) or {"ok": True}}
+    monkeypatch.setattr(ingest, "PUBLISHERS", publishers)
+    monkeypatch.setattr(ingest, "tracked_cities", lambda: ["Delhi", "Mumbai", "Pune"])
+    return calls
+
+
+def test_warm_caches_spends_the_ingest_token_buckets(fetched, monkeypatch):
+    monkeypatch.setattr(ingest, "RATES_PER_MINUTE", {"openweather": 2, "openaq": 60})
+    scheduler = ingest.IngestScheduler(cities=["unused"])
+
+    out = warm_caches(deadline=5, scheduler=scheduler)
+    assert out == {"fetched": 5, "failed": 0, "timed_out": 0, "postponed": 1, "jobs": 6}
+    assert sorted(k for k, _ in fetched) == ["aqi", "aqi", "aqi", "weather", "weather"]
+    # the buckets are the scheduler's own: the next warm-up finds weather exhausted
+    assert scheduler.blocked_for("weather") > 0
+
+
+def test_warm_caches_skips_providers_with_open_circuits(fetched, monkeypatch):
+    breaker = get_client("openweather").breaker
+    monkeypatch.setattr(breaker, "_state", breaker.OPEN)
+    monkeypatch.setattr(breaker, "_opened_at", float("inf"))
+
+    out = warm_caches(deadline=5, scheduler=ingest.IngestScheduler(cities=["unused"]))
+    # AQI falls back from OpenAQ to OpenWeather, so only weather is held back
+    assert out["postponed"] == 3 and out["fetched"] == 3
+    assert {k for k, _ in fetched} == {"aqi"}
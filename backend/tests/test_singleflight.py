@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from api.utils.cache import UpstreamCache
+from api.utils.singleflight import SingleFlight, SingleFlightTimeout
+
+
+def _run_concurrently(n, target):
+    results, threads = [None] * n, []
+    for i in range(n):
+        def run(i=i):
+            try:
+                results[i] = target()
+            except Exception as e:
+                results[i] = e
+        threads.append(threading.Thread(target=run))
+    for t in threads:
+        t.start()
+    return threads, results
+
+
+def test_concurrent_callers_share_one_call():
+    sf = SingleFlight()
+    release, calls = threading.Event(), []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return {"value": 42}
+
+    threads, results = _run_concurrently(8, lambda: sf.do("k", fetch))
+    while sf.stats()["waiting"] < 7:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+    assert calls == [1]
+    assert results == [{"value": 42}] * 8
+    assert sf.stats()["shared"] == 7
+    assert sf.stats()["in_flight"] == 0
+
+
+def test_errors_reach_every_waiter():
+    sf = SingleFlight()
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    threads, results = _run_concurrently(4, lambda: sf.do("k", fetch))
+    while sf.stats()["waiting"] < 3:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+    assert all(isinstance(r, ValueError) and str(r) == "upstream down" for r in results)
+    assert sf.stats()["errors"] == 1
+
+
+def test_waiter_timeout_leaves_the_leader_running():
+    sf = SingleFlight()
+    release = threading.Event()
+    leader_result = []
+    leader = threading.Thread(target=lambda: leader_result.append(sf.do("k", lambda: release.wait(5) and "done")))
+    leader.start()
+    while sf.stats()["in_flight"] < 1:
+        time.sleep(0.01)
+    with pytest.raises(SingleFlightTimeout):
+        sf.do("k", lambda: "never called", timeout=0.05)
+    release.set()
+    leader.join()
+    assert leader_result == ["done"]
+    assert sf.stats()["timeouts"] == 1
+
+
+def test_finished_calls_are_not_reused():
+    sf = SingleFlight()
+    assert sf.do("k", lambda: 1) == 1
+    assert sf.do("k", lambda: 2) == 2
+
+
+def test_concurrent_cache_misses_share_one_fetch():
+    cache = UpstreamCache()
+    release, calls = threading.Event(), []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return {"v": 1}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch("weather", {"city": "x"}, fetch)))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    while cache.stats()["singleflight"]["waiting"] < 4:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+    assert calls == [1]
+    assert results == [{"v": 1}] * 5
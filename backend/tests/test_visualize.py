@@ -0,0 +1,129 @@
+import datetime
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyarrow")
+flask = pytest.importorskip("flask")
+
+import api.visualize as visualize
+from api.utils.aqi_record import Measurement
+from api.utils.observation_store import ObservationStore
+from api.visualize import _parse_range, downsample
+
+UTC = datetime.timezone.utc
+NOW = datetime.datetime(2024, 5, 10, 12, 30, tzinfo=UTC)
+
+
+# ----------------------------------------------------------------------
+# _parse_range
+# ----------------------------------------------------------------------
+@pytest.mark.parametrize("value, delta", [
+    (None, datetime.timedelta(days=7)),
+    ("24h", datetime.timedelta(hours=24)),
+    (" 3D ", datetime.timedelta(days=3)),
+    ("2w", datetime.timedelta(days=14)),
+])
+def test_parse_range_relative(value, delta):
+    args = {"range": value} if value is not None else {}
+    assert _parse_range(args, NOW) == (NOW - delta, NOW)
+
+
+def test_parse_range_explicit_bounds():
+    start, end = _parse_range({"from": "2024-05-01", "to": "2024-05-03T06:00:00Z"}, NOW)
+    assert start == datetime.datetime(2024, 5, 1, tzinfo=UTC)
+    assert end == datetime.datetime(2024, 5, 3, 6, tzinfo=UTC)
+    # `to` defaults to now
+    assert _parse_range({"from": "2024-05-01"}, NOW)[1] == NOW
+
+
+@pytest.mark.parametrize("args, message", [
+    ({"range": "7 days"}, "range must look like"),
+    ({"range": "0h"}, "empty range"),
+    ({"from": "2024-05-03", "to": "2024-05-01"}, "empty range"),
+    ({"from": "yesterday"}, "from/to must be"),
+    ({"range": "400w"}, "range too large"),
+])
+def test_parse_range_rejects(args, message):
+    with pytest.raises(ValueError, match=message):
+        _parse_range(args, NOW)
+
+
+# ----------------------------------------------------------------------
+# downsample
+# ----------------------------------------------------------------------
+def test_downsample_bucket_boundaries_and_partial_last_bucket():
+    # 0 and 3599 share the first hour; 3600 opens the second; 7300 is alone in a partial third
+    ts = np.array([0, 1800, 3599, 3600, 5400, 7300], dtype=np.int64)
+    values = np.array([1.0, 3.0, 5.0, 10.0, 20.0, 7.0])
+    start, lo, hi, mean, count = downsample(ts, values, 3600)
+    assert start.tolist() == [0, 3600, 7200]
+    assert lo.tolist() == [1.0, 10.0, 7.0]
+    assert hi.tolist() == [5.0, 20.0, 7.0]
+    assert mean.tolist() == [3.0, 15.0, 7.0]
+    assert count.tolist() == [3, 2, 1]
+
+
+def test_downsample_skips_empty_buckets_and_handles_no_data():
+    start, _, _, mean, count = downsample(np.array([100, 86400 * 3 + 5]), np.array([2.0, 4.0]), 86400)
+    assert start.tolist() == [0, 86400 * 3] and mean.tolist() == [2.0, 4.0] and count.tolist() == [1, 1]
+    empty = downsample(np.array([], dtype=np.int64), np.array([]), 3600)
+    assert [len(a) for a in empty] == [0] * 5
+
+
+# ----------------------------------------------------------------------
+# endpoint
+# ----------------------------------------------------------------------
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    store = ObservationStore(root=str(tmp_path), flush_rows=10_000, flush_seconds=3600)
+    for day, temp, pm25 in ((1, 20.0, 40.0), (1, 30.0, 60.0), (2, 25.0, 50.0)):
+        ts = datetime.datetime(2024, 5, day, 6 + int(temp) % 7, tzinfo=UTC)
+        store.record_weather("Delhi", {"dt": int(ts.timestamp()), "temp": temp})
+        store.record_aqi("Delhi", {"ok": True, "measurements": [
+            Measurement("pm2_5", pm25, "µg/m³", ts.isoformat(), "Delhi", "openaq")]})
+    store.flush()
+    monkeypatch.setattr(visualize, "observation_store", store)
+    app = flask.Flask(__name__)
+    app.register_blueprint(visualize.bp)
+    return app.test_client(), store
+
+
+URL = "/api/visualize?city=Delhi&from=2024-05-01&to=2024-05-03&resolution=daily&metrics=temp,pm25"
+
+
+def test_visualize_daily_series(client):
+    http, _ = client
+    body = http.get(URL).get_json()
+    assert body["resolution"] == "daily"
+    assert body["series"]["temp"] == [
+        {"t": "2024-05-01T00:00:00Z", "min": 20.0, "max": 30.0, "mean": 25.0, "count": 2},
+        {"t": "2024-05-02T00:00:00Z", "min": 25.0, "max": 25.0, "mean": 25.0, "count": 1},
+    ]
+    # pm2_5 readings are served as pm25
+    assert [p["mean"] for p in body["series"]["pm25"]] == [50.0, 50.0]
+    assert body["temps"][0] == {"date": "2024-05-01", "temp": 25.0}
+
+
+def test_visualize_if_none_match_returns_304(client):
+    http, store = client
+    first = http.get(URL)
+    etag = first.headers["ETag"]
+    again = http.get(URL, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+    assert again.headers["ETag"] == etag
+
+    # new data for the city changes the partition listing, and with it the ETag
+    ts = datetime.datetime(2024, 5, 2, 20, tzinfo=UTC)
+    store.record_weather("Delhi", {"dt": int(ts.timestamp()), "temp": 35.0})
+    store.flush()
+    changed = http.get(URL, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert changed.get_json()["series"]["temp"][1]["max"] == 35.0
+
+
+def test_visualize_bad_requests(client):
+    http, _ = client
+    assert http.get("/api/visualize").status_code == 400
+    assert http.get("/api/visualize?city=Delhi&range=soon").status_code == 400
+    assert http.get("/api/visualize?city=Delhi&resolution=minutely").status_code == 400
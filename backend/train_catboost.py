@@ -1,51 +1,266 @@
+"""
+Train the rain model on weatherAUS.csv.
+
+The CSV is read with compact dtypes (float32 numerics, categoricals; see
+preprocessing.CSV_DTYPES) and the preprocessed frame is cached as Parquet
+under data/cache/, keyed by a hash of the source file, so re-training on an
+unchanged file skips parsing. Training, validation (early stopping) and test
+rows are split with a fixed seed; numeric fill values are the training
+split's medians. The model is written as a new version directory
+
+    models/<name>/<version>/model.cbm
+    models/<name>/<version>/metadata.json   feature schema, fill values, params,
+                                            metrics, training time, peak memory,
+                                            held-out parity probe rows
+    models/<name>/<version>/model.cbm.py    standalone single-row predictor
+                                            (models/compiled.py)
+
+which the model registry serves as the newest version of <name> (and which
+score.py reads its fill values from).
+
+Run from backend/:
+    python -m train_catboost [--data data/weatherAUS.csv] [--threads 8] [--seed 42]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import datetime
+import tempfile
+
+import numpy as np
 import pandas as pd
-from catboost import CatBoostClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
 
-print("🔄 Loading dataset...")
-df = pd.read_csv("data/weatherAUS.csv")
+from preprocessing import TARGET, CSV_DTYPES, add_date_parts, encode_target, fill_missing, numeric_fill_values
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA = os.path.join(BASE, "data", "weatherAUS.csv")
+CACHE_DIR = os.environ.get("TRAIN_CACHE_DIR", os.path.join(BASE, "data", "cache"))
+MODEL_ROOT = os.environ.get("MODEL_DIR", os.path.join(BASE, "models"))
+
+# bump when load_dataset's preprocessing changes, so stale caches are ignored
+PREPROCESS_VERSION = 1
+# held-out rows saved in metadata.json for the compiled predictor's parity check
+PROBE_ROWS = 50
+
+DEFAULT_PARAMS = {
+    "iterations": 2000,
+    "depth": 6,
+    "learning_rate": 0.1,
+    "loss_function": "Logloss",
+    "eval_metric": "Logloss",
+}
+
+
+def peak_memory_mb():
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def load_dataset(path, cache_dir=CACHE_DIR, use_cache=True):
+    """
+    weatherAUS.csv -> (features, target) with compact dtypes and date parts,
+    rows without a target dropped. Missing values are left in place (they are
+    filled with training-split medians later). Returns (frame, source_hash, cached).
+    """
+    from models.registry import file_version
+
+    source_hash = file_version(path)
+    cache_path = os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(path))[0]}-"
+                                         f"{source_hash}-p{PREPROCESS_VERSION}.parquet")
+    if use_cache and os.path.exists(cache_path):
+        return pd.read_parquet(cache_path), source_hash, True
+
+    df = pd.read_csv(path, dtype=CSV_DTYPES)
+    df = df.dropna(subset=[TARGET])
+    df[TARGET] = encode_target(df[TARGET]).astype("int8")
+    df = add_date_parts(df).reset_index(drop=True)
+    for c in df.select_dtypes(include=["object", "string"]).columns:
+        df[c] = df[c].astype("category")
+
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = cache_path + ".tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, cache_path)
+    return df, source_hash, False
+
+
+def split_indices(y, test_size=0.2, valid_size=0.1, seed=42):
+    """Stratified (train, valid, test) row positions; valid_size is a fraction of the non-test rows."""
+    from sklearn.model_selection import train_test_split
+
+    idx = np.arange(len(y))
+    rest, test = train_test_split(idx, test_size=test_size, random_state=seed, stratify=y)
+    train, valid = train_test_split(rest, test_size=valid_size, random_state=seed, stratify=y[rest])
+    return train, valid, test
+
+
+def make_pool(df, rows, features, cat_features, fill_values, threads):
+    from catboost import Pool
+
+    part = fill_missing(df.iloc[rows], fill_values)
+    return Pool(part[features], label=part[TARGET].to_numpy(), cat_features=cat_features, thread_count=threads)
+
+
+def evaluate(model, pool, threads):
+    from sklearn.metrics import accuracy_score, log_loss, roc_auc_score
+
+    y = np.asarray(pool.get_label(), dtype=int)
+    proba = np.asarray(model.predict_proba(pool, thread_count=threads))[:, 1]
+    return {
+        "accuracy": round(float(accuracy_score(y, proba >= 0.5)), 5),
+        "logloss": round(float(log_loss(y, proba)), 5),
+        "auc": round(float(roc_auc_score(y, proba)), 5),
+        "rows": int(len(y)),
+    }
+
+
+def save_artifact(model, metadata, name, version, root=MODEL_ROOT, pool=None):
+    """
+    Write <root>/<name>/<version>/{model.cbm,model.cbm.py,metadata.json}. The files are
+    staged in a sibling directory and moved into place in one rename, so the
+    registry and hot-reload watcher never see a half-written version.
+    """
+    final = os.path.join(root, name, version)
+    if os.path.exists(final):
+        raise FileExistsError(f"model version already exists: {final}")
+    os.makedirs(os.path.dirname(final), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=root)
+    try:
+        model.save_model(os.path.join(staging, "model.cbm"))
+        try:
+            from models.compiled import export
+            # the training pool supplies the applier's category value -> hash table
+            export(model, os.path.join(staging, "model.cbm"), pool=pool)
+        except Exception as e:
+            print(f"Compiled predictor not exported: {e}", file=sys.stderr)
+        with open(os.path.join(staging, "metadata.json"), "w", encoding="utf-8") as fh:
+            json.dump(metadata, fh, indent=2, sort_keys=True)
+        os.rename(staging, final)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return os.path.join(final, "model.cbm")
+
+
+def train(data=DEFAULT_DATA, name=None, version=None, params=None, threads=-1, seed=42,
+          test_size=0.2, valid_size=0.1, early_stopping_rounds=50, use_cache=True,
+          root=MODEL_ROOT, log=sys.stderr):
+    """Train, evaluate and save a new model version; returns its metadata."""
+    import catboost
+    from catboost import CatBoostClassifier
+    from models.registry import ModelRegistry
+
+    name = name or ModelRegistry.DEFAULT_NAME
+    version = version or datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d-%H%M%S")
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    started = time.perf_counter()
+
+    def say(msg):
+        if log is not None:
+            print(msg, file=log, flush=True)
+
+    say(f"🔄 Loading dataset {data}...")
+    df, source_hash, cached = load_dataset(data, use_cache=use_cache)
+    say(f"   {len(df)} rows ({'cache hit' if cached else 'parsed'}, "
+        f"{df.memory_usage(deep=True).sum() / (1 << 20):.1f} MB in memory)")
 
-# Drop rows with missing target
-df = df.dropna(subset=['RainTomorrow'])
+    features = [c for c in df.columns if c != TARGET]
+    cat_features = [c for c in features if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    num_features = [c for c in features if c not in cat_features]
+    dtypes = {c: str(df[c].dtype) for c in features}
 
-# Fill missing values
-df = df.fillna(df.median(numeric_only=True))
-df = df.fillna("Unknown")
+    say("🔄 Splitting...")
+    train_rows, valid_rows, test_rows = split_indices(df[TARGET].to_numpy(), test_size, valid_size, seed)
+    fill_values = numeric_fill_values(df.iloc[train_rows][num_features])
+    train_pool = make_pool(df, train_rows, features, cat_features, fill_values, threads)
+    valid_pool = make_pool(df, valid_rows, features, cat_features, fill_values, threads)
+    test_pool = make_pool(df, test_rows, features, cat_features, fill_values, threads)
+    # held-out rows the exported single-row predictor is checked against at load time
+    probes = fill_missing(df.iloc[test_rows[:PROBE_ROWS]][features], fill_values)
+    probe_rows = json.loads(probes.astype(object).to_json(orient="records"))
+    del df
 
-# Convert target
-df['RainTomorrow'] = df['RainTomorrow'].map({'Yes':1, 'No':0})
+    say("🔄 Training CatBoost...")
+    fit_started = time.perf_counter()
+    model = CatBoostClassifier(**params, random_seed=seed, thread_count=threads, verbose=100,
+                               allow_writing_files=False)
+    model.fit(train_pool, eval_set=valid_pool, early_stopping_rounds=early_stopping_rounds, use_best_model=True)
+    fit_seconds = time.perf_counter() - fit_started
 
-# Identify features
-y = df['RainTomorrow']
-X = df.drop(columns=['RainTomorrow'])
+    say("🔍 Evaluating...")
+    metrics = {
+        "validation": evaluate(model, valid_pool, threads),
+        "test": evaluate(model, test_pool, threads),
+    }
+    say(f"   test accuracy {metrics['test']['accuracy']}, AUC {metrics['test']['auc']}")
 
-# Convert object columns to category
-for col in X.select_dtypes(include=['object']).columns:
-    X[col] = X[col].astype('category')
+    metadata = {
+        "name": name,
+        "version": version,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "source": {"path": os.path.abspath(data), "hash": source_hash, "preprocess_version": PREPROCESS_VERSION},
+        "features": {
+            "names": list(model.feature_names_),
+            "categorical": cat_features,
+            "numeric": num_features,
+            "dtypes": dtypes,
+        },
+        "fill_values": fill_values,
+        "probe_rows": probe_rows,
+        "params": dict(params, random_seed=seed, thread_count=threads,
+                       early_stopping_rounds=early_stopping_rounds),
+        "split": {"test_size": test_size, "valid_size": valid_size, "seed": seed,
+                  "rows": {"train": len(train_rows), "valid": len(valid_rows), "test": len(test_rows)}},
+        "best_iteration": model.get_best_iteration(),
+        "metrics": metrics,
+        "training_seconds": round(fit_seconds, 2),
+        "total_seconds": round(time.perf_counter() - started, 2),
+        "peak_memory_mb": peak_memory_mb(),
+        "library_versions": {"catboost": catboost.__version__, "pandas": pd.__version__, "numpy": np.__version__},
+    }
 
-print("�� Splitting...")
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42
-)
+    say("💾 Saving model...")
+    path = save_artifact(model, metadata, name, version, root=root, pool=train_pool)
+    say(f"✅ Training complete! New model saved at: {path}")
+    return metadata
 
-print("🔄 Training CatBoost...")
-model = CatBoostClassifier(
-    iterations=500,
-    depth=6,
-    learning_rate=0.1,
-    loss_function='Logloss',
-    verbose=50
-)
 
-model.fit(X_train, y_train)
+def main(argv=None):
+    import argparse
 
-print("🔍 Evaluating...")
-preds = model.predict(X_test)
-print("Accuracy:", accuracy_score(y_test, preds))
+    parser = argparse.ArgumentParser(description="Train a versioned CatBoost rain model on weatherAUS.csv.")
+    parser.add_argument("--data", default=DEFAULT_DATA)
+    parser.add_argument("--name", help="model name (default: the registry's default name)")
+    parser.add_argument("--version", help="version directory (default: UTC timestamp)")
+    parser.add_argument("--threads", type=int, default=-1, help="CatBoost thread_count (-1 = all cores)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=DEFAULT_PARAMS["iterations"])
+    parser.add_argument("--depth", type=int, default=DEFAULT_PARAMS["depth"])
+    parser.add_argument("--learning-rate", type=float, default=DEFAULT_PARAMS["learning_rate"])
+    parser.add_argument("--early-stopping", type=int, default=50, help="rounds without validation improvement")
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--valid-size", type=float, default=0.1, help="fraction of the non-test rows")
+    parser.add_argument("--no-cache", action="store_true", help="re-parse the CSV and don't write a cache")
+    args = parser.parse_args(argv)
 
-print("💾 Saving model...")
-model.save_model("models/models/catboost_model.cbm")
+    metadata = train(
+        data=args.data, name=args.name, version=args.version, threads=args.threads, seed=args.seed,
+        params={"iterations": args.iterations, "depth": args.depth, "learning_rate": args.learning_rate},
+        test_size=args.test_size, valid_size=args.valid_size, early_stopping_rounds=args.early_stopping,
+        use_cache=not args.no_cache,
+    )
+    print(json.dumps({k: metadata[k] for k in ("name", "version", "metrics", "training_seconds", "peak_memory_mb")}))
 
-print("✅ Training complete! New model saved at: models/models/catboost_model.cbm")
 
+if __name__ == "__main__":
+    main()